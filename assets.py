@@ -0,0 +1,219 @@
+"""This file contains the shared asset cache used by every sprite in the game.
+
+Each image in the Assets folder is decoded from disk only once and the same
+surface is handed out to every sprite that needs it, rather than each
+projectile or enemy loading its own copy. Once a display exists, surfaces
+are converted to its pixel format so that blitting them is as fast as possible.
+Collision masks are built from the images once and shared in the same way.
+
+Images can be decoded on a background thread with preload_async() while the
+window opens. Converting a surface needs the display, so that is always left
+to the main thread on the first get() after decoding.
+"""
+
+from settings import *
+import os
+import threading
+import time
+import pygame
+
+class Asset_Cache():
+    """Load, convert and share image surfaces.
+
+    Attributes:
+        path: A string containing the folder the images are loaded from.
+        loads: An integer counting how many files were decoded from disk.
+        hits: An integer counting how many requests were served from memory.
+        file_bytes: An integer with the total size of the decoded files.
+        surface_bytes: An integer with the memory used by the cached surfaces.
+        decode_time: A float with the seconds spent decoding and converting.
+    """
+
+    def __init__(self, path=ASSETS_PATH) -> None:
+        """Initialise an empty cache.
+
+        Args:
+            path: A string for the folder containing the images.
+        """
+        self.path = path
+        self.__surfaces = {}
+        self.__converted = set()
+        self.__masks = {}
+        # Held while decoding, so a file is never decoded by two threads
+        self.__lock = threading.Lock()
+        self.__thread = None
+
+        self.loads = 0
+        self.hits = 0
+        self.file_bytes = 0
+        self.surface_bytes = 0
+        self.decode_time = 0.0
+
+    def get(self, name):
+        """Access the shared surface for an image, loading it if needed.
+
+        The returned surface is shared between every caller, so it
+        must not be drawn on.
+
+        Args:
+            name: A string for the file name inside the assets folder.
+
+        Returns:
+            A pygame Surface for the image.
+        """
+        surface = self.__surfaces.get(name)
+
+        if surface is None:
+            surface = self.__load(name)
+        else:
+            self.hits += 1
+
+        # Surfaces can only be converted once a display mode is set,
+        # so images loaded before that are converted on a later request
+        if name not in self.__converted and pygame.display.get_surface() is not None:
+            surface = self.__convert(name, surface)
+
+        return surface
+
+    def mask(self, name):
+        """Access the shared collision mask for an image, building it if needed.
+
+        Args:
+            name: A string for the file name inside the assets folder.
+
+        Returns:
+            A pygame Mask with a bit set for every opaque pixel.
+        """
+        mask = self.__masks.get(name)
+        if mask is None:
+            mask = pygame.mask.from_surface(self.get(name))
+            self.__masks[name] = mask
+        return mask
+
+    def preload(self, names=None):
+        """Load a group of images ahead of time.
+
+        Args:
+            names: An iterable of file names, or None to load
+            every image in the assets folder.
+        """
+        if names is None:
+            names = self.__all_names()
+        for name in names:
+            self.get(name)
+
+    def preload_async(self, names=None):
+        """Start decoding a group of images on a background thread.
+
+        The images are converted on the main thread by the next get()
+        for each of them, or by a later call to preload().
+
+        Args:
+            names: An iterable of file names, or None to decode
+            every image in the assets folder.
+
+        Returns:
+            The daemon Thread doing the decoding.
+        """
+        if names is None:
+            names = self.__all_names()
+        names = list(names)
+
+        def decode():
+            for name in names:
+                if name not in self.__surfaces:
+                    self.__load(name)
+
+        self.__thread = threading.Thread(target=decode, name="asset-preload", daemon=True)
+        self.__thread.start()
+        return self.__thread
+
+    def wait(self):
+        """Block until a background preload has finished."""
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def clear(self):
+        """Remove every cached surface and reset the statistics."""
+        self.wait()
+        self.__init__(self.path)
+
+    def stats(self):
+        """Summarise how the cache has been used.
+
+        Returns:
+            A dict with the number of cached images and masks, loads,
+            hits, the file and surface sizes in bytes and the decode
+            time in milliseconds.
+        """
+        return {"images": len(self.__surfaces),
+                "masks": len(self.__masks),
+                "loads": self.loads,
+                "hits": self.hits,
+                "file_bytes": self.file_bytes,
+                "surface_bytes": self.surface_bytes,
+                "decode_ms": self.decode_time * 1000}
+
+    def __load(self, name):
+        """Decode an image from disk and cache it, unconverted.
+
+        This can run on any thread.
+
+        Args:
+            name: A string for the file name of the image.
+
+        Returns:
+            The decoded pygame Surface.
+        """
+        with self.__lock:
+            # Another thread may have decoded it while this one waited
+            surface = self.__surfaces.get(name)
+            if surface is not None:
+                return surface
+
+            start = time.perf_counter()
+            full_path = os.path.join(self.path, name)
+            surface = pygame.image.load(full_path)
+            self.decode_time += time.perf_counter() - start
+
+            self.loads += 1
+            self.file_bytes += os.path.getsize(full_path)
+            self.__surfaces[name] = surface
+            self.surface_bytes += self.__size_of(surface)
+        return surface
+
+    def __all_names(self):
+        """List every image in the assets folder."""
+        return sorted(name for name in os.listdir(self.path)
+                      if name.lower().endswith(".png"))
+
+    def __convert(self, name, surface):
+        """Convert a cached surface to the display's pixel format.
+
+        Args:
+            name: A string for the file name of the image.
+            surface: The pygame Surface to convert.
+
+        Returns:
+            The converted pygame Surface, which replaces the cached one.
+        """
+        start = time.perf_counter()
+        if surface.get_flags() & pygame.SRCALPHA:
+            converted = surface.convert_alpha()
+        else:
+            converted = surface.convert()
+        self.decode_time += time.perf_counter() - start
+
+        self.surface_bytes += self.__size_of(converted) - self.__size_of(surface)
+        self.__surfaces[name] = converted
+        self.__converted.add(name)
+        return converted
+
+    @staticmethod
+    def __size_of(surface):
+        """Calculate the number of bytes of pixel data in a surface."""
+        return surface.get_pitch() * surface.get_height()
+
+# The single cache shared by every sprite in the game
+assets = Asset_Cache()
@@ -0,0 +1,228 @@
+"""This file contains the benchmark suite for the game loop.
+
+Each scenario builds a Game under SDL's dummy video driver, so no window is
+opened, and runs the full loop of stepping and drawing for a fixed number
+of ticks with a scripted player. The suite reports ticks per second, the
+time spent in each phase and peak memory. Results can be saved as a
+baseline, and later runs are compared against it so that any change
+slowing the game down beyond a threshold is flagged:
+
+    python benchmark.py --save-baseline
+    python benchmark.py --threshold 0.1
+"""
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from settings import *
+from classes import *
+from inputs import Scripted_Input
+from profiler import Frame_Profiler
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import pygame
+
+BASELINE_PATH = "benchmark_baseline.json"
+
+# Values stored with each frame that are counts rather than phase times
+COUNTS = ("enemies", "projectiles", "mask_tests", "mask_rejected", "scenario")
+
+def sweep(tick):
+    """Script the player to sweep left and right while firing."""
+    return ((tick // 40) % 2 == 0, (tick // 40) % 2 == 1, True)
+
+def new_game(**options):
+    """Create a seeded game with a player who cannot die,
+    so every scenario runs for its full length.
+
+    Args:
+        options: Keyword arguments passed on to Game.
+
+    Returns:
+        The new Game.
+    """
+    game = Game(controls=Scripted_Input(sweep), seed=0,
+                profiler=Frame_Profiler(enabled=True, window=None), **options)
+    player = Player(500, 540)
+    player.set_health(10**9)
+    game.player_group.add(player)
+    return game
+
+def level_one():
+    """The standard first wave."""
+    return new_game(), None
+
+def level_forty():
+    """Level 40, where an enemy fires on every tick."""
+    game = new_game()
+    game.level = 39
+    return game, None
+
+def big_wave(formation, level=1):
+    """Build a 2000 enemy wave with generate_waves()."""
+    game = new_game(formation=formation)
+    game.level = level
+    game.generate_waves(Ultra_Rare_Enemy, 45, 60, 0, 1)
+    for row in range(50):
+        enemy = (Rare_Enemy, Common_Enemy, Common_Enemy)[row % 3]
+        amount = 40 if row < 49 else 39
+        game.generate_waves(enemy, 20, 100 + row * 7, 24, amount)
+    return game, None
+
+def projectile_storm():
+    """Keep 1500 projectiles on screen at all times."""
+    game = new_game()
+
+    def top_up(game, tick):
+        missing = 1500 - len(game.projectile_list)
+        for i in range(missing):
+            x = game.rng.randrange(SCREEN_WIDTH)
+            y = game.rng.randrange(20, SCREEN_HEIGHT - 20)
+            entity = "Player" if i % 2 else "Enemy"
+            game.projectile_list.add(projectile_pool.acquire(0, x, y, entity))
+    return game, top_up
+
+# Name, description, setup function and number of ticks for each scenario
+SCENARIOS = [
+    ("level_1", "standard level 1 wave", level_one, 600),
+    ("level_40", "level 40 with an enemy firing every tick", level_forty, 600),
+    ("sprites_2000", "2,000 enemy sprites", lambda: big_wave(False), 150),
+    ("formation_2000", "2,000 enemy formation", lambda: big_wave(True), 150),
+    ("level_200", "2,000 enemy sprites firing 4 volleys a tick", lambda: big_wave(False, 200), 150),
+    ("projectiles_1500", "1,500 projectiles on screen", projectile_storm, 300),
+]
+
+def run_scenario(setup, ticks):
+    """Run a scenario's game loop for a number of ticks.
+
+    Args:
+        setup: A function returning a Game and an optional
+        function called with the game and tick before each tick.
+        ticks: An integer for the number of ticks to run.
+
+    Returns:
+        A tuple of the seconds taken and the Game's profiler.
+    """
+    game, hook = setup()
+    profiler = game.profiler
+
+    timer = 0
+    start = time.perf_counter()
+    for tick in range(ticks):
+        profiler.begin()
+        if hook is not None:
+            hook(game, tick)
+            profiler.lap("scenario")
+        game.step(timer)
+        game.draw_groups()
+        profiler.end(enemies=game.count_enemies(), projectiles=len(game.projectile_list),
+                     mask_tests=game.narrowphase.tests,
+                     mask_rejected=game.narrowphase.rejected)
+        timer = 100 if timer == 0 else timer + 1
+    return time.perf_counter() - start, profiler
+
+def measure(setup, ticks, memory=True):
+    """Benchmark a scenario.
+
+    Args:
+        setup: The scenario's setup function.
+        ticks: An integer for the number of ticks to run.
+        memory: A boolean to also measure peak memory, in a
+        second run so tracing does not slow the timed one.
+
+    Returns:
+        A dict of results for the scenario.
+    """
+    elapsed, profiler = run_scenario(setup, ticks)
+    summary = profiler.summary()
+
+    result = {"ticks_per_second": ticks / elapsed,
+              "phases_ms": {phase: round(values["mean"], 4)
+                            for phase, values in summary.items()
+                            if phase not in COUNTS},
+              "frame_p95_ms": round(summary["frame"]["p95"], 4)}
+
+    if memory:
+        tracemalloc.start()
+        run_scenario(setup, ticks)
+        result["peak_memory_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+def compare(results, baseline, threshold):
+    """Find results that are worse than the baseline.
+
+    Args:
+        results: A dict of results by scenario name.
+        baseline: A dict of earlier results by scenario name.
+        threshold: A float for the allowed fraction of change.
+
+    Returns:
+        A list of strings describing each regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+
+        if result["ticks_per_second"] < old["ticks_per_second"] * (1 - threshold):
+            regressions.append(f"{name}: {result['ticks_per_second']:.0f} ticks/s, "
+                               f"baseline {old['ticks_per_second']:.0f}")
+        if "peak_memory_kb" in result and "peak_memory_kb" in old and \
+                result["peak_memory_kb"] > old["peak_memory_kb"] * (1 + threshold):
+            regressions.append(f"{name}: peak memory {result['peak_memory_kb']:.0f} KB, "
+                               f"baseline {old['peak_memory_kb']:.0f} KB")
+    return regressions
+
+def main():
+    """Run the benchmark suite from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark the game loop.")
+    parser.add_argument("scenarios", nargs="*",
+                        help="scenarios to run, all of them by default")
+    parser.add_argument("--baseline", default=BASELINE_PATH,
+                        help="the baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="save the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="the fraction of slowdown flagged as a regression")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the peak memory measurement")
+    args = parser.parse_args()
+
+    pygame.display.init()
+    pygame.font.init()
+
+    results = {}
+    for name, description, setup, ticks in SCENARIOS:
+        if args.scenarios and name not in args.scenarios:
+            continue
+        result = measure(setup, ticks, not args.no_memory)
+        results[name] = result
+
+        phases = ", ".join(f"{phase} {ms:.2f}" for phase, ms in result["phases_ms"].items())
+        memory = f", peak {result['peak_memory_kb']:.0f} KB" if "peak_memory_kb" in result else ""
+        print(f"{name:<18}{result['ticks_per_second']:>9.0f} ticks/s{memory}  ({description})")
+        print(f"{'':<18}ms per tick: {phases}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print("Regressions beyond {:.0%}:".format(args.threshold))
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} of {args.baseline}")
+
+if __name__ == "__main__":
+    main()
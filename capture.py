@@ -0,0 +1,250 @@
+"""This file records the frames shown on screen, encoded off the main thread.
+
+A Frame_Capture owns a ring of frame slots in one block of shared memory,
+allocated once when it is made. Each presented frame is copied straight from
+the display surface's pixel buffer into a free slot, which allocates nothing,
+and the slot number is handed to a pool of worker processes. The workers
+encode the frame, either into its place in a single raw RGB video file or to
+a numbered PNG file, and hand the slot back. Raw output is the default, as
+PNG encoding is slow enough that most frames are dropped at full speed.
+
+Capturing never blocks the game. If every slot is still waiting to be
+encoded, the frame is dropped from the recording and counted, while the
+game carries on as normal. stats() reports the frames captured and dropped,
+the slots in use and how long frames took from capture to being written.
+
+    python main.py --capture frames
+    python main.py --capture frames --capture-format png
+"""
+
+from settings import *
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import pygame
+from collections import deque
+from multiprocessing import shared_memory
+
+# SDL is not safe to use in a process forked from one that has started it
+# on macOS, and Windows cannot fork, so the workers are spawned there
+START_METHOD = "spawn" if sys.platform in ("darwin", "win32") else "fork"
+
+def encode_frames(memory_name, slot_bytes, directory, format, jobs, done):
+    """Encode frames from the shared ring until told to stop.
+    This runs in each worker process.
+
+    Args:
+        memory_name: A string naming the shared memory block.
+        slot_bytes: An integer for the bytes held by each slot.
+        directory: A string for the folder to write into.
+        format: "png" or "raw".
+        jobs: A Queue of (slot, frame number, time captured, layout)
+        tuples, where the layout is the frame's size, bits per pixel,
+        colour masks and pitch, or None to stop.
+        done: A Queue the (slot, frame number, latency) of each
+        finished frame is put on, after None once the worker is ready.
+    """
+    memory = shared_memory.SharedMemory(name=memory_name)
+    surface = None
+    layout = None
+    raw_file = None
+    if format == "raw":
+        raw_file = os.open(os.path.join(directory, "capture.rgb"), os.O_WRONLY | os.O_CREAT)
+    done.put(None)
+
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            slot, number, captured, frame_layout = job
+            if frame_layout != layout:
+                layout = frame_layout
+                size, bitsize, masks, pitch = layout
+                surface = pygame.Surface(size, 0, bitsize, masks)
+
+            start = slot * slot_bytes
+            pixels = memory.buf[start:start + pitch * size[1]]
+            buffer = surface.get_buffer()
+            if surface.get_pitch() == pitch:
+                buffer.write(bytes(pixels))
+            else:
+                row = surface.get_pitch()
+                for y in range(size[1]):
+                    buffer.write(bytes(pixels[y * pitch:y * pitch + row]), y * row)
+            del buffer
+            pixels.release()
+
+            if format == "png":
+                pygame.image.save(surface, os.path.join(directory, f"frame_{number:06}.png"))
+            else:
+                # Each frame has a fixed place, so workers can finish in any order
+                frame = pygame.image.tobytes(surface, "RGB")
+                os.pwrite(raw_file, frame, number * len(frame))
+            done.put((slot, number, time.monotonic() - captured))
+    finally:
+        if raw_file is not None:
+            os.close(raw_file)
+        memory.close()
+
+class Frame_Capture():
+    """Copy presented frames into a ring buffer for worker processes to encode.
+
+    Attributes:
+        directory: A string for the folder frames are written to.
+        format: "png" for numbered PNG files, or "raw" for one
+        file of RGB frames described by capture.json.
+        captured: An integer counting the frames copied into the ring.
+        dropped: An integer counting the frames skipped as the ring was full.
+        written: An integer counting the frames the workers have encoded.
+    """
+
+    def __init__(self, directory, format="raw", slots=CAPTURE_SLOTS,
+                 workers=CAPTURE_WORKERS) -> None:
+        """Allocate the ring and start the workers.
+
+        Where START_METHOD is "fork" the workers are copies of the game, so
+        a Frame_Capture should be made before the display is opened or any
+        threads are started. Spawned workers import the main module again,
+        so it must only start the game under if __name__ == "__main__".
+
+        Args:
+            directory: A string for the folder to write into,
+            created if it does not exist.
+            format: "raw" or "png".
+            slots: An integer for the frames the ring can hold.
+            workers: An integer for the worker processes encoding frames.
+        """
+        if format not in ("png", "raw"):
+            raise ValueError("format must be 'png' or 'raw'")
+        self.directory = directory
+        self.format = format
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+
+        os.makedirs(directory, exist_ok=True)
+        if format == "raw":
+            open(os.path.join(directory, "capture.rgb"), "wb").close()
+
+        # Enough for a screen sized frame of up to 32 bits per pixel
+        self.__slot_bytes = SCREEN_WIDTH * SCREEN_HEIGHT * 4
+        self.__slots = slots
+        self.__memory = shared_memory.SharedMemory(create=True,
+                                                   size=self.__slot_bytes * slots)
+        self.__free = list(range(slots))
+        self.__layout = None
+        self.__size = None
+        self.__latencies = deque(maxlen=PROFILE_WINDOW)
+        self.__copy_time = 0.0
+
+        context = multiprocessing.get_context(START_METHOD)
+        self.__jobs = context.Queue()
+        self.__done = context.Queue()
+        self.__processes = [context.Process(target=encode_frames, daemon=True,
+                                            args=(self.__memory.name, self.__slot_bytes,
+                                                  directory, format, self.__jobs, self.__done))
+                            for _ in range(workers)]
+        for process in self.__processes:
+            process.start()
+        # Spawned workers take a while to start, so wait rather than
+        # drop the first frames of the game
+        for _ in self.__processes:
+            self.__done.get()
+
+    def capture(self, surface):
+        """Copy a frame into the ring, or drop it if the ring is full.
+
+        Args:
+            surface: The display Surface, after the frame is presented.
+
+        Returns:
+            A boolean which is False if the frame was dropped.
+        """
+        self.__collect()
+        if not self.__free:
+            self.dropped += 1
+            return False
+
+        start = time.perf_counter()
+        if self.__size != surface.get_size():
+            self.__size = surface.get_size()
+            self.__layout = (self.__size, surface.get_bitsize(),
+                             surface.get_masks(), surface.get_pitch())
+            if surface.get_pitch() * surface.get_height() > self.__slot_bytes:
+                raise ValueError("Frames larger than the screen cannot be captured")
+
+        slot = self.__free.pop()
+        offset = slot * self.__slot_bytes
+        pixels = surface.get_buffer()
+        self.__memory.buf[offset:offset + pixels.length] = pixels
+        # The surface stays locked until the buffer is released
+        del pixels
+
+        self.__jobs.put((slot, self.captured, time.monotonic(), self.__layout))
+        self.captured += 1
+        self.__copy_time += time.perf_counter() - start
+        return True
+
+    def stats(self):
+        """Summarise the capture.
+
+        Returns:
+            A dict with the frames captured, dropped and written, the
+            share of frames dropped, the slots waiting to be encoded,
+            the mean time to copy a frame
+            and the mean and p95 time from capture to being written,
+            in milliseconds.
+        """
+        self.__collect()
+        latencies = sorted(self.__latencies)
+        last = len(latencies) - 1
+        offered = self.captured + self.dropped
+        return {"captured": self.captured,
+                "dropped": self.dropped,
+                "written": self.written,
+                "drop_rate": self.dropped / offered if offered else 0.0,
+                "queued": self.__slots - len(self.__free),
+                "copy_ms": self.__copy_time * 1000 / self.captured if self.captured else 0.0,
+                "latency_ms": sum(latencies) * 1000 / len(latencies) if latencies else 0.0,
+                "latency_p95_ms": latencies[round(last * 0.95)] * 1000 if latencies else 0.0}
+
+    def close(self):
+        """Wait for every captured frame to be written, stop the
+        workers and free the ring.
+
+        Returns:
+            The dict from stats() for the whole capture.
+        """
+        if self.__memory is None:
+            return self.stats()
+
+        for _ in self.__processes:
+            self.__jobs.put(None)
+        for process in self.__processes:
+            process.join()
+        stats = self.stats()
+
+        if self.__size is not None:
+            with open(os.path.join(self.directory, "capture.json"), "w") as file:
+                json.dump({"format": self.format, "width": self.__size[0],
+                           "height": self.__size[1], "frames": self.captured}, file, indent=2)
+
+        self.__memory.close()
+        self.__memory.unlink()
+        self.__memory = None
+        return stats
+
+    def __collect(self):
+        """Take back the slots of every frame the workers have finished."""
+        while True:
+            try:
+                slot, _, latency = self.__done.get_nowait()
+            except queue.Empty:
+                break
+            self.__free.append(slot)
+            self.__latencies.append(latency)
+            self.written += 1
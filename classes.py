@@ -7,10 +7,54 @@ enemies, and the por
 """
 
 from settings import *
+from assets import assets
+from collisions import Spatial_Hash, Narrowphase
+from inputs import Keyboard_Input, IDLE
+from rendering import Renderer, sprite_blits
+from hud import Number_Text, compose_game_over, get_font
+from profiler import Frame_Profiler
+from waves import rows_for_level
+from firing import Fire_Scheduler, volleys_due
+from telemetry import telemetry
 import pygame
 import random
+import time
 from abc import ABC, abstractmethod
 from pygame.sprite import Sprite, Group, GroupSingle
+from collections import deque
+
+# The id given to the next enemy or shot fired, unique to each so they
+# can be told apart when the game state is sent to other programs
+_next_entity_id = 1
+
+def new_entity_id():
+    """Hand out the next unique entity id.
+
+    Returns:
+        An integer, one more than the last id handed out.
+    """
+    global _next_entity_id
+    uid = _next_entity_id
+    _next_entity_id += 1
+    return uid
+
+def peek_entity_id():
+    """Find the id the next entity will be given, without using it up.
+
+    Returns:
+        An integer for the next id.
+    """
+    return _next_entity_id
+
+def set_next_entity_id(uid):
+    """Carry on handing out ids from a given one, for example
+    when a saved game is restored.
+
+    Args:
+        uid: An integer for the next id to hand out.
+    """
+    global _next_entity_id
+    _next_entity_id = uid
 
 class Player(Sprite):
     """Simulate the player in the game.
@@ -18,6 +62,7 @@ class Player(Sprite):
     Attributes:
         __health: An integer containing player heatlh.
         image: Stores the loaded sprite for the player ship.
+        mask: The shared collision mask of the image.
         rect: A pygame rect object to store position.
     """
 
@@ -32,7 +77,8 @@ class Player(Sprite):
 
         super().__init__()
         self.__health = PLAYER_HEALTH
-        self.image = pygame.image.load(ASSETS_PATH + "spaceship.png")
+        self.image = assets.get("spaceship.png")
+        self.mask = assets.mask("spaceship.png")
         self.rect = self.image.get_rect(midbottom=(x, y))
 
     def set_health(self, amount):
@@ -59,29 +105,37 @@ class Player(Sprite):
             A projectile object instatiated with the 
             player's positon and the damage it gives.
         """
-        return Projectile(PLAYER_PROJECTILE_DAMAGE, 
+        return projectile_pool.acquire(PLAYER_PROJECTILE_DAMAGE, 
                                 self.rect.center[0], 
                                 self.rect.center[1] - 25,
                                 str(self))
 
-    def move(self):
+    def move(self, controls=None):
         """Take input from the user to make the player
         move in the direction chosen by the user input.
+
+        Args:
+            controls: The Controls tuple read by the Game at the
+            start of this tick, or None to stay still.
         """
-        keys = pygame.key.get_pressed()
+        if controls is None:
+            controls = IDLE
 
-        if keys[pygame.K_a] or keys[pygame.K_LEFT]:
+        if controls.left:
             if self.rect.x - PLAYER_SPEED >= 0:
                 self.rect.x -= PLAYER_SPEED
-        if keys[pygame.K_d] or keys[pygame.K_RIGHT]:
+        if controls.right:
             if self.rect.x + PLAYER_SPEED <= SCREEN_WIDTH-self.rect.width:
                 self.rect.x += PLAYER_SPEED
     
-    def update(self):
+    def update(self, controls=None):
         """The Pygame Sprite class' default 
         method to update this sprite on the screen.
+
+        Args:
+            controls: A Controls tuple passed on to move().
         """
-        self.move()
+        self.move(controls)
 
     def __str__(self) -> str:
         """Determine the string returned when str() is
@@ -92,11 +146,18 @@ class Player(Sprite):
 class Projectile(Sprite):
     """Create a template for projectiles in the game.
 
+    Projectiles are recycled through projectile_pool, so a projectile
+    that is killed may be reset and fired again later.
+
     Attributes:
         fired_by: A string containing the name of the entity 
         that instantiated the class.
+        damage: An integer containing the damage to be given.
+        velocity: An integer for the distance moved down each tick.
         image: Stores the loaded sprite for the projectile.
+        mask: The shared collision mask of the image.
         rect: A pygame rect object to store position.
+        uid: A unique integer for this shot, new each time it is fired.
     """
 
     def __init__(self, damage, x, y, entity) -> None:
@@ -104,32 +165,69 @@ class Projectile(Sprite):
 
         Args:
             damage: An integer containing the damage to be given.
-            that instantiated the class.
             x: An integer for the x position.
             y: An integer for the y position.
-            entity: A string containing the name of the entity.
+            entity: A string containing the name of the entity
+            that instantiated the class.
         """
         
         super().__init__()
+        self.rect = None
+        self.reset(damage, x, y, entity)
+
+    def reset(self, damage, x, y, entity):
+        """Reinitialise the projectile so it can be fired again,
+        reusing its rect rather than creating a new one.
+
+        Args:
+            damage: An integer containing the damage to be given.
+            x: An integer for the x position.
+            y: An integer for the y position.
+            entity: A string containing the name of the entity
+            that fired the projectile.
+        """
 
         self.fired_by = entity
         self.damage = damage
+        self.uid = new_entity_id()
 
         self.image = None
+        self.velocity = 0
         if self.fired_by == "Player":
-            self.image = pygame.image.load(ASSETS_PATH + "player_projectile.png")
+            self.image = assets.get("player_projectile.png")
+            self.mask = assets.mask("player_projectile.png")
+            self.velocity = -PROJECTILE_SPEED
         elif self.fired_by == "Enemy":
-            self.image = pygame.image.load(ASSETS_PATH + "enemy_projectile.png")
-
-        self.rect = self.image.get_rect(midbottom=(x, y))
+            self.image = assets.get("enemy_projectile.png")
+            self.mask = assets.mask("enemy_projectile.png")
+            self.velocity = PROJECTILE_SPEED
+
+        if self.rect is None:
+            self.rect = self.image.get_rect(midbottom=(x, y))
+        else:
+            self.rect.size = self.image.get_size()
+            self.rect.midbottom = (x, y)
+
+        # A reused projectile must not be drawn moving from its old position
+        self.previous = self.rect.topleft
+
+    def kill(self):
+        """Remove the projectile from every group and
+        hand it back to the pool to be reused.
+        """
+        if self.alive():
+            super().kill()
+            projectile_pool.release(self)
     
-    def check_collision(self, entity):
+    def check_collision(self, entity, narrowphase=None):
         """Check whether the projectile has collided with
         another entity and execute appropriate game logic.
 
         Args:
             entity: A player, projectile or enemy object to 
             check collision with.
+            narrowphase: A Narrowphase to confirm rect collisions
+            with, or None to use the rects alone.
 
         Returns:
             A dict with a 'collided' key to say whether or not
@@ -140,7 +238,12 @@ class Projectile(Sprite):
         # Store a record of the collision and a score if an enemy is shot
         info = {"collided": False, "score": 0}
 
-        if self.rect.colliderect(entity.rect):
+        if narrowphase is None:
+            collided = self.rect.colliderect(entity.rect)
+        else:
+            collided = narrowphase.collide(self, entity)
+
+        if collided:
             info["collided"] = True
             if str(entity) != "Projectile":
                 # Enables polymorphism for enemy and player classes
@@ -159,10 +262,7 @@ class Projectile(Sprite):
         """Allow the projectiles to move based off movement settings
         defined inside of settings.py"""
 
-        if self.fired_by == "Player":
-            self.rect.y -= PROJECTILE_SPEED
-        elif self.fired_by == "Enemy":
-            self.rect.y += PROJECTILE_SPEED
+        self.rect.y += self.velocity
         if self.rect.y < 0 or self.rect.y > SCREEN_HEIGHT:
             self.kill()
 
@@ -178,60 +278,313 @@ class Projectile(Sprite):
         """
         return "Projectile"
 
+class Projectile_Pool():
+    """Recycle Projectile objects instead of creating new ones.
+
+    Killed projectiles are kept on a free list and reset when the
+    next projectile is fired, which avoids the allocation churn
+    of creating and discarding a sprite for every shot.
+
+    Attributes:
+        capacity: An integer for the most projectiles kept for reuse.
+        allocated: An integer counting projectiles created.
+        reused: An integer counting shots served from the free list.
+        in_use: An integer for the projectiles currently fired.
+        peak: An integer for the highest value in_use has reached.
+    """
+
+    def __init__(self, capacity=PROJECTILE_POOL_SIZE) -> None:
+        """Initialise an empty pool.
+
+        Args:
+            capacity: An integer for the most projectiles to keep.
+        """
+        self.capacity = capacity
+        self.free = []
+
+        self.allocated = 0
+        self.reused = 0
+        self.in_use = 0
+        self.peak = 0
+
+        self.__window_time = time.perf_counter()
+        self.__window_reused = 0
+
+    def reserve(self):
+        """Create projectiles until the pool is at capacity, so
+        they are allocated up front rather than during play.
+        """
+        while len(self.free) + self.in_use < self.capacity:
+            self.free.append(Projectile(PLAYER_PROJECTILE_DAMAGE, 0, 0, "Player"))
+            self.allocated += 1
+
+    def acquire(self, damage, x, y, entity):
+        """Take a projectile from the pool, creating one
+        only if the free list is empty.
+
+        Args:
+            damage: An integer containing the damage to be given.
+            x: An integer for the x position.
+            y: An integer for the y position.
+            entity: A string containing the name of the entity.
+
+        Returns:
+            A Projectile ready to be added to a group.
+        """
+        if self.free:
+            projectile = self.free.pop()
+            projectile.reset(damage, x, y, entity)
+            self.reused += 1
+        else:
+            projectile = Projectile(damage, x, y, entity)
+            self.allocated += 1
+
+        self.in_use += 1
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+        return projectile
+
+    def release(self, projectile):
+        """Return a killed projectile to the free list.
+
+        Args:
+            projectile: The Projectile that was killed.
+        """
+        self.in_use -= 1
+        if len(self.free) < self.capacity:
+            self.free.append(projectile)
+
+    def stats(self):
+        """Summarise how the pool has been used.
+
+        The reuse rate covers the time since stats() was last called.
+
+        Returns:
+            A dict with the capacity, the projectiles in use and free,
+            the peak occupancy, the allocation and reuse counts and
+            the allocations avoided per second.
+        """
+        now = time.perf_counter()
+        elapsed = now - self.__window_time
+        rate = (self.reused - self.__window_reused) / elapsed if elapsed > 0 else 0.0
+        self.__window_time = now
+        self.__window_reused = self.reused
+
+        return {"capacity": self.capacity,
+                "in_use": self.in_use,
+                "free": len(self.free),
+                "peak": self.peak,
+                "allocated": self.allocated,
+                "reused": self.reused,
+                "avoided_per_second": rate}
+
+class Projectile_Group(Group):
+    """A sprite group that moves and culls all of its
+    projectiles in a single pass.
+    """
+
+    def update(self):
+        """Move every projectile, then kill those that have left
+        the screen, matching Projectile.move() for each sprite.
+        """
+        culled = []
+        for projectile in self.sprites():
+            rect = projectile.rect
+            rect.y += projectile.velocity
+            if rect.y < 0 or rect.y > SCREEN_HEIGHT:
+                culled.append(projectile)
+
+        for projectile in culled:
+            projectile.kill()
+
+# The pool shared by every entity that fires projectiles
+projectile_pool = Projectile_Pool()
+
 class Game():
-    def __init__(self) -> None:
+    def __init__(self, headless=False, controls=None, formation=False, seed=None,
+                 profiler=None) -> None:
         """Initialise needed game variables as attributes, including the score
         and level.
 
         Also set up pygame display components (text, captions and sprites)
-        and fonts to be used for text elements.
+        and fonts to be used for text elements, unless running headless.
+
+        Args:
+            headless: A boolean to run the game logic without
+            opening a window or loading fonts.
+            controls: An input source with a poll() method, defaulting
+            to the keyboard.
+            formation: A boolean to store enemies in a NumPy Formation
+            instead of as individual sprites.
+            seed: An integer seed for every random choice in the game,
+            or None to pick one at random.
+            profiler: A Frame_Profiler to time each phase with,
+            defaulting to a disabled one.
 
         Attributes:
             __score: An integer containing the current score.
             level: An integer describing player progression.
+            headless: A boolean saying whether there is a display.
+            controls: The input source read once per tick.
+            spawn_queue: A deque of waves.Row tuples still to be spawned.
+            wave_age: An integer counting the ticks since the current
+            wave started spawning.
+            seed: The integer the game's random numbers were seeded with.
+            rng: A random.Random instance used for every random choice,
+            so a game can be reproduced from its seed and inputs.
+            profiler: The Frame_Profiler timing each phase.
+            narrowphase: The Narrowphase confirming collisions
+            against pixel masks and counting its tests.
+            fire_scheduler: The Fire_Scheduler choosing which
+            enemies fire, a Formation_Scheduler in formation mode.
+            formation: The Formation holding the enemies, or None
+            when they are sprites in enemy_list.
+            projectile_cap: An integer for the most projectiles
+            on screen before enemies stop firing, or None.
+            hud_interval: An integer for the frames drawn between
+            redraws of the score and health numbers.
+            smoothing: A boolean, False to draw sprites where they
+            are at the last tick instead of between ticks.
 
             Note: All the other attributes are Pygame Font, Rect 
             and Surface objects used to create the display.
         """
 
         self.__score = 0
-        self.font = pygame.font.SysFont(None, 50)
-        self.big_font = pygame.font.SysFont(None, 100)
+        self.headless = headless
+
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.controls = Keyboard_Input() if controls is None else controls
+        self.profiler = Frame_Profiler() if profiler is None else profiler
+
+        self.enemy_list = Group()
+        self.projectile_list = Projectile_Group()
+        self.player_group = GroupSingle()
 
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Space Invaders")
+        self.level = 0
 
-        self.score_text = self.font.render(str(self.__score), True, WHITE)
+        # Rows of enemies still to arrive in the current wave
+        self.spawn_queue = deque()
+        self.wave_age = 0
+
+        self.formation = None
+        if formation:
+            # Imported here as NumPy is only needed for this mode
+            from formation import Formation, Formation_Scheduler
+            self.formation = Formation(self.rng.getrandbits(32))
+
+        # Broadphase grids, rebuilt every tick in check_collisions()
+        self.enemy_grid = Spatial_Hash()
+        self.player_projectile_grid = Spatial_Hash()
+        self.pairs_tested = 0
+        self.narrowphase = Narrowphase()
+
+        # Chooses which enemies fire, and when they can fire again
+        if self.formation is not None:
+            self.fire_scheduler = Formation_Scheduler(self.formation, self.rng)
+        else:
+            self.fire_scheduler = Fire_Scheduler(self.rng)
+
+        # Work the Frame_Governor can shed when frames run over budget
+        self.projectile_cap = None
+        self.hud_interval = 1
+        self.smoothing = True
+        self.hud_age = 0
+
+        telemetry.emit("game", self.seed, formation)
+
+        if headless:
+            self.screen = None
+            self.font = self.big_font = None
+            self.score_text = self.health_text = None
+            self.renderer = None
+            projectile_pool.reserve()
+            return
+
+        self.font = get_font(50)
+        self.big_font = get_font(100)
+
+        # A restarted game draws on the window the last game opened
+        self.screen = pygame.display.get_surface()
+        if self.screen is None or self.screen.get_size() != (SCREEN_WIDTH, SCREEN_HEIGHT):
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("Space Invaders")
+        self.renderer = Renderer(self.screen)
+        self.game_over_screen = None
+
+        # Decode every sprite up front so no frame waits on the disk
+        assets.preload()
+        # Only once the display is set, so the pool holds converted surfaces
+        projectile_pool.reserve()
+
+        # Numbers are only redrawn when their value changes
+        self.score_number = Number_Text(self.font, WHITE, self.__score)
+        self.score_text = self.score_number.image
         self.score_text_rect = self.score_text.get_rect()
         self.score_text_rect.center = (25, SCREEN_HEIGHT-25)
         
-        self.health_text = self.font.render("0", True, WHITE)
+        self.health_number = Number_Text(self.font, WHITE, 0)
+        self.health_text = self.health_number.image
         self.health_text_rect = self.health_text.get_rect()
         self.health_text_rect.center = (SCREEN_WIDTH-40, SCREEN_HEIGHT-25)
+    
+    def close(self):
+        """Let go of every sprite once the game is finished with.
 
-        self.enemy_list = Group()
-        self.projectile_list = Group()
-        self.player_group = GroupSingle()
+        Sprites and groups refer to each other, so a finished game
+        would otherwise only be freed once the garbage collector finds
+        it. Projectiles still flying are handed back to the pool.
+        """
+        for projectile in self.projectile_list.sprites():
+            projectile.kill()
+        for enemy in self.enemy_list.sprites():
+            enemy.kill()
+        self.player_group.empty()
+        self.fire_scheduler.clear()
+
+        self.enemy_grid.clear()
+        self.player_projectile_grid.clear()
+        self.spawn_queue.clear()
+        self.formation = None
 
-        self.level = 0
-    
     def generate_enemies(self):
-        """Use the generate_waves function to generate enemies 
-        in different lines, based off rarity.
+        """Queue the rows of enemies for the current level, 
+        as laid out in the waves file, to be spawned by 
+        spawn_enemies() over the next few ticks.
         """
 
-        # Start away from the top of the screen
-        offset = 50
+        self.spawn_queue.extend(rows_for_level(self.level))
+        self.wave_age = 0
 
-        self.enemy_list.add(Ultra_Rare_Enemy(45, 60))
+    def spawn_enemies(self, budget=None):
+        """Spawn queued enemies, stopping once the budget for
+        this tick is used up so a new wave does not cause a spike.
 
-        for i in range(offset+100, 200+offset, 50):
-            self.generate_waves(Rare_Enemy, 100, i, 50, 10)
-        
-        for i in range(offset+225, offset+375, 50):
-            self.generate_waves(Common_Enemy, 50, i, 50, 19)
+        Enemies spawned after the first tick of a wave are moved on
+        by the ticks they missed, so the whole wave moves in step.
+
+        Args:
+            budget: An integer for the most enemies to spawn,
+            or None for SPAWN_BUDGET.
+        """
+        if budget is None:
+            budget = SPAWN_BUDGET
+        while self.spawn_queue and budget > 0:
+            row = self.spawn_queue[0]
+            amount = min(row.amount, budget)
+            self.generate_waves(ENEMY_TYPES[row.enemy], row.x, row.y, row.gap, 
+                                amount, row.extra_health, self.wave_age)
+            budget -= amount
+
+            if amount == row.amount:
+                self.spawn_queue.popleft()
+            else:
+                # Carry on from where this row stopped next tick
+                self.spawn_queue[0] = row._replace(x=row.x + row.gap * amount,
+                                                   amount=row.amount - amount)
 
-    def generate_waves(self, enemy, x, y, gap, amount):
+    def generate_waves(self, enemy, x, y, gap, amount, extra_health=0, moves=0):
         """Modularise the repetitive task of generating enemies
         in a straight horizontal line.
 
@@ -243,11 +596,36 @@ class Game():
             each enemy in the wave.
             amount: An integer for the amount of enemies
             to generate in the wave.
+            extra_health: An integer added to each enemy's health.
+            moves: An integer for the ticks of movement each new
+            enemy has missed, to keep in step with earlier enemies.
         """
+        if self.formation is not None:
+            self.formation.add_wave(enemy, x, y, gap, amount, extra_health, moves)
+            return
+
         for i in range(amount):
-            self.enemy_list.add(enemy(x, y))
+            new = enemy(x, y, self.rng)
+            if extra_health:
+                new.set_health(new.get_health() + extra_health)
+            if moves:
+                new.catch_up(moves)
+            self.enemy_list.add(new)
+            self.fire_scheduler.add(new)
             x += gap
 
+    def count_enemies(self):
+        """Count the enemies that have not been destroyed.
+
+        Returns:
+            An integer for the number of enemies left, whether they
+            are sprites or part of a formation.
+        """
+        count = len(self.enemy_list)
+        if self.formation is not None:
+            count += len(self.formation)
+        return count
+
     def is_game_over(self):
         """Check if the game is over.
         
@@ -264,128 +642,369 @@ class Game():
         This includes adding game over text, a play again 
         button and the final score, as well as making them
         visible on the game display.
+
+        The screen is composed and shown once, so later
+        calls while it stays up do no work.
         """
-        
-        self.screen.fill(BLACK)
-
-        go_text = self.big_font.render("Game Over", True, RED)
-        go_text_rect = go_text.get_rect()
-        go_text_rect.center = (SCREEN_WIDTH//2, SCREEN_HEIGHT//2-80)
-
-        final_text = self.font.render(f"Final Score: ", True, WHITE)
-        final_rect = final_text.get_rect()
-        final_rect.center = (SCREEN_WIDTH//2-40, SCREEN_HEIGHT//2-20)
-        self.score_text_rect.center = (SCREEN_WIDTH//2+100, final_rect.center[1])
-
-        play_again_btn = pygame.image.load(ASSETS_PATH+"button.png")
-        self.btn_rect = play_again_btn.get_rect()
-        self.btn_rect.center = (SCREEN_WIDTH//2, SCREEN_HEIGHT//2+60)
-
-        play_again_txt = self.font.render(f"Play Again", True, WHITE)
-        txt_rect = play_again_txt.get_rect()
-        txt_rect.center = self.btn_rect.center
-
-        self.screen.blit(go_text, go_text_rect)
-        self.screen.blit(final_text, final_rect)
-        self.screen.blit(self.score_text, self.score_text_rect)
-        self.screen.blit(play_again_btn, self.btn_rect)
-        self.screen.blit(play_again_txt, txt_rect)
-        
+
+        if self.game_over_screen is not None:
+            return
+
+        self.refresh_hud()
+        self.game_over_screen, self.btn_rect = compose_game_over(
+            self.font, self.big_font, self.score_text, self.score_text_rect)
+
+        self.screen.blit(self.game_over_screen, (0, 0))
         pygame.display.update()
+        self.renderer.invalidate()
+
+    def step(self, time):
+        """Advance the game logic by a single tick, starting
+        a new level if every enemy has been destroyed.
 
-    def update_groups(self, time):
+        Args:
+            time: An integer that describes the current value
+            of the timer running in the main loop to add delay.
+        """
+
+        # Read the controls once, before anything in the tick acts on them
+        controls = self.controls.poll()
+        telemetry.tick()
+
+        # Remember where every sprite was, so frames drawn
+        # between ticks can place them part of the way along
+        if not self.headless and self.smoothing:
+            self.store_positions()
+
+        # If there are no enemies left, generate them
+        if self.count_enemies() == 0 and not self.spawn_queue:
+            self.level += 1
+            self.generate_enemies()
+            telemetry.emit("level", self.level)
+        self.spawn_enemies()
+        if self.spawn_queue:
+            self.wave_age += 1
+        self.profiler.lap("spawn")
+
+        self.check_collisions()
+        self.profiler.lap("collisions")
+        self.update_groups(time, controls)
+        if self.is_game_over():
+            telemetry.emit("death", self.__score, self.level)
+        self.profiler.lap("update")
+
+    def store_positions(self):
+        """Remember where every sprite is at the start of a tick."""
+        for group in (self.player_group, self.projectile_list, self.enemy_list):
+            for sprite in group:
+                sprite.previous = sprite.rect.topleft
+
+    def set_smoothing(self, enabled):
+        """Switch drawing sprites between ticks on or off.
+
+        Args:
+            enabled: A boolean, True to place sprites part of the
+            way between their previous and current positions.
+        """
+        if enabled and not self.smoothing and not self.headless:
+            # Positions were not kept while it was off
+            self.store_positions()
+        self.smoothing = enabled
+
+    def set_collision_cell_size(self, size):
+        """Change the cell size of the collision grids. Larger cells
+        make building the grids cheaper but find more candidates.
+
+        Args:
+            size: An integer for the width and height of each cell.
+        """
+        self.enemy_grid.cell_size = size
+        self.player_projectile_grid.cell_size = size
+
+    def update_groups(self, time, controls=None):
         """Check and allow for both player and 
         enemy shooting, and keep updating the health text.
 
         Args: 
             time: An integer that describes the current value
             of the timer running in the main loop to add delay.
+            controls: The Controls tuple read at the start of the
+            tick, or None to read the input source now.
         """
 
-        keys = pygame.key.get_pressed()
+        if controls is None:
+            controls = self.controls.poll()
 
         # Slow down player shooting to avoid them 
         # being too overpowered
-        if keys[pygame.K_SPACE] and time % 10 == 0:
+        if controls.fire and time % 10 == 0:
             new = self.player_group.sprites()[0].shoot()
             self.projectile_list.add(new)
 
-        enemies = list(self.enemy_list.sprites())
-
-        # Increase the frequency of enemies shooting
-        # as the player progresses in the game
-        if time % (int(50/self.level)) == 0:
-            chosen = random.choice(enemies)
-            projectiles = chosen.shoot()
-            for projectile in projectiles:
-                self.projectile_list.add(projectile)
-
-        self.health_text = self.font.render(str(self.player_group.sprites()[0].get_health()), 
-                                            True, 
-                                            WHITE)
+        # Increase the frequency of enemies shooting as the player
+        # progresses, up to several volleys a tick at high levels
+        if self.count_enemies() > 0:
+            for _ in range(volleys_due(time, self.level)):
+                if self.projectile_cap is not None and len(self.projectile_list) >= self.projectile_cap:
+                    break
+                self.projectile_list.add(self.enemy_volley(time))
 
-        self.player_group.update()
+        self.player_group.update(controls)
         self.projectile_list.update()
         self.enemy_list.update()
+        if self.formation is not None:
+            self.formation.update()
 
-    def draw_groups(self):
+    def enemy_volley(self, time):
+        """Choose an enemy to fire, sometimes the one nearest
+        the player's column, and fire its projectiles.
+
+        Args:
+            time: An integer for the timer passed to step().
+
+        Returns:
+            A list of the projectiles fired, empty if every
+            enemy is waiting to fire again.
+        """
+        scheduler = self.fire_scheduler
+        if self.rng.random() < ENEMY_AIMED_FIRE:
+            player = self.player_group.sprites()[0]
+            chosen = scheduler.choose_aimed(time, player.rect.centerx)
+        else:
+            chosen = scheduler.choose(time)
+
+        if chosen is None:
+            return []
+        scheduler.fired(chosen, time, self.level)
+        if self.formation is not None:
+            return self.formation.shoot(self.formation.index_of(chosen))
+        return chosen.shoot()
+
+    def draw_groups(self, alpha=1.0):
         """Draw the updated pygame sprite groups onto 
         the user display and update score and health text.
+
+        Everything is drawn in one batch by the renderer, which
+        only updates the changed areas in dirty rectangle mode.
+
+        Args:
+            alpha: A float between 0 and 1 for how far the frame is
+            between the previous tick and the current one, used to
+            smooth movement when drawing faster than the tick rate.
         """
 
-        self.screen.fill(BLACK)
-        self.screen.blit(self.score_text, self.score_text_rect)
-        self.screen.blit(self.health_text, self.health_text_rect)
+        self.hud_age += 1
+        if self.hud_age >= self.hud_interval:
+            self.hud_age = 0
+            self.refresh_hud()
+
+        blits = [(self.score_text, self.score_text_rect),
+                 (self.health_text, self.health_text_rect)]
+        for group in (self.player_group, self.projectile_list, self.enemy_list):
+            blits += sprite_blits(group, alpha if self.smoothing else 1.0)
+        if self.formation is not None:
+            blits += self.formation.blit_list(alpha if self.smoothing else 1.0)
+        if self.profiler.overlay and self.profiler.enabled:
+            blits.append((self.profiler.overlay_surface(), (10, 10)))
+
+        self.renderer.draw(blits)
+        self.profiler.lap("draw")
+        self.renderer.present()
+        self.profiler.lap("present")
+
+    def set_score(self, score):
+        """Set the score outright, as when a saved game is restored,
+        without logging it as points scored. The number shown on
+        screen is redrawn with the next frame.
 
-        self.player_group.draw(self.screen)
-        self.projectile_list.draw(self.screen)
-        self.enemy_list.draw(self.screen)
-        pygame.display.update()
+        Args:
+            score: An integer for the new score.
+        """
+        self.__score = score
+        self.hud_age = self.hud_interval
 
     def update_score(self, amount):
-        """Change the score attribute and the text
-        shown on screen.
+        """Change the score attribute. The text shown on
+        screen follows when the next frame is drawn.
 
         Args:
             amount: An integer to change the score by.
         """
         self.__score += amount
-        self.score_text = self.font.render(str(self.__score), True, WHITE)
+        if amount:
+            telemetry.emit("score", amount, self.__score)
+
+    def refresh_hud(self):
+        """Update the score and health numbers shown on screen,
+        which are only recomposed if their values have changed.
+        """
+        self.score_number.set(self.__score)
+        self.score_text = self.score_number.image
+        self.health_number.set(self.player_group.sprites()[0].get_health())
+        self.health_text = self.health_number.image
+
+    def get_score(self):
+        """Access the encapsulated score attribute.
+
+        Returns:
+            An integer representing the current score.
+        """
+        return self.__score
 
     def check_collisions(self):
         """Check for any collisions happening in the game
         and perform certain actions depending on them.
+
+        Enemies and player projectiles are bucketed into grids first,
+        so each projectile is only checked against entities close to
+        it. The number of checks made is stored in pairs_tested, and
+        the mask tests made for rects that overlap are counted by
+        the narrowphase.
         """
 
-        for projectile in self.projectile_list:
+        player = self.player_group.sprites()[0]
+        projectiles = self.projectile_list.sprites()
+
+        self.enemy_grid.clear()
+        self.enemy_grid.insert_all(self.enemy_list)
+        self.player_projectile_grid.clear()
+        self.player_projectile_grid.insert_all(
+            projectile for projectile in projectiles 
+            if projectile.fired_by == "Player")
+
+        narrowphase = self.narrowphase
+        narrowphase.reset()
+
+        pairs = 0
+        for projectile in projectiles:
 
             # Execute different procedures based off
             # the type of projectile
             if projectile.fired_by == "Player":
-                for enemy in self.enemy_list:
-                    collision = projectile.check_collision(enemy)
+                for enemy in self.enemy_grid.query(projectile.rect):
+                    # Skip enemies destroyed earlier in this pass
+                    if not enemy.alive():
+                        continue
+                    pairs += 1
+                    collision = projectile.check_collision(enemy, narrowphase)
                     if collision["collided"] == True:
                         self.update_score(collision["score"])
+                        if collision["score"]:
+                            telemetry.emit("kill", enemy.rarity, enemy.rect.centerx, enemy.rect.centery)
+
+                if self.formation is not None:
+                    for index in self.formation.collide(projectile.rect):
+                        pairs += 1
+                        if narrowphase.enabled and not narrowphase.overlap(
+                                projectile.rect, projectile.mask, *self.formation.mask(index)):
+                            continue
+                        self.update_score(self.formation.damage(index, projectile.damage))
+                        projectile.kill()
 
             elif projectile.fired_by == "Enemy":
-                projectile.check_collision(self.player_group.sprites()[0])
-                for player_projectile in self.projectile_list:
-                    if player_projectile.fired_by == "Player":
-                        projectile.check_collision(player_projectile)
+                pairs += 1
+                if projectile.check_collision(player, narrowphase)["collided"]:
+                    telemetry.emit("damage", projectile.damage, player.get_health())
+                for player_projectile in self.player_projectile_grid.query(projectile.rect):
+                    if player_projectile.alive():
+                        pairs += 1
+                        projectile.check_collision(player_projectile, narrowphase)
+
+        self.pairs_tested = pairs
+
+def bob_phase(ticks, distance=50):
+    """Work out where a common enemy is in its up and down
+    movement after a number of ticks, without moving it.
+
+    The movement repeats every 2 * distance / CE_SPEED ticks,
+    so only the position within that period matters.
+
+    Args:
+        ticks: An integer for the ticks the enemy has moved for.
+        distance: An integer for how far it moves before turning.
+
+    Returns:
+        A tuple of the distance moved down from the start and
+        a boolean saying whether it is now moving up.
+    """
+    if CE_SPEED <= 0 or distance % CE_SPEED:
+        # It never lands on either end, so it never turns
+        return ticks * CE_SPEED, False
+
+    steps = distance // CE_SPEED
+    phase = ticks % (2 * steps)
+    if phase < steps:
+        return phase * CE_SPEED, False
+    return (2 * steps - phase) * CE_SPEED, True
+
+def sweep_phase(ticks, distance=300):
+    """Work out where a rare enemy is in its side-to-side
+    movement after a number of ticks, without moving it.
+
+    The enemy spends one tick turning at each end, so the
+    movement repeats every 2 * (steps + 1) ticks, where steps
+    is the number of moves needed to cover the distance.
+
+    Args:
+        ticks: An integer for the ticks the enemy has moved for.
+        distance: An integer for how far it moves before turning.
+
+    Returns:
+        A tuple of the distance moved right from the start and
+        a boolean saying whether it is now moving right.
+    """
+    if RE_SPEED <= 0:
+        return 0, True
+
+    steps = -(-distance // RE_SPEED)
+    phase = ticks % (2 * steps + 2)
+    if phase <= steps:
+        return phase * RE_SPEED, True
+    return (2 * steps + 1 - phase) * RE_SPEED, False
 
 class Enemy(ABC):
-    def __init__(self) -> None:
+    def __init__(self, rng=random) -> None:
         """Initialise the abstract base class for an enemy.
+
+        Args:
+            rng: A random.Random instance, or the random module,
+            used for any random movement.
         
         Attributes:
             rarity: Set to none, but to be assigned to a string
             by subclasses of this abstract class.
             __health: Set to NotImplemented, but also to be assigned
             by subclasses, varying by rarity.
+            rng: The source of random numbers for this enemy.
+            uid: A unique integer for this enemy.
+            fire_scheduler: The Fire_Scheduler tracking this
+            enemy, or None.
         """
 
         self.rarity = None
         self.__health = NotImplemented
+        self.rng = rng
+        self.uid = new_entity_id()
+        self.fire_scheduler = None
+
+    def kill(self):
+        """Remove the enemy from every group and
+        stop it being chosen to fire.
+        """
+        if self.fire_scheduler is not None:
+            self.fire_scheduler.remove(self)
+        super().kill()
+
+    def catch_up(self, ticks):
+        """Move a newly spawned enemy on by a number of ticks
+        at once, so it is in step with the rest of its wave.
+        Random movement cannot be worked out ahead, so by
+        default the enemy is left where it spawned.
+
+        Args:
+            ticks: An integer for the ticks of movement missed.
+        """
+        pass
 
     @abstractmethod
     def move(self):
@@ -442,10 +1061,11 @@ class Common_Enemy(Enemy, Sprite):
         moved: An integer containing the distance that the 
         object has moved so far.
         image: Stores the loaded sprite for the enemy.
+        mask: The shared collision mask of the image.
         rect: A pygame rect object to store position.
     """
 
-    def __init__(self, x, y):
+    def __init__(self, x, y, rng=random):
         """Initialise and inherit necessary attributes and 
         methods from Sprite and Enemy classes. Define new ones
         specific to this class as well.
@@ -453,16 +1073,18 @@ class Common_Enemy(Enemy, Sprite):
         Args:
             x: An integer for the x position.
             y: An integer for the y position.
+            rng: A random.Random instance or the random module.
         """
 
         Sprite.__init__(self)
-        Enemy.__init__(self)
+        Enemy.__init__(self, rng)
 
         self.set_health(CE_HEALTH)
 
         self.rarity = "Common"
 
-        self.image = pygame.image.load(ASSETS_PATH + "common_enemy.png")
+        self.image = assets.get("common_enemy.png")
+        self.mask = assets.mask("common_enemy.png")
         self.rect = self.image.get_rect(midbottom=(x, y))
 
         self.up = False
@@ -483,12 +1105,22 @@ class Common_Enemy(Enemy, Sprite):
         
         if self.moved == 0 or self.moved == 50:
             self.up = not (self.up)
+
+    def catch_up(self, ticks):
+        """Jump straight to the point in the up and down
+        movement pattern reached after a number of ticks.
+
+        Args:
+            ticks: An integer for the ticks of movement missed.
+        """
+        self.moved, self.up = bob_phase(ticks)
+        self.rect.y += self.moved
     
     def shoot(self):
         """Implement the original method from 
         the abstract Enemy class.
         """
-        return [Projectile(CE_PROJECTILE_DAMAGE, 
+        return [projectile_pool.acquire(CE_PROJECTILE_DAMAGE, 
                                 self.rect.center[0], 
                                 self.rect.center[1] - 25,
                                 str(self))]
@@ -504,10 +1136,11 @@ class Rare_Enemy(Enemy, Sprite):
         object has moved so far.
         max: An integer representing the maximum amount to move.
         image: Stores the loaded sprite for the enemy.
+        mask: The shared collision mask of the image.
         rect: A pygame rect object to store position.
     """
 
-    def __init__(self, x, y):
+    def __init__(self, x, y, rng=random):
         """Initialise and inherit necessary attributes and 
         methods from Sprite and Enemy classes. Define new ones
         specific to this class as well.
@@ -515,15 +1148,17 @@ class Rare_Enemy(Enemy, Sprite):
         Args:
             x: An integer for the x position.
             y: An integer for the y position.
+            rng: A random.Random instance or the random module.
         """
 
         Sprite.__init__(self)
-        Enemy.__init__(self)
+        Enemy.__init__(self, rng)
 
         self.set_health(RE_HEALTH)
         self.rarity = "Rare"
 
-        self.image = pygame.image.load(ASSETS_PATH + "rare_enemy.png")
+        self.image = assets.get("rare_enemy.png")
+        self.mask = assets.mask("rare_enemy.png")
         self.rect = self.image.get_rect(midbottom=(x, y))
 
         self.max = 300
@@ -538,28 +1173,39 @@ class Rare_Enemy(Enemy, Sprite):
 
         if self.direction == "R":
             if self.moved < self.max:
-                self.rect.x += 2
-                self.moved += 2
+                self.rect.x += RE_SPEED
+                self.moved += RE_SPEED
             else:
                 self.direction = "L"
 
         elif self.direction == "L":
             if self.moved > 0:
-                self.rect.x -= 2
-                self.moved -= 2
+                self.rect.x -= RE_SPEED
+                self.moved -= RE_SPEED
             else:
                 self.direction = "R"
+
+    def catch_up(self, ticks):
+        """Jump straight to the point in the side-to-side
+        movement pattern reached after a number of ticks.
+
+        Args:
+            ticks: An integer for the ticks of movement missed.
+        """
+        self.moved, right = sweep_phase(ticks, self.max)
+        self.direction = "R" if right else "L"
+        self.rect.x += self.moved
     
     def shoot(self):
         """Implement the original method from 
         the abstract Enemy class and add two projectiles
         every time shoot() is called.
         """
-        first = Projectile(RE_PROJECTILE_DAMAGE, 
+        first = projectile_pool.acquire(RE_PROJECTILE_DAMAGE, 
                                 self.rect.center[0], 
                                 self.rect.center[1] - 25,
                                 str(self))
-        second = Projectile(RE_PROJECTILE_DAMAGE, 
+        second = projectile_pool.acquire(RE_PROJECTILE_DAMAGE, 
                                 self.rect.center[0], 
                                 self.rect.center[1] + 25,
                                 str(self))
@@ -573,10 +1219,11 @@ class Ultra_Rare_Enemy(Enemy, Sprite):
         __health: Set to RE_HEALTH (from settings.py).
         direction: A string representing the direction of motion.
         image: Stores the loaded sprite for the enemy.
+        mask: The shared collision mask of the image.
         rect: A pygame rect object to store position.
     """
 
-    def __init__(self, x, y):
+    def __init__(self, x, y, rng=random):
         """Initialise and inherit necessary attributes and 
         methods from Sprite and Enemy classes. Define new ones
         specific to this class as well.
@@ -584,15 +1231,17 @@ class Ultra_Rare_Enemy(Enemy, Sprite):
         Args:
             x: An integer for the x position.
             y: An integer for the y position.
+            rng: A random.Random instance or the random module.
         """
         
         Sprite.__init__(self)
-        Enemy.__init__(self)
+        Enemy.__init__(self, rng)
 
         self.set_health(URE_HEALTH)
         self.rarity = "Ultra Rare"
 
-        self.image = pygame.image.load(ASSETS_PATH + "ultra_rare_enemy.png")
+        self.image = assets.get("ultra_rare_enemy.png")
+        self.mask = assets.mask("ultra_rare_enemy.png")
         self.rect = self.image.get_rect(midbottom=(x, y))
 
         self.direction = "R"
@@ -604,9 +1253,9 @@ class Ultra_Rare_Enemy(Enemy, Sprite):
         """
 
         if self.direction == "R":
-            self.rect.x += random.randint(0, 20)
+            self.rect.x += self.rng.randint(0, 20)
         elif self.direction == "L":
-            self.rect.x -= random.randint(0, 20)
+            self.rect.x -= self.rng.randint(0, 20)
         
         if self.rect.x >= SCREEN_WIDTH:
             self.direction = "L"
@@ -621,8 +1270,13 @@ class Ultra_Rare_Enemy(Enemy, Sprite):
 
         projectile_list = []
         for pos in range(self.rect.x-25, self.rect.x+26, 25):
-            projectile_list.append(Projectile(URE_PROJECTILE_DAMAGE, 
+            projectile_list.append(projectile_pool.acquire(URE_PROJECTILE_DAMAGE, 
                                           pos, 
                                           self.rect.center[1] - 25, 
                                           str(self)))
-        return projectile_list
\ No newline at end of file
+        return projectile_list
+
+# Enemy classes by the names used in the waves file
+ENEMY_TYPES = {"Common_Enemy": Common_Enemy,
+               "Rare_Enemy": Rare_Enemy,
+               "Ultra_Rare_Enemy": Ultra_Rare_Enemy}
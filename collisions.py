@@ -0,0 +1,168 @@
+"""This file contains the broadphase used to speed up collision checks.
+
+Rather than testing every projectile against every enemy, entities are
+bucketed into a uniform grid of square cells once per tick and only the
+entities sharing a cell with a projectile are handed to the exact check
+in Projectile.check_collision().
+
+Rects that overlap can still miss, as the sprites have transparent
+corners. When PIXEL_COLLISIONS is on, the Narrowphase then compares the
+shared masks of the two images and only counts a hit if opaque pixels
+overlap.
+"""
+
+from settings import *
+
+class Spatial_Hash():
+    """Bucket entities into grid cells by the area their rect covers.
+
+    Attributes:
+        cell_size: An integer for the width and height of each cell.
+        cells: A dict mapping (column, row) tuples to lists of entities.
+    """
+
+    def __init__(self, cell_size=None) -> None:
+        """Initialise an empty grid.
+
+        Args:
+            cell_size: An integer for the size of each square cell,
+            or None for COLLISION_CELL_SIZE.
+        """
+        self.cell_size = COLLISION_CELL_SIZE if cell_size is None else cell_size
+        self.cells = {}
+
+    def clear(self):
+        """Remove every entity from the grid."""
+        self.cells.clear()
+
+    def insert(self, entity, rect=None):
+        """Add an entity to every cell its rect overlaps.
+
+        Args:
+            entity: The object to store, usually a Sprite.
+            rect: A pygame Rect to bucket by, defaulting to entity.rect.
+        """
+        if rect is None:
+            rect = entity.rect
+        cells = self.cells
+        for key in self.__cells_for(rect):
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [entity]
+            else:
+                bucket.append(entity)
+
+    def insert_all(self, entities):
+        """Add every entity in an iterable, such as a sprite Group.
+
+        Args:
+            entities: An iterable of objects with a rect attribute.
+        """
+        for entity in entities:
+            self.insert(entity)
+
+    def query(self, rect):
+        """Find the entities sharing at least one cell with a rect.
+
+        Args:
+            rect: A pygame Rect to search around.
+
+        Returns:
+            A list of candidate entities, each appearing once, in the
+            order they were inserted into the first shared cell.
+        """
+        cells = self.cells
+        found = {}
+        for key in self.__cells_for(rect):
+            bucket = cells.get(key)
+            if bucket is not None:
+                for entity in bucket:
+                    found[entity] = None
+        return list(found)
+
+    def __cells_for(self, rect):
+        """Work out which cells a rect overlaps.
+
+        Colliding rects must share at least one pixel, so a rect is only
+        placed in the cells containing its pixels and not those it touches.
+
+        Args:
+            rect: A pygame Rect.
+
+        Returns:
+            A list of (column, row) tuples.
+        """
+        size = self.cell_size
+        left = rect.left // size
+        right = (rect.right - 1) // size
+        top = rect.top // size
+        bottom = (rect.bottom - 1) // size
+
+        if left == right and top == bottom:
+            return [(left, top)]
+        return [(column, row)
+                for column in range(left, right + 1)
+                for row in range(top, bottom + 1)]
+
+class Narrowphase():
+    """Confirm rect collisions against the sprites' pixel masks.
+
+    Attributes:
+        enabled: A boolean, False to trust the rect test alone.
+        tests: An integer counting the mask tests run since reset().
+        rejected: An integer counting the rect collisions
+        the mask tests found to be misses.
+    """
+
+    def __init__(self, enabled=None) -> None:
+        """Initialise the narrowphase.
+
+        Args:
+            enabled: A boolean to test masks after rects,
+            or None for PIXEL_COLLISIONS.
+        """
+        self.enabled = PIXEL_COLLISIONS if enabled is None else enabled
+        self.tests = 0
+        self.rejected = 0
+
+    def reset(self):
+        """Start counting tests for a new tick."""
+        self.tests = 0
+        self.rejected = 0
+
+    def collide(self, a, b):
+        """Check whether two sprites collide.
+
+        The cheap rect test runs first, and the masks are only
+        compared for rects that overlap.
+
+        Args:
+            a: A Sprite with rect and mask attributes.
+            b: Another Sprite with rect and mask attributes.
+
+        Returns:
+            A boolean, True if the sprites collide.
+        """
+        if not a.rect.colliderect(b.rect):
+            return False
+        if not self.enabled:
+            return True
+        return self.overlap(a.rect, a.mask, b.rect.topleft, b.mask)
+
+    def overlap(self, rect, mask, position, other):
+        """Compare two masks whose rects are known to overlap.
+
+        Args:
+            rect: A pygame Rect for the first mask.
+            mask: A pygame Mask placed at rect.
+            position: An (x, y) tuple for the top left of the other mask.
+            other: A pygame Mask.
+
+        Returns:
+            A boolean, True if any opaque pixels overlap.
+        """
+        self.tests += 1
+        if mask.overlap(other, (position[0] - rect.x, position[1] - rect.y)) is None:
+            self.rejected += 1
+            return False
+        return True
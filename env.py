@@ -0,0 +1,303 @@
+"""This file wraps the game in a reset/step environment for training agents.
+
+An Environment runs a headless game and takes one of four discrete actions
+each step: do nothing, move left, move right or fire. Observations are
+either a compact NumPy vector describing the player, enemies and
+projectiles, or a downsampled view of the screen read through surfarray.
+A Vector_Environment steps several environments in one call and writes
+their observations into a single preallocated array.
+
+    env = Environment(seed=0)
+    observation, info = env.reset()
+    observation, reward, terminated, truncated, info = env.step(FIRE)
+
+This needs NumPy to be installed.
+"""
+
+from settings import *
+from headless import Simulation
+from inputs import Controls
+from rendering import sprite_blits
+import numpy as np
+import pygame
+
+# The discrete actions and the controls each one holds down
+NOOP, LEFT, RIGHT, FIRE = range(4)
+ACTIONS = (Controls(False, False, False),
+           Controls(True, False, False),
+           Controls(False, True, False),
+           Controls(False, False, True))
+
+class Action_Input():
+    """An input source returning the controls of the current action.
+
+    Attributes:
+        controls: The Controls tuple returned by every poll().
+    """
+
+    def __init__(self) -> None:
+        """Start with no controls held down."""
+        self.controls = ACTIONS[NOOP]
+
+    def poll(self):
+        """Return the controls of the current action."""
+        return self.controls
+
+class Environment():
+    """A single game exposed through reset() and step().
+
+    Attributes:
+        observation: "state" for a vector or "screen" for pixels.
+        observation_shape: A tuple for the shape of each observation.
+        action_count: An integer for the number of discrete actions.
+        simulation: The headless Simulation being played.
+    """
+
+    def __init__(self, seed=None, observation="state", max_enemies=128,
+                 max_projectiles=64, scale=4, frame_skip=1, max_ticks=30000) -> None:
+        """Initialise the environment.
+
+        Args:
+            seed: An integer seed for the first game, each reset
+            without a seed then uses the next one.
+            observation: "state" or "screen".
+            max_enemies: An integer for the enemy slots in a state vector.
+            max_projectiles: An integer for the projectile slots in a
+            state vector.
+            scale: An integer the screen is downsampled by.
+            frame_skip: An integer for the ticks each action is held for.
+            max_ticks: An integer for the ticks before a game is cut short.
+        """
+        if observation not in ("state", "screen"):
+            raise ValueError("observation must be 'state' or 'screen'")
+
+        self.observation = observation
+        self.max_enemies = max_enemies
+        self.max_projectiles = max_projectiles
+        self.scale = scale
+        self.frame_skip = frame_skip
+        self.max_ticks = max_ticks
+        self.action_count = len(ACTIONS)
+
+        if observation == "state":
+            self.observation_shape = (2 + max_enemies * 3 + max_projectiles * 3,)
+            self.__buffer = np.zeros(self.observation_shape, dtype=np.float32)
+        else:
+            self.observation_shape = (SCREEN_HEIGHT // scale, SCREEN_WIDTH // scale, 3)
+            self.__buffer = np.zeros(self.observation_shape, dtype=np.uint8)
+            self.__surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+        self.__seed = seed
+        self.__input = Action_Input()
+        self.simulation = None
+
+    def reset(self, seed=None):
+        """Start a new game.
+
+        Args:
+            seed: An integer seed for the new game.
+
+        Returns:
+            A tuple of the first observation and an info dict.
+        """
+        if seed is not None:
+            self.__seed = seed
+        if self.simulation is not None:
+            self.simulation.close()
+        self.simulation = Simulation(self.__input, self.__seed)
+        if self.__seed is not None:
+            self.__seed += 1
+        return self.observe(), self.info()
+
+    def step(self, action, out=None):
+        """Hold an action for frame_skip ticks.
+
+        Args:
+            action: An integer from 0 to action_count - 1.
+            out: An optional array to write the observation into.
+
+        Returns:
+            A tuple of the observation, the reward (the score gained),
+            whether the game ended, whether it was cut short at
+            max_ticks and an info dict.
+        """
+        simulation = self.simulation
+        game = simulation.game
+        score = game.get_score()
+
+        self.__input.controls = ACTIONS[action]
+        for _ in range(self.frame_skip):
+            if not simulation.step():
+                break
+
+        terminated = game.is_game_over()
+        truncated = not terminated and simulation.ticks >= self.max_ticks
+        reward = game.get_score() - score
+        return self.observe(out), reward, terminated, truncated, self.info()
+
+    def info(self):
+        """Describe the game for logging.
+
+        Returns:
+            A dict with the score, level, player health and ticks.
+        """
+        game = self.simulation.game
+        return {"score": game.get_score(),
+                "level": game.level,
+                "health": self.simulation.player.get_health(),
+                "ticks": self.simulation.ticks}
+
+    def observe(self, out=None):
+        """Build the observation for the current tick.
+
+        Args:
+            out: An optional array of observation_shape to write into.
+            Otherwise the environment's own buffer is reused, so the
+            result is overwritten by the next observation.
+
+        Returns:
+            The observation array.
+        """
+        if out is None:
+            out = self.__buffer
+        if self.observation == "state":
+            self.__observe_state(out)
+        else:
+            self.__observe_screen(out)
+        return out
+
+    def __observe_state(self, out):
+        """Write the player, enemies and projectiles into a vector.
+
+        Positions are scaled to between 0 and 1. Each enemy slot holds
+        x, y and remaining health, and each projectile slot holds x, y
+        and 1 for enemy or -1 for player projectiles. Unused slots are 0.
+        """
+        game = self.simulation.game
+        player = self.simulation.player
+        out[:] = 0
+        out[0] = player.rect.centerx / SCREEN_WIDTH
+        out[1] = player.get_health() / PLAYER_HEALTH
+
+        enemies = out[2:2 + self.max_enemies * 3].reshape(self.max_enemies, 3)
+        if game.formation is not None and len(game.formation):
+            index, boxes = game.formation.boxes()
+            count = min(len(index), self.max_enemies)
+            enemies[:count, 0] = (boxes[:count, 0] + boxes[:count, 2] / 2) / SCREEN_WIDTH
+            enemies[:count, 1] = (boxes[:count, 1] + boxes[:count, 3] / 2) / SCREEN_HEIGHT
+            enemies[:count, 2] = game.formation.health[index[:count]]
+        else:
+            for slot, enemy in zip(range(self.max_enemies), game.enemy_list):
+                enemies[slot] = (enemy.rect.centerx / SCREEN_WIDTH,
+                                 enemy.rect.centery / SCREEN_HEIGHT,
+                                 enemy.get_health())
+
+        projectiles = out[2 + self.max_enemies * 3:].reshape(self.max_projectiles, 3)
+        for slot, projectile in zip(range(self.max_projectiles), game.projectile_list):
+            projectiles[slot] = (projectile.rect.centerx / SCREEN_WIDTH,
+                                 projectile.rect.centery / SCREEN_HEIGHT,
+                                 1 if projectile.fired_by == "Enemy" else -1)
+
+    def __observe_screen(self, out):
+        """Draw the game off screen and write every scale-th pixel.
+
+        The pixels are read through a surfarray view of the surface,
+        so only the downsampled pixels are copied.
+        """
+        game = self.simulation.game
+        surface = self.__surface
+        surface.fill(BLACK)
+
+        blits = []
+        for group in (game.player_group, game.projectile_list, game.enemy_list):
+            blits += sprite_blits(group)
+        if game.formation is not None:
+            blits += game.formation.blit_list()
+        surface.blits(blits, False)
+
+        # The view locks the surface, so it must be released before the next draw
+        pixels = pygame.surfarray.pixels3d(surface)
+        height, width = self.observation_shape[:2]
+        np.copyto(out, pixels[:width * self.scale:self.scale,
+                              :height * self.scale:self.scale].transpose(1, 0, 2))
+        del pixels
+
+class Vector_Environment():
+    """Step several environments together.
+
+    Finished games are reset straight away, and the observations
+    are written into one preallocated array. As with gym's vector
+    environments, a finished game's slot holds the first observation
+    of its new game, and the last observation and info dict of the
+    game that ended are kept in its info dict under
+    "final_observation" and "final_info".
+
+    Attributes:
+        environments: The list of Environment objects.
+        observations: An array holding every environment's observation.
+        rewards: A float array of the last rewards.
+        terminated: A boolean array of the games that just ended.
+        truncated: A boolean array of the games just cut short.
+    """
+
+    def __init__(self, count, seed=0, **options) -> None:
+        """Create the environments.
+
+        Args:
+            count: An integer for the number of environments.
+            seed: An integer seed, the first game of environment i
+            using seed + i and every later game a new seed.
+            options: Keyword arguments passed on to every Environment.
+        """
+        self.environments = [Environment(**options) for _ in range(count)]
+        # Every game gets the next seed, so no two games share one
+        self.__next_seed = seed
+
+        first = self.environments[0]
+        dtype = np.float32 if first.observation == "state" else np.uint8
+        self.observations = np.zeros((count,) + first.observation_shape, dtype=dtype)
+        self.rewards = np.zeros(count, dtype=np.float32)
+        self.terminated = np.zeros(count, dtype=bool)
+        self.truncated = np.zeros(count, dtype=bool)
+
+    def reset(self):
+        """Start a new game in every environment.
+
+        Returns:
+            The observations array.
+        """
+        for i, environment in enumerate(self.environments):
+            environment.reset(self.__next_seed)
+            self.__next_seed += 1
+            environment.observe(self.observations[i])
+        return self.observations
+
+    def step(self, actions):
+        """Apply one action to each environment.
+
+        Args:
+            actions: A sequence of integer actions, one per environment.
+
+        Returns:
+            A tuple of the observations, rewards, terminated and
+            truncated arrays, and a list of info dicts. The arrays
+            are reused by every call, so "final_observation" is
+            a copy.
+        """
+        infos = []
+        for i, (environment, action) in enumerate(zip(self.environments, actions)):
+            _, reward, terminated, truncated, info = environment.step(
+                int(action), self.observations[i])
+            if terminated or truncated:
+                final_observation = self.observations[i].copy()
+                _, reset_info = environment.reset(self.__next_seed)
+                self.__next_seed += 1
+                environment.observe(self.observations[i])
+                info = dict(reset_info, final_observation=final_observation,
+                            final_info=info)
+
+            self.rewards[i] = reward
+            self.terminated[i] = terminated
+            self.truncated[i] = truncated
+            infos.append(info)
+        return self.observations, self.rewards, self.terminated, self.truncated, infos
@@ -0,0 +1,236 @@
+"""This file decides when enemies fire and which enemies fire.
+
+The number of volleys fired each tick grows with the level without limit:
+one every ENEMY_FIRE_INTERVAL / level ticks, and several per tick once
+that interval is under one tick. Each enemy that fires then has to wait
+ENEMY_FIRE_COOLDOWN / level ticks, but at least one, before it can fire
+again, so a wave that has lost most of its enemies still fires faster
+at higher levels.
+
+A Fire_Scheduler keeps the enemies that are ready in a list, where a
+random one can be picked and removed in constant time, and the enemies
+cooling down in a heap ordered by the tick they are ready again, so
+waking them costs O(log n) each. Some volleys are aimed: they are fired by
+the ready enemy nearest the player's column. The ready enemies are also
+kept in a list sorted by the column they were in when they became ready,
+which is searched with bisect. Common enemies, most of every wave, only
+move up and down, so their column never goes out of date.
+
+Enemies in a Formation are not sprites, so formation.py has a
+Formation_Scheduler that tracks them by uid in the same way.
+"""
+
+from settings import *
+import heapq
+from bisect import bisect_left, insort
+
+def volleys_due(time, level):
+    """Work out how many volleys the enemies fire this tick.
+
+    Args:
+        time: An integer for the timer passed to Game.step().
+        level: An integer for the current level, at least 1.
+
+    Returns:
+        An integer, 0 on most ticks at low levels and
+        several on every tick at high levels.
+    """
+    interval = ENEMY_FIRE_INTERVAL // level
+    if interval >= 1:
+        return 1 if time % interval == 0 else 0
+
+    # Spread level / ENEMY_FIRE_INTERVAL volleys per tick evenly over ticks
+    return (level * (time + 1)) // ENEMY_FIRE_INTERVAL - (level * time) // ENEMY_FIRE_INTERVAL
+
+class Fire_Scheduler():
+    """Choose which enemy sprites fire, giving each a cooldown.
+
+    Attributes:
+        rng: The random.Random instance used to choose shooters.
+        cooldown: An integer for the ticks an enemy waits between shots.
+    """
+
+    def __init__(self, rng, cooldown=None) -> None:
+        """Initialise an empty scheduler.
+
+        Args:
+            rng: A random.Random instance.
+            cooldown: An integer for the ticks between an enemy's
+            shots, or None for ENEMY_FIRE_COOLDOWN.
+        """
+        self.rng = rng
+        self.cooldown = ENEMY_FIRE_COOLDOWN if cooldown is None else cooldown
+
+        self.__ready = []
+        self.__slots = {}
+        # (centre x, -bottom, uid, enemy) for every ready enemy, sorted
+        self.__columns = []
+        self.__keys = {}
+        # (tick ready, uid, enemy) for every enemy cooling down
+        self.__cooling = []
+
+    def __len__(self):
+        """Count the enemies ready to fire."""
+        return len(self.__ready)
+
+    def add(self, enemy):
+        """Start tracking an enemy, ready to fire straight away.
+
+        Args:
+            enemy: An Enemy sprite.
+        """
+        centre, bottom = self.position(enemy)
+        self.__insert(enemy, centre, bottom)
+
+    def remove(self, enemy):
+        """Stop an enemy being chosen, for example when it is destroyed.
+
+        Enemies cooling down are left in the heap and
+        skipped when they would be ready again.
+
+        Args:
+            enemy: An Enemy sprite.
+        """
+        slot = self.__slots.pop(enemy, None)
+        if slot is None:
+            return
+
+        # Move the last enemy into the gap so removal takes constant time
+        last = self.__ready.pop()
+        if last is not enemy:
+            self.__ready[slot] = last
+            self.__slots[last] = slot
+
+        key = self.__keys.pop(enemy)
+        del self.__columns[bisect_left(self.__columns, key)]
+
+    def choose(self, time):
+        """Pick a random enemy that is ready to fire.
+
+        Args:
+            time: An integer for the timer passed to Game.step().
+
+        Returns:
+            An Enemy sprite, or None if every enemy is cooling down.
+        """
+        self.__wake(time)
+        if not self.__ready:
+            return None
+        return self.__ready[self.rng.randrange(len(self.__ready))]
+
+    def choose_aimed(self, time, x):
+        """Pick the ready enemy nearest to a column of the screen,
+        the lowest one if several share that column.
+
+        Args:
+            time: An integer for the timer passed to Game.step().
+            x: An integer for the column to aim at, usually
+            the centre of the player.
+
+        Returns:
+            An Enemy sprite, or None if every enemy is cooling down.
+        """
+        self.__wake(time)
+        columns = self.__columns
+        if not columns:
+            return None
+
+        # The lowest enemy in the nearest column on each side of x
+        candidates = []
+        index = bisect_left(columns, (x,))
+        if index < len(columns):
+            candidates.append(columns[index])
+        if index > 0:
+            candidates.append(columns[bisect_left(columns, (columns[index - 1][0],))])
+        return min(candidates, key=lambda entry: (abs(entry[0] - x), entry[1]))[3]
+
+    def fired(self, enemy, time, level=1):
+        """Start an enemy's cooldown after it fires.
+
+        Args:
+            enemy: The Enemy sprite that fired.
+            time: An integer for the timer passed to Game.step().
+            level: An integer for the current level, which
+            divides the cooldown.
+        """
+        self.remove(enemy)
+        cooldown = max(1, self.cooldown // level)
+        heapq.heappush(self.__cooling, (time + cooldown, self.uid(enemy), enemy))
+
+    def clear(self):
+        """Stop tracking every enemy, ready or cooling down."""
+        for enemy in self.__ready:
+            self.attach(enemy, None)
+        for _, _, enemy in self.__cooling:
+            self.attach(enemy, None)
+        self.__ready = []
+        self.__slots = {}
+        self.__columns = []
+        self.__keys = {}
+        self.__cooling = []
+
+    def state(self):
+        """Describe the scheduler for saving in a snapshot.
+
+        Returns:
+            A tuple of a list of (uid, centre x, bottom) tuples for
+            the ready enemies, in order, with the column each is kept
+            under, and a list of (tick ready, uid) tuples for the
+            living enemies cooling down.
+        """
+        keys = self.__keys
+        return ([(keys[enemy][2], keys[enemy][0], -keys[enemy][1]) for enemy in self.__ready],
+                sorted((ready, uid) for ready, uid, enemy in self.__cooling
+                       if self.is_alive(enemy)))
+
+    def load(self, ready, cooling, enemies):
+        """Restore the state made by state().
+
+        Args:
+            ready: A list of (uid, centre x, bottom) tuples.
+            cooling: A list of (tick ready, uid) tuples.
+            enemies: A dict mapping uids to Enemy sprites.
+        """
+        self.clear()
+        for uid, centre, bottom in ready:
+            self.__insert(enemies[uid], centre, bottom)
+
+        for ready_at, uid in cooling:
+            enemy = enemies[uid]
+            self.attach(enemy, self)
+            self.__cooling.append((ready_at, uid, enemy))
+        heapq.heapify(self.__cooling)
+
+    def uid(self, enemy):
+        """Find the unique integer of a tracked enemy."""
+        return enemy.uid
+
+    def is_alive(self, enemy):
+        """Check whether a tracked enemy has not been destroyed."""
+        return enemy.alive()
+
+    def position(self, enemy):
+        """Find the centre x and bottom of a tracked enemy."""
+        return enemy.rect.centerx, enemy.rect.bottom
+
+    def attach(self, enemy, scheduler):
+        """Point an enemy at the scheduler tracking it, or at None."""
+        enemy.fire_scheduler = scheduler
+
+    def __insert(self, enemy, centre, bottom):
+        """Make an enemy ready, kept under the given column."""
+        self.attach(enemy, self)
+        self.__slots[enemy] = len(self.__ready)
+        self.__ready.append(enemy)
+
+        key = (centre, -bottom, self.uid(enemy))
+        self.__keys[enemy] = key
+        insort(self.__columns, key + (enemy,))
+
+    def __wake(self, time):
+        """Make every enemy whose cooldown has ended ready to fire."""
+        cooling = self.__cooling
+        while cooling and cooling[0][0] <= time:
+            _, _, enemy = heapq.heappop(cooling)
+            if self.is_alive(enemy):
+                self.add(enemy)
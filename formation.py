@@ -0,0 +1,539 @@
+"""This file contains an optional NumPy engine for moving whole enemy waves.
+
+Instead of one Sprite per enemy, a Formation keeps the position, health,
+rarity and movement state of every enemy in a wave in NumPy arrays. The
+up-and-down, side-to-side and random movement patterns of the three enemy
+classes are then advanced for the whole wave at once, and enemy rects are
+produced in bulk for drawing and collision checks.
+
+It is enabled with Game(formation=True) and needs NumPy to be installed.
+Run this file directly to compare it against the per-sprite enemies:
+
+    python formation.py --enemies 2000 --ticks 300
+"""
+
+from settings import *
+from assets import assets
+from classes import (projectile_pool, bob_phase, sweep_phase,
+                     Common_Enemy, Rare_Enemy, Ultra_Rare_Enemy)
+from firing import Fire_Scheduler
+from telemetry import telemetry
+import argparse
+import random
+import struct
+import time
+import pygame
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Codes stored in the rarity array, indexing into the tables below
+COMMON, RARE, ULTRA_RARE = 0, 1, 2
+
+KINDS = {Common_Enemy: COMMON,
+         Rare_Enemy: RARE,
+         Ultra_Rare_Enemy: ULTRA_RARE}
+
+RARITIES = ("Common", "Rare", "Ultra Rare")
+IMAGES = ("common_enemy.png", "rare_enemy.png", "ultra_rare_enemy.png")
+
+# Distance a common enemy bobs and a rare enemy sweeps before turning
+CE_RANGE = 50
+RE_RANGE = 300
+
+# The arrays saved by to_bytes(), with their types
+STATE_ARRAYS = (("x", "int32"), ("y", "int32"), ("width", "int32"),
+                ("height", "int32"), ("health", "int32"), ("rarity", "int8"),
+                ("direction", "int8"), ("moved", "int32"), ("alive", "bool"),
+                ("previous_x", "int32"), ("previous_y", "int32"),
+                ("uid", "uint32"))
+
+# Array length, enemies alive, the next uid and the random generator's spare bits
+STATE_HEADER = struct.Struct("<IIIBI")
+
+class Formation():
+    """Store and move a wave of enemies as parallel arrays.
+
+    Index i of every array describes the same enemy. Destroyed
+    enemies are marked in the alive array and removed in bulk.
+
+    Attributes:
+        x: Left edge of each enemy's rect.
+        y: Top edge of each enemy's rect.
+        width: Width of each enemy's rect.
+        height: Height of each enemy's rect.
+        health: Remaining health of each enemy.
+        rarity: One of COMMON, RARE or ULTRA_RARE for each enemy.
+        direction: 1 or -1, the way each enemy is currently moving.
+        moved: The distance each enemy has moved in its pattern.
+        alive: A boolean array marking enemies not yet destroyed.
+        uid: A unique integer for each enemy, rising with the index.
+        rng: The NumPy random generator used for random movement.
+        fire_scheduler: The Formation_Scheduler tracking
+        the enemies, or None.
+    """
+
+    def __init__(self, seed=None) -> None:
+        """Initialise an empty formation.
+
+        Args:
+            seed: An integer seed for the random movement of ultra
+            rare enemies, or None to take one from the random module.
+        """
+        if np is None:
+            raise ImportError("The formation engine requires NumPy, "
+                              "run 'pip install numpy' to use it.")
+
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.rng = np.random.default_rng(seed)
+
+        self.x = np.zeros(0, dtype=np.int32)
+        self.y = np.zeros(0, dtype=np.int32)
+        self.width = np.zeros(0, dtype=np.int32)
+        self.height = np.zeros(0, dtype=np.int32)
+        self.health = np.zeros(0, dtype=np.int32)
+        self.rarity = np.zeros(0, dtype=np.int8)
+        self.direction = np.zeros(0, dtype=np.int8)
+        self.moved = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.uid = np.zeros(0, dtype=np.uint32)
+        self.fire_scheduler = None
+
+        # Positions at the start of the last tick, for drawing between ticks
+        self.previous_x = self.x
+        self.previous_y = self.y
+
+        self.__count = 0
+        self.__next_uid = 1
+
+        # Read now rather than at import, so settings changed by a
+        # sweep apply to every formation made afterwards
+        self.__health = (CE_HEALTH, RE_HEALTH, URE_HEALTH)
+        self.__damage = (CE_PROJECTILE_DAMAGE, RE_PROJECTILE_DAMAGE, URE_PROJECTILE_DAMAGE)
+
+    def __len__(self):
+        """Count the enemies that have not been destroyed."""
+        return self.__count
+
+    def add_wave(self, enemy, x, y, gap, amount, extra_health=0, moves=0):
+        """Add a horizontal line of enemies, laid out the same way
+        as Game.generate_waves().
+
+        Args:
+            enemy: Common_Enemy, Rare_Enemy or Ultra_Rare_Enemy.
+            x: An integer for the starting x coordinate.
+            y: An integer for the starting y coordinate.
+            gap: An integer representing the gap between
+            each enemy in the wave.
+            amount: An integer for the amount of enemies
+            to generate in the wave.
+            extra_health: An integer added to each enemy's health.
+            moves: An integer for the ticks of movement each new
+            enemy has missed, to keep in step with earlier enemies.
+        """
+        kind = KINDS[enemy]
+        width, height = assets.get(IMAGES[kind]).get_size()
+
+        # Match get_rect(midbottom=(x, y)) for every enemy in the line
+        centres = x + gap * np.arange(amount, dtype=np.int32)
+        new_x = centres - width // 2
+        new_y = np.full(amount, y - height, dtype=np.int32)
+
+        # Common enemies start moving down and the rest start moving right
+        self.x = np.concatenate((self.x, new_x))
+        self.y = np.concatenate((self.y, new_y))
+        self.width = np.concatenate((self.width, np.full(amount, width, dtype=np.int32)))
+        self.height = np.concatenate((self.height, np.full(amount, height, dtype=np.int32)))
+        self.health = np.concatenate((self.health, np.full(amount, self.__health[kind] + extra_health, dtype=np.int32)))
+        self.rarity = np.concatenate((self.rarity, np.full(amount, kind, dtype=np.int8)))
+        self.direction = np.concatenate((self.direction, np.ones(amount, dtype=np.int8)))
+        self.moved = np.concatenate((self.moved, np.zeros(amount, dtype=np.int32)))
+        self.alive = np.concatenate((self.alive, np.ones(amount, dtype=bool)))
+        uids = np.arange(self.__next_uid, self.__next_uid + amount, dtype=np.uint32)
+        self.uid = np.concatenate((self.uid, uids))
+
+        self.__count += amount
+        self.__next_uid += amount
+
+        # Late enemies jump straight to the wave's point in its
+        # movement; ultra rare movement is random, so it is left
+        if moves and amount:
+            if kind == COMMON:
+                moved, up = bob_phase(moves, CE_RANGE)
+                self.y[-amount:] += moved
+                self.direction[-amount:] = -1 if up else 1
+                self.moved[-amount:] = moved
+            elif kind == RARE:
+                moved, right = sweep_phase(moves, RE_RANGE)
+                self.x[-amount:] += moved
+                self.direction[-amount:] = 1 if right else -1
+                self.moved[-amount:] = moved
+
+        if self.fire_scheduler is not None:
+            for uid in uids.tolist():
+                self.fire_scheduler.add(uid)
+
+    def update(self):
+        """Move every enemy by one tick of its movement pattern."""
+        if self.__count < len(self.alive) // 2:
+            self.compact()
+
+        self.previous_x = self.x.copy()
+        self.previous_y = self.y.copy()
+
+        alive = self.alive
+        rarity = self.rarity
+        direction = self.direction
+        moved = self.moved
+
+        # Common enemies bob down and up, turning at either end
+        bob = alive & (rarity == COMMON)
+        step = np.where(bob, direction * CE_SPEED, 0)
+        self.y += step
+        moved += step
+        turn = bob & ((moved == 0) | (moved == CE_RANGE))
+        direction[turn] = -direction[turn]
+
+        # Rare enemies sweep right then left, turning instead of
+        # moving on the tick they reach either end
+        sweep = alive & (rarity == RARE)
+        going_right = direction == 1
+        can_move = np.where(going_right, moved < RE_RANGE, moved > 0)
+        step = np.where(sweep & can_move, direction * RE_SPEED, 0)
+        self.x += step
+        moved += step
+        turn = sweep & ~can_move
+        direction[turn] = -direction[turn]
+
+        # Ultra rare enemies wander a random distance each tick
+        wander = np.flatnonzero(alive & (rarity == ULTRA_RARE))
+        if len(wander):
+            distance = self.rng.integers(0, 21, len(wander), dtype=np.int32)
+            self.x[wander] += direction[wander] * distance
+            direction[wander] = np.where(self.x[wander] >= SCREEN_WIDTH, -1,
+                                         np.where(self.x[wander] <= 0, 1, direction[wander]))
+
+    def boxes(self):
+        """Produce the rects of every living enemy at once.
+
+        Returns:
+            A tuple of the enemies' indices and an (n, 4) array of
+            their x, y, width and height.
+        """
+        index = np.flatnonzero(self.alive)
+        return index, np.stack((self.x[index], self.y[index],
+                                self.width[index], self.height[index]), axis=1)
+
+    def rects(self):
+        """Produce pygame Rects for every living enemy.
+
+        Returns:
+            A list of pygame Rect objects.
+        """
+        return [pygame.Rect(box) for box in self.boxes()[1].tolist()]
+
+    def collide(self, rect):
+        """Find the living enemies overlapping a rect.
+
+        Args:
+            rect: A pygame Rect, usually a projectile's.
+
+        Returns:
+            An array of the indices of the overlapping enemies.
+        """
+        x, y = self.x, self.y
+        hit = (self.alive
+               & (x < rect.right) & (x + self.width > rect.left)
+               & (y < rect.bottom) & (y + self.height > rect.top))
+        return np.flatnonzero(hit)
+
+    def mask(self, index):
+        """Find the collision mask of an enemy and where it is.
+
+        Args:
+            index: An integer for the enemy.
+
+        Returns:
+            A tuple of the (x, y) position of the enemy's top left
+            corner and the shared pygame Mask of its image.
+        """
+        position = (int(self.x[index]), int(self.y[index]))
+        return position, assets.mask(IMAGES[self.rarity[index]])
+
+    def damage(self, index, amount):
+        """Reduce the health of an enemy, destroying it at 0.
+
+        Args:
+            index: An integer for the enemy to damage.
+            amount: An integer for the damage given.
+
+        Returns:
+            An integer for the points scored, 0 unless
+            the enemy was destroyed.
+        """
+        if not self.alive[index]:
+            return 0
+
+        self.health[index] -= amount
+        if self.health[index] == 0:
+            self.alive[index] = False
+            self.__count -= 1
+            if self.fire_scheduler is not None:
+                self.fire_scheduler.remove(int(self.uid[index]))
+            rarity = RARITIES[self.rarity[index]]
+            telemetry.emit("kill", rarity,
+                           int(self.x[index] + self.width[index] // 2),
+                           int(self.y[index] + self.height[index] // 2))
+            return POINTS[rarity]
+        return 0
+
+    def index_of(self, uid):
+        """Find where an enemy is stored, which changes when
+        the arrays are compacted.
+
+        Args:
+            uid: An integer for the enemy.
+
+        Returns:
+            An integer index, or None if the enemy is no longer stored.
+        """
+        # The uids only rise, so the array is always sorted
+        index = int(np.searchsorted(self.uid, uid))
+        if index < len(self.uid) and self.uid[index] == uid:
+            return index
+        return None
+
+    def is_alive(self, uid):
+        """Check whether an enemy has not been destroyed.
+
+        Args:
+            uid: An integer for the enemy.
+
+        Returns:
+            A boolean, True while the enemy is alive.
+        """
+        index = self.index_of(uid)
+        return index is not None and bool(self.alive[index])
+
+    def shoot(self, index):
+        """Fire the projectiles an enemy sprite of the
+        same rarity would fire.
+
+        Args:
+            index: An integer for the enemy firing.
+
+        Returns:
+            A list of Projectile objects from the pool.
+        """
+        kind = int(self.rarity[index])
+        x, y = int(self.x[index]), int(self.y[index])
+        centre_x = x + int(self.width[index]) // 2
+        centre_y = y + int(self.height[index]) // 2
+        damage = self.__damage[kind]
+
+        if kind == COMMON:
+            positions = [(centre_x, centre_y - 25)]
+        elif kind == RARE:
+            positions = [(centre_x, centre_y - 25), (centre_x, centre_y + 25)]
+        else:
+            positions = [(pos, centre_y - 25) for pos in range(x-25, x+26, 25)]
+
+        return [projectile_pool.acquire(damage, pos_x, pos_y, "Enemy") for pos_x, pos_y in positions]
+
+    def blit_list(self, alpha=1.0):
+        """Build the blit sequence for every living enemy.
+
+        Args:
+            alpha: A float between 0 and 1 for how far to place each
+            enemy between its previous and current position.
+
+        Returns:
+            A list of (Surface, (x, y)) pairs for Surface.blits().
+        """
+        images = [assets.get(name) for name in IMAGES]
+        index = np.flatnonzero(self.alive)
+        x, y = self.x[index], self.y[index]
+
+        # Enemies added since the last tick have no previous position
+        if alpha < 1 and len(self.previous_x) == len(self.x):
+            previous_x, previous_y = self.previous_x[index], self.previous_y[index]
+            x = np.rint(previous_x + (x - previous_x) * alpha).astype(np.int32)
+            y = np.rint(previous_y + (y - previous_y) * alpha).astype(np.int32)
+
+        rarity = self.rarity[index].tolist()
+        return [(images[kind], position)
+                for kind, position in zip(rarity, zip(x.tolist(), y.tolist()))]
+
+    def draw(self, surface):
+        """Blit every living enemy onto a surface in one batch.
+
+        Args:
+            surface: The pygame Surface to draw on.
+        """
+        surface.blits(self.blit_list(), False)
+
+    def to_bytes(self):
+        """Save every array and the random generator's state.
+
+        Returns:
+            A bytes object to pass to from_bytes().
+        """
+        state = self.rng.bit_generator.state
+        parts = [STATE_HEADER.pack(len(self.alive), self.__count, self.__next_uid,
+                                   state["has_uint32"], state["uinteger"]),
+                 state["state"]["state"].to_bytes(16, "little"),
+                 state["state"]["inc"].to_bytes(16, "little")]
+        parts += [getattr(self, name).tobytes() for name, _ in STATE_ARRAYS]
+        return b"".join(parts)
+
+    def from_bytes(self, data):
+        """Restore the state saved by to_bytes().
+
+        Args:
+            data: A bytes-like object made by to_bytes().
+        """
+        length, self.__count, self.__next_uid, has_uint32, uinteger = STATE_HEADER.unpack_from(data)
+        offset = STATE_HEADER.size
+
+        state = self.rng.bit_generator.state
+        state["state"] = {"state": int.from_bytes(data[offset:offset + 16], "little"),
+                          "inc": int.from_bytes(data[offset + 16:offset + 32], "little")}
+        state["has_uint32"], state["uinteger"] = has_uint32, uinteger
+        self.rng.bit_generator.state = state
+        offset += 32
+
+        for name, dtype in STATE_ARRAYS:
+            array = np.frombuffer(data, dtype=dtype, count=length, offset=offset).copy()
+            setattr(self, name, array)
+            offset += array.nbytes
+
+    def compact(self):
+        """Drop destroyed enemies from every array."""
+        keep = self.alive
+        for name in ("x", "y", "width", "height", "health",
+                     "rarity", "direction", "moved", "alive", "uid"):
+            setattr(self, name, getattr(self, name)[keep])
+        self.previous_x = self.x
+        self.previous_y = self.y
+
+class Formation_Scheduler(Fire_Scheduler):
+    """Choose which enemies of a Formation fire, giving each a cooldown.
+
+    The enemies are tracked by their uids, which stay the same when
+    the formation's arrays are compacted, so picking a random ready
+    enemy takes constant time and an aimed pick O(log n), as for sprites.
+
+    Attributes:
+        formation: The Formation whose enemies are tracked.
+    """
+
+    def __init__(self, formation, rng, cooldown=None) -> None:
+        """Initialise the scheduler and attach it to a formation,
+        which adds every enemy added to it from then on.
+
+        Args:
+            formation: The Formation to track.
+            rng: A random.Random instance.
+            cooldown: An integer for the ticks between an enemy's
+            shots, or None for ENEMY_FIRE_COOLDOWN.
+        """
+        super().__init__(rng, cooldown)
+        self.formation = formation
+        formation.fire_scheduler = self
+
+    def position(self, enemy):
+        """Find the centre x and bottom of an enemy in the formation."""
+        formation = self.formation
+        index = formation.index_of(enemy)
+        return (int(formation.x[index] + formation.width[index] // 2),
+                int(formation.y[index] + formation.height[index]))
+
+    def uid(self, enemy):
+        """Formation enemies are tracked by their uid."""
+        return enemy
+
+    def is_alive(self, enemy):
+        """Check the formation for whether an enemy is alive."""
+        return self.formation.is_alive(enemy)
+
+    def attach(self, enemy, scheduler):
+        """Formation enemies are plain integers, so nothing is set."""
+        pass
+
+def benchmark(enemies, ticks):
+    """Time moving and drawing a wave as sprites and as a Formation.
+
+    Drawing is timed separately, as blitting every enemy costs
+    the same whichever way the enemies are stored.
+
+    Args:
+        enemies: An integer for the number of enemies in the wave.
+        ticks: An integer for the number of ticks to time.
+
+    Returns:
+        A dict with the milliseconds per tick spent moving and
+        drawing for each approach.
+    """
+    from pygame.sprite import Group
+
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    sprites = Group()
+    formation = Formation(seed=0)
+
+    # Lay the wave out in rows of 19, like the common enemy rows in
+    # Game.generate_enemies(), led by a single ultra rare enemy
+    layout = [(Ultra_Rare_Enemy, 45, 60, 1)]
+    remaining = enemies - 1
+    row = 0
+    while remaining > 0:
+        enemy = (Rare_Enemy, Common_Enemy, Common_Enemy)[row % 3]
+        amount = min(19, remaining)
+        layout.append((enemy, 50, 100 + (row * 10) % 450, amount))
+        remaining -= amount
+        row += 1
+
+    for enemy, x, y, amount in layout:
+        for i in range(amount):
+            sprites.add(enemy(x + 50 * i, y))
+        formation.add_wave(enemy, x, y, 50, amount)
+
+    results = {}
+    for name, move, draw in (("sprites", sprites.update, sprites.draw),
+                             ("formation", formation.update, formation.draw)):
+        start = time.perf_counter()
+        for _ in range(ticks):
+            move()
+        middle = time.perf_counter()
+        for _ in range(ticks):
+            draw(surface)
+        end = time.perf_counter()
+
+        results[name + "_move_ms"] = (middle - start) * 1000 / ticks
+        results[name + "_draw_ms"] = (end - middle) * 1000 / ticks
+    return results
+
+def main():
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description="Compare per-sprite enemies "
+                                                 "with the formation engine.")
+    parser.add_argument("--enemies", type=int, default=2000)
+    parser.add_argument("--ticks", type=int, default=300)
+    args = parser.parse_args()
+
+    # A display is needed for the enemy images to be converted
+    pygame.display.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+    results = benchmark(args.enemies, args.ticks)
+    print(f"{args.enemies} enemies, milliseconds per tick:")
+    for name in ("sprites", "formation"):
+        print(f"  {name:<10} move {results[name + '_move_ms']:8.3f}"
+              f"   draw {results[name + '_draw_ms']:8.3f}")
+    print(f"  formation moves "
+          f"{results['sprites_move_ms'] / results['formation_move_ms']:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""This file contains the governor that keeps frames within their time budget.
+
+When a frame takes longer than a tick, the game logic falls behind real time
+and the whole game slows down. A Frame_Governor keeps an average of how long
+recent frames took and, once it passes GOVERNOR_HIGH of FRAME_BUDGET, sheds
+work one step at a time, least noticeable first:
+
+    hud          redraw the score and health every GOVERNOR_HUD_INTERVAL frames
+    smoothing    draw sprites where they are at the last tick, not between ticks
+    grid         find collisions on a grid with cells twice the size
+                 while enemies outnumber projectiles
+    projectiles  stop enemies firing with GOVERNOR_PROJECTILE_CAP projectiles out
+
+The last two change how the game plays, so they are left out when a game
+must play the same as its recording. Once frames have stayed under
+GOVERNOR_LOW of the budget for GOVERNOR_RECOVER frames, the most recent
+step is undone. A step that has to be taken again soon after being undone
+doubles the wait before it is next undone, so the governor does not keep
+flipping between two steps. Every change is logged as a "governor"
+telemetry event.
+
+Larger cells make the grid cheaper to build but each projectile finds more
+candidates, so they only help when there are many more enemies than
+projectiles. While the grid step is taken the cell size is chosen again
+every frame.
+"""
+
+from settings import *
+from telemetry import telemetry
+
+STEPS = ("hud", "smoothing", "grid", "projectiles")
+GAMEPLAY_STEPS = ("grid", "projectiles")
+
+class Frame_Governor():
+    """Shed and restore work to keep frames within their budget.
+
+    Attributes:
+        budget: A float for the seconds each frame should take at most.
+        steps: A tuple of the names of the steps the governor may take.
+        level: An integer for how many steps are being taken.
+        average: A float for the smoothed seconds recent frames took.
+        changes: An integer counting the steps taken and undone.
+        frames: An integer counting the frames measured.
+        degraded: An integer counting the frames measured
+        while at least one step was taken.
+    """
+
+    def __init__(self, budget=FRAME_BUDGET, gameplay=True) -> None:
+        """Initialise a governor taking no steps.
+
+        Args:
+            budget: A float for the seconds each frame should take.
+            gameplay: A boolean, False to only take the steps that
+            do not change how the game plays.
+        """
+        self.budget = budget
+        self.steps = tuple(step for step in STEPS
+                           if gameplay or step not in GAMEPLAY_STEPS)
+        self.level = 0
+        self.average = 0.0
+
+        self.changes = 0
+        self.frames = 0
+        self.degraded = 0
+
+        self.__since_change = 0
+        self.__calm = 0
+        self.__patience = GOVERNOR_RECOVER
+        self.__restored = False
+
+    def update(self, seconds, game):
+        """Measure a frame, taking or undoing a step if needed.
+
+        Args:
+            seconds: A float for the time the frame took,
+            not counting time spent waiting for the next one.
+            game: The Game being played.
+
+        Returns:
+            A boolean which is True if the level changed.
+        """
+        # An average over roughly the last 10 frames
+        self.average += (seconds - self.average) * 0.1
+        self.frames += 1
+        self.__since_change += 1
+        if self.level:
+            self.degraded += 1
+            if "grid" in self.steps[:self.level]:
+                self.__set(game, "grid", True)
+
+        if self.average > self.budget * GOVERNOR_HIGH:
+            self.__calm = 0
+            if self.level < len(self.steps) and self.__since_change >= GOVERNOR_HOLD:
+                # Undoing the last step did not leave enough room, so wait longer next time
+                if self.__restored and self.__since_change < self.__patience:
+                    self.__patience = min(self.__patience * 2, GOVERNOR_RECOVER * 8)
+                self.__change(game, 1)
+                return True
+        elif self.average < self.budget * GOVERNOR_LOW:
+            self.__calm += 1
+            if self.__calm >= self.__patience:
+                if not self.level:
+                    self.__patience = GOVERNOR_RECOVER
+                else:
+                    self.__change(game, -1)
+                    return True
+        else:
+            self.__calm = 0
+        return False
+
+    def apply(self, game):
+        """Set up a game for the steps currently taken,
+        for example when a new game starts.
+
+        Args:
+            game: The Game to set up.
+        """
+        for index, step in enumerate(self.steps):
+            self.__set(game, step, index < self.level)
+
+    def stats(self):
+        """Summarise the governor's work.
+
+        Returns:
+            A dict with the current level and steps taken, the
+            smoothed frame time in milliseconds, the changes made
+            and the share of frames spent with a step taken.
+        """
+        return {"level": self.level,
+                "steps": list(self.steps[:self.level]),
+                "frame_ms": self.average * 1000,
+                "changes": self.changes,
+                "degraded": self.degraded / self.frames if self.frames else 0.0}
+
+    def __change(self, game, direction):
+        """Take the next step, or undo the last one."""
+        if direction > 0:
+            step = self.steps[self.level]
+            self.level += 1
+        else:
+            self.level -= 1
+            step = self.steps[self.level]
+        self.__set(game, step, direction > 0)
+
+        self.changes += 1
+        self.__restored = direction < 0
+        self.__since_change = 0
+        self.__calm = 0
+        telemetry.emit("governor", self.level, step, direction > 0,
+                       round(self.average * 1000, 2))
+
+    def __set(self, game, step, engaged):
+        """Take or undo a single step on a game."""
+        if step == "hud":
+            game.hud_interval = GOVERNOR_HUD_INTERVAL if engaged else 1
+        elif step == "smoothing":
+            game.set_smoothing(not engaged)
+        elif step == "grid":
+            coarse = engaged and game.count_enemies() > len(game.projectile_list)
+            game.set_collision_cell_size(COLLISION_CELL_SIZE * (2 if coarse else 1))
+        elif step == "projectiles":
+            game.projectile_cap = GOVERNOR_PROJECTILE_CAP if engaged else None
@@ -0,0 +1,162 @@
+"""This file runs the game logic without a window.
+
+A Simulation builds a headless Game, feeds it controls from an input
+source instead of the keyboard and advances it tick by tick as fast as
+the CPU allows, rather than at the 30 frames per second used by main.py.
+A Simulation can also save and restore its whole state, and keep the
+snapshots of its last few ticks so that it can be rolled back.
+It can be imported by other tools or run directly to measure tick rate:
+
+    python headless.py --ticks 10000
+"""
+
+from settings import *
+from classes import *
+from inputs import Scripted_Input
+from snapshot import capture, restore, Snapshot_Ring
+import argparse
+import time
+
+class Simulation():
+    """Step a headless game, keeping the same timer as main.py.
+
+    Attributes:
+        game: The headless Game instance being simulated.
+        player: The Player added to the game.
+        timer: An integer for the timer passed to Game.step().
+        ticks: An integer for the number of ticks simulated.
+        history: A Snapshot_Ring of the last ticks, or None
+        when they are not kept.
+    """
+
+    def __init__(self, controls=None, seed=None, history=0) -> None:
+        """Create the game and the player.
+
+        Args:
+            controls: An input source with a poll() method.
+            Defaults to a script where the player stays idle.
+            seed: An integer seed for the game's random numbers.
+            history: An integer for the ticks of snapshots to keep
+            for rewind(), or 0 to keep none.
+        """
+        if controls is None:
+            controls = Scripted_Input()
+
+        self.game = Game(headless=True, controls=controls, seed=seed)
+        self.player = Player(500, 540)
+        self.game.player_group.add(self.player)
+
+        self.timer = 0
+        self.ticks = 0
+
+        self.history = None
+        if history:
+            self.history = Snapshot_Ring(history)
+            self.history.push(0, self.save())
+
+    def step(self):
+        """Advance the game by one tick.
+
+        Returns:
+            A boolean which is False once the game is over.
+        """
+        if self.game.is_game_over():
+            return False
+
+        self.game.step(self.timer)
+
+        # Mirror the timer used by the loop in main.py
+        self.timer = 100 if self.timer == 0 else self.timer + 1
+        self.ticks += 1
+
+        if self.history is not None:
+            self.history.push(self.ticks, self.save())
+        return True
+
+    def save(self):
+        """Save the state of the simulation.
+
+        Returns:
+            A bytes object to pass to load().
+        """
+        return capture(self.game, self.timer, self.ticks)
+
+    def load(self, data):
+        """Restore a state made by save().
+
+        Input sources that can seek(), such as a script or a
+        replay, are moved to the restored tick as well.
+
+        Args:
+            data: A bytes object made by save().
+        """
+        self.timer, self.ticks = restore(self.game, data)
+        seek = getattr(self.game.controls, "seek", None)
+        if seek is not None:
+            seek(self.ticks)
+
+    def rewind(self, ticks):
+        """Roll the simulation back to an earlier tick.
+
+        Args:
+            ticks: An integer for the number of ticks to go back.
+
+        Raises:
+            ValueError: If that tick is no longer kept in history.
+        """
+        data = None
+        if self.history is not None:
+            data = self.history.get(self.ticks - ticks)
+        if data is None:
+            raise ValueError(f"Tick {self.ticks - ticks} is not kept in history")
+        self.load(data)
+
+    def close(self):
+        """Free the game, handing its projectiles back to the pool.
+        The simulation cannot be stepped afterwards.
+        """
+        self.game.close()
+        self.history = None
+
+    def run(self, ticks):
+        """Advance the game by several ticks, stopping early
+        if the game ends.
+
+        Args:
+            ticks: An integer for the most ticks to simulate.
+
+        Returns:
+            An integer for the number of ticks simulated.
+        """
+        start = self.ticks
+        for _ in range(ticks):
+            if not self.step():
+                break
+        return self.ticks - start
+
+def main():
+    """Simulate a game with a simple scripted player and report
+    how many ticks per second were simulated.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=10000,
+                        help="the most ticks to simulate")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="the seed for the game's random numbers")
+    args = parser.parse_args()
+
+    # Sweep left and right while firing
+    script = lambda tick: ((tick // 40) % 2 == 0, (tick // 40) % 2 == 1, True)
+    simulation = Simulation(Scripted_Input(script), args.seed)
+
+    start = time.perf_counter()
+    ticks = simulation.run(args.ticks)
+    elapsed = time.perf_counter() - start
+
+    print(f"Simulated {ticks} ticks in {elapsed:.2f}s "
+          f"({ticks / elapsed:.0f} ticks/s)")
+    print(f"Level {simulation.game.level}, score {simulation.game.get_score()}, "
+          f"health {simulation.player.get_health()}")
+
+if __name__ == "__main__":
+    main()
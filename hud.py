@@ -0,0 +1,123 @@
+"""This file contains the cached text shown over the game.
+
+Rendering text with a font is slow compared to blitting a surface, so the
+score and health numbers are composed from digit glyphs rendered once, and
+only when their value changes. The game over screen is composed once per
+game, so leaving it up costs almost nothing.
+"""
+
+from settings import *
+from assets import assets
+import pygame
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def get_font(size):
+    """Access the default font at a size, creating it only once.
+
+    Looking up a system font is slow, so every Game and the
+    profiler share the fonts made by this function.
+
+    Args:
+        size: An integer for the height of the font.
+
+    Returns:
+        A pygame Font.
+    """
+    return pygame.font.SysFont(None, size)
+
+class Number_Text():
+    """Show an integer using digit glyphs rendered once.
+
+    Attributes:
+        value: The integer currently shown.
+        image: A pygame Surface showing the value.
+        renders: An integer counting how many times the image
+        has been composed.
+    """
+
+    def __init__(self, font, colour, value=0) -> None:
+        """Render the glyphs and compose the first value.
+
+        Args:
+            font: The pygame Font to render the digits with.
+            colour: An RGB tuple for the colour of the digits.
+            value: The integer to show at first.
+        """
+        self.__glyphs = {char: font.render(char, True, colour)
+                         for char in "-0123456789"}
+        self.__height = font.get_height()
+
+        self.value = None
+        self.image = None
+        self.renders = 0
+        self.set(value)
+
+    def set(self, value):
+        """Change the value shown, composing a new image only
+        if it is different from the current one.
+
+        Args:
+            value: The integer to show.
+
+        Returns:
+            A boolean which is True if the image was recomposed.
+        """
+        if value == self.value:
+            return False
+
+        glyphs = [self.__glyphs[char] for char in str(value)]
+        image = pygame.Surface((sum(glyph.get_width() for glyph in glyphs), self.__height),
+                               pygame.SRCALPHA)
+        x = 0
+        for glyph in glyphs:
+            image.blit(glyph, (x, 0))
+            x += glyph.get_width()
+
+        self.value = value
+        self.image = image
+        self.renders += 1
+        return True
+
+def compose_game_over(font, big_font, score_text, score_rect):
+    """Compose the whole game over screen onto one surface.
+
+    Args:
+        font: The pygame Font used for normal text.
+        big_font: The pygame Font used for the title.
+        score_text: A pygame Surface showing the final score.
+        score_rect: The pygame Rect the score is shown at during
+        play, which is moved next to the final score label.
+
+    Returns:
+        A tuple of the screen-sized pygame Surface and the
+        pygame Rect of the play again button.
+    """
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    screen.fill(BLACK)
+
+    go_text = big_font.render("Game Over", True, RED)
+    go_text_rect = go_text.get_rect()
+    go_text_rect.center = (SCREEN_WIDTH//2, SCREEN_HEIGHT//2-80)
+
+    final_text = font.render("Final Score: ", True, WHITE)
+    final_rect = final_text.get_rect()
+    final_rect.center = (SCREEN_WIDTH//2-40, SCREEN_HEIGHT//2-20)
+    score_rect = score_rect.copy()
+    score_rect.center = (SCREEN_WIDTH//2+100, final_rect.center[1])
+
+    play_again_btn = assets.get("button.png")
+    btn_rect = play_again_btn.get_rect()
+    btn_rect.center = (SCREEN_WIDTH//2, SCREEN_HEIGHT//2+60)
+
+    play_again_txt = font.render("Play Again", True, WHITE)
+    txt_rect = play_again_txt.get_rect()
+    txt_rect.center = btn_rect.center
+
+    screen.blit(go_text, go_text_rect)
+    screen.blit(final_text, final_rect)
+    screen.blit(score_text, score_rect)
+    screen.blit(play_again_btn, btn_rect)
+    screen.blit(play_again_txt, txt_rect)
+
+    return screen, btn_rect
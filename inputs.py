@@ -0,0 +1,281 @@
+"""This file contains the input sources that control the player.
+
+The game reads a Controls tuple from an input source once, at the start of
+every tick, and hands the same tuple to everything that acts on it, instead
+of asking pygame for the keyboard state directly. This lets the same game
+logic be driven by the keyboard while playing, or by a script, a recording
+(see replay.py) or a simple bot when the game runs without a window.
+
+A Latency_Meter measures how long each key press takes to reach the
+screen: from the key press event, to the tick that first reads it, to the
+first frame shown after that tick.
+"""
+
+from settings import *
+import threading
+import time
+import pygame
+from collections import namedtuple, deque
+
+# The state of the three player actions for a single tick
+Controls = namedtuple("Controls", ["left", "right", "fire"])
+
+IDLE = Controls(False, False, False)
+
+# The action each key controls
+KEYS = {pygame.K_a: "left", pygame.K_LEFT: "left",
+        pygame.K_d: "right", pygame.K_RIGHT: "right",
+        pygame.K_SPACE: "fire"}
+
+class Keyboard_Input():
+    """Read the player controls from the keyboard.
+
+    Key presses passed to handle_event() count as held down on the
+    next poll() even if the key was let go before it, so a tap shorter
+    than a tick is not lost. Events can be handled on one thread while
+    another thread polls.
+
+    Attributes:
+        meter: A Latency_Meter told about every press and poll, or None.
+    """
+
+    def __init__(self, meter=None) -> None:
+        """Initialise the keyboard input.
+
+        Args:
+            meter: A Latency_Meter to measure key presses with.
+        """
+        self.meter = meter
+        self.__pressed = set()
+        self.__lock = threading.Lock()
+
+    def handle_event(self, event):
+        """Note a key press from the event queue.
+
+        Args:
+            event: A pygame Event.
+        """
+        if event.type == pygame.KEYDOWN and event.key in KEYS:
+            action = KEYS[event.key]
+            with self.__lock:
+                self.__pressed.add(action)
+            if self.meter is not None:
+                self.meter.press(action)
+
+    def poll(self):
+        """Sample the keyboard.
+
+        Returns:
+            A Controls tuple for the keys currently held down
+            or pressed since the last poll.
+        """
+        keys = pygame.key.get_pressed()
+        with self.__lock:
+            pressed, self.__pressed = self.__pressed, set()
+        controls = Controls(bool(keys[pygame.K_a] or keys[pygame.K_LEFT]) or "left" in pressed,
+                            bool(keys[pygame.K_d] or keys[pygame.K_RIGHT]) or "right" in pressed,
+                            bool(keys[pygame.K_SPACE]) or "fire" in pressed)
+
+        if self.meter is not None:
+            self.meter.sampled(controls)
+        return controls
+
+class Latency_Meter():
+    """Measure the time from each key press to the screen.
+
+    Presses, ticks and frames can be noted on different threads.
+
+    Attributes:
+        samples: A dict mapping each action to a deque of
+        (press to tick, press to display) times in seconds.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW) -> None:
+        """Initialise the meter.
+
+        Args:
+            window: An integer for the presses kept for each action.
+        """
+        self.samples = {action: deque(maxlen=window) for action in Controls._fields}
+        # Each press waiting to be shown, as [action, pressed, sampled]
+        self.__pending = []
+        self.__lock = threading.Lock()
+
+    def press(self, action, when=None):
+        """Note that a key was pressed.
+
+        Args:
+            action: "left", "right" or "fire".
+            when: A float from time.perf_counter(), defaulting to now.
+        """
+        press = [action, time.perf_counter() if when is None else when, None]
+        with self.__lock:
+            self.__pending.append(press)
+
+    def sampled(self, controls):
+        """Note that a tick read the controls.
+
+        Args:
+            controls: The Controls tuple the tick read.
+        """
+        now = time.perf_counter()
+        with self.__lock:
+            for press in self.__pending:
+                if press[2] is None and getattr(controls, press[0]):
+                    press[2] = now
+
+    def presented(self):
+        """Note that a frame has been shown, finishing the measurement
+        of every press a tick has read since the last frame.
+        """
+        now = time.perf_counter()
+        waiting = []
+        with self.__lock:
+            for action, pressed, sampled in self.__pending:
+                if sampled is None:
+                    waiting.append([action, pressed, sampled])
+                else:
+                    self.samples[action].append((sampled - pressed, now - pressed))
+            self.__pending = waiting
+
+    def report(self):
+        """Summarise the measured presses.
+
+        Returns:
+            A dict mapping each action with presses to a dict of the
+            number of presses, the mean time to the tick and the mean,
+            p50, p95 and maximum time to the screen, in milliseconds.
+        """
+        report = {}
+        with self.__lock:
+            measured = {action: list(samples) for action, samples in self.samples.items()}
+        for action, samples in measured.items():
+            if not samples:
+                continue
+            to_tick = [sample[0] * 1000 for sample in samples]
+            to_display = sorted(sample[1] * 1000 for sample in samples)
+            last = len(to_display) - 1
+            report[action] = {"presses": len(samples),
+                              "tick_ms": sum(to_tick) / len(to_tick),
+                              "mean_ms": sum(to_display) / len(to_display),
+                              "p50_ms": to_display[round(last * 0.5)],
+                              "p95_ms": to_display[round(last * 0.95)],
+                              "max_ms": to_display[-1]}
+        return report
+
+class Scripted_Input():
+    """Read the player controls from a prepared script.
+
+    Attributes:
+        script: A sequence of Controls-like tuples, one per tick, or a
+        function taking the tick number and returning one.
+        tick: An integer for the number of times poll() has been called.
+    """
+
+    def __init__(self, script=()) -> None:
+        """Initialise the script.
+
+        Args:
+            script: A sequence of (left, right, fire) tuples or a
+            function of the tick number. Ticks past the end of a
+            sequence are idle.
+        """
+        self.script = script
+        self.tick = 0
+
+    def poll(self):
+        """Read the controls for the next tick.
+
+        Returns:
+            A Controls tuple.
+        """
+        tick = self.tick
+        self.tick += 1
+
+        if callable(self.script):
+            return Controls(*self.script(tick))
+        if tick < len(self.script):
+            return Controls(*self.script[tick])
+        return IDLE
+
+    def seek(self, tick):
+        """Carry on from another tick of the script,
+        for example when a game is rolled back.
+
+        Args:
+            tick: An integer for the tick the next poll() reads.
+        """
+        self.tick = tick
+
+class Bot_Input():
+    """Play the game automatically.
+
+    The bot fires constantly, steps out of the way of enemy
+    projectiles about to hit it and otherwise moves under the
+    lowest enemy.
+
+    Attributes:
+        game: The Game being played, which must be set
+        before the first call to poll().
+    """
+
+    def __init__(self, game=None) -> None:
+        """Initialise the bot.
+
+        Args:
+            game: The Game to play, if it already exists.
+        """
+        self.game = game
+
+    def poll(self):
+        """Decide the controls for the next tick.
+
+        Returns:
+            A Controls tuple.
+        """
+        game = self.game
+        player = game.player_group.sprites()[0].rect
+
+        # Dodge the closest enemy projectile heading for the player
+        threat = None
+        for projectile in game.projectile_list:
+            rect = projectile.rect
+            if projectile.fired_by == "Enemy" and rect.bottom > player.top - 120 \
+                    and rect.right > player.left - 10 and rect.left < player.right + 10:
+                if threat is None or rect.bottom > threat.bottom:
+                    threat = rect
+        if threat is not None:
+            go_left = threat.centerx >= player.centerx
+            if go_left and player.left < 20:
+                go_left = False
+            elif not go_left and player.right > SCREEN_WIDTH - 20:
+                go_left = True
+            return Controls(go_left, not go_left, True)
+
+        target = lowest_enemy_x(game)
+        if target is None or abs(target - player.centerx) < 5:
+            return Controls(False, False, True)
+        return Controls(target < player.centerx, target > player.centerx, True)
+
+def lowest_enemy_x(game):
+    """Find the x coordinate of the lowest enemy.
+
+    Args:
+        game: The Game being played.
+
+    Returns:
+        An integer for the centre of the enemy closest to the
+        bottom of the screen, or None if there are no enemies.
+    """
+    lowest = None
+    for enemy in game.enemy_list:
+        if lowest is None or enemy.rect.bottom > lowest.bottom:
+            lowest = enemy.rect
+    if lowest is not None:
+        return lowest.centerx
+
+    if game.formation is not None and len(game.formation):
+        index, boxes = game.formation.boxes()
+        row = boxes[(boxes[:, 1] + boxes[:, 3]).argmax()]
+        return int(row[0] + row[2] // 2)
+    return None
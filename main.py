@@ -3,58 +3,257 @@
 This file initialises the pygame module and defines some necessary variables. 
 It contains a while loop to run the game logic contained within the classes 
 imported from the 'classes' file. 
+
+The game logic runs at a fixed SIM_RATE ticks per second, however fast
+frames can be drawn. Run with --record PATH to save each game for
+playback with replay.py, --show-rates to show the measured tick
+and frame rates in the window title, --profile PATH to time each
+phase of every frame and save the results to a CSV or JSON file on exit,
+--latency to print how long key presses took to reach the screen,
+--telemetry DIR to log gameplay events to compressed files in DIR, or
+--capture DIR to save every frame shown to DIR as one raw RGB file, or as
+PNG files with --capture-format png.
+
+A Frame_Governor sheds work when frames take longer than a tick, and
+restores it once there is room again. Run with --no-governor to turn it off.
+
+Run with --threaded to simulate the game on a worker thread while the main
+thread draws and presents frames, printing on exit how long the two
+threads were busy at the same time. The governor is not used in this mode.
+
+Only the display and font modules of pygame are started, and the sprites
+are decoded on a background thread while the window opens. The time from
+launch to the first frame drawn is printed once the game is playable.
 """
 
+import time
+launched = time.perf_counter()
+
 import pygame
 import sys
+import argparse
 from settings import *
 from classes import *
+from assets import assets
+from inputs import Keyboard_Input, Latency_Meter
+from replay import Recorder
+from timing import Fixed_Step_Clock
+from profiler import Frame_Profiler
+from telemetry import telemetry
+from capture import Frame_Capture
+from governor import Frame_Governor
+from pipeline import Simulation_Thread, Overlap_Meter, draw_state, RENDER
+
+def main():
+    """Open the window and run games until it is closed."""
+    parser = argparse.ArgumentParser(description="Play Space Invaders.")
+    parser.add_argument("--record", metavar="PATH",
+                        help="save each game to PATH so it can be replayed")
+    parser.add_argument("--show-rates", action="store_true",
+                        help="show the tick and frame rates in the window title")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="time each frame and save the results to PATH on exit")
+    parser.add_argument("--latency", action="store_true",
+                        help="measure the time from key presses to the screen")
+    parser.add_argument("--telemetry", metavar="DIR",
+                        help="log gameplay events to compressed files in DIR")
+    parser.add_argument("--capture", metavar="DIR",
+                        help="save every frame shown to DIR")
+    parser.add_argument("--capture-format", choices=("raw", "png"), default="raw",
+                        help="save frames as one raw RGB file or PNG files")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="never shed work when frames run over budget")
+    parser.add_argument("--threaded", action="store_true",
+                        help="run the game logic on its own thread")
+    args = parser.parse_args()
+
+    # Copies each frame shown for worker processes to encode when --capture is
+    # used, made first as the workers may be forked before anything else starts
+    capture = Frame_Capture(args.capture, args.capture_format) if args.capture else None
+
+    if args.telemetry:
+        telemetry.start(args.telemetry)
+
+    # The game has no sound or joysticks, so only start what it uses
+    pygame.display.init()
+    pygame.font.init()
 
-pygame.init()
+    # Decode the sprites while the window is being opened
+    assets.preload_async()
 
-# This will be used later to decide frame-rate
-clock = pygame.time.Clock()
+    # This will be used later to decide frame-rate
+    clock = pygame.time.Clock()
 
-# Allow for intervals between player and enemy shooting
-timer = 0
+    # Decides how many ticks of game logic to run before each frame
+    sim_clock = Fixed_Step_Clock()
 
-# Used to initiate and store an instance of the Game class
-game = None
-start = True
+    # Times each phase of a frame, kept across games and shown with F3
+    profiler = Frame_Profiler(enabled=args.profile is not None)
+
+    # Sheds work when frames run over budget, only in ways that keep a
+    # recorded game playing the same as its recording when --record is used
+    governor = None
+    if not args.no_governor and not args.threaded:
+        governor = Frame_Governor(gameplay=args.record is None)
+
+    # Steps the game on a worker thread when --threaded is used, timing how
+    # long it and the main thread are busy at once across every game
+    simulation = None
+    overlap = Overlap_Meter() if args.threaded else None
+
+    # The keyboard is read once per tick, and every key press is passed to it
+    # so that taps shorter than a tick still register
+    meter = Latency_Meter() if args.latency else None
+    keyboard = Keyboard_Input(meter)
+
+    # Allow for intervals between player and enemy shooting
+    timer = 0
+
+    # Used to initiate and store an instance of the Game class
+    game = None
+    start = True
+
+    # Records the controls of the current game when --record is used
+    recorder = None
+
+    # Seconds from launch to the first frame, measured once
+    first_frame = None
   
-while True:
-    # Check whether the game has been initialised
-    if start:
-        # If not, define the needed variables
-        game = Game()
-        player = Player(500, 540)
-        game.player_group.add(player)
-        start = False
-
-    # Close the game window, if the user clicks 'X' on the window
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            pygame.quit(); sys.exit()
+    while True:
+        # Check whether the game has been initialised
+        if start:
+            # If not, define the needed variables
+            if args.record:
+                recorder = Recorder(keyboard)
+            # Free the last game's sprites now rather than when they are collected
+            if game is not None:
+                game.close()
+
+            # The profiler is only timed from the main thread
+            game = Game(controls=keyboard if recorder is None else recorder,
+                        profiler=None if args.threaded else profiler)
+            player = Player(500, 540)
+            game.player_group.add(player)
+            if governor is not None:
+                governor.apply(game)
+            if args.threaded:
+                simulation = Simulation_Thread(game, overlap)
+                simulation.start()
+            start = False
+
+            # Every game starts from the same timer so it can be replayed
+            timer = 0
+            sim_clock.reset()
+
+        profiler.begin()
+        frame_start = time.perf_counter()
+
+        # Close the game window, if the user clicks 'X' on the window
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                if simulation is not None:
+                    simulation.stop()
+                    report = overlap.report()
+                    print(f"Simulation busy {report['simulation_busy']:.1f} s, "
+                          f"drawing busy {report['render_busy']:.1f} s, "
+                          f"both busy {report['both_busy']:.1f} s "
+                          f"({report['overlap']:.0%} overlap) over {report['seconds']:.1f} s, "
+                          f"{report['parallelism']:.2f} threads running on average, "
+                          f"{simulation.buffer.stalls} stalls")
+                if args.profile:
+                    profiler.export(args.profile)
+                telemetry.stop()
+                if capture is not None:
+                    stats = capture.close()
+                    print(f"Captured {stats['captured']} frames, dropped {stats['dropped']}, "
+                          f"{stats['copy_ms']:.2f} ms to copy, "
+                          f"{stats['latency_ms']:.1f} ms to encode "
+                          f"(p95 {stats['latency_p95_ms']:.1f})")
+                    if stats["dropped"]:
+                        print(f"Warning: {stats['drop_rate']:.0%} of frames were dropped as "
+                              f"encoding fell behind, so the capture is not smooth. Raise "
+                              f"CAPTURE_SLOTS and CAPTURE_WORKERS, or use the raw format.")
+                if meter is not None:
+                    for action, values in meter.report().items():
+                        print(f"{action:<6} {values['presses']:>4} presses, "
+                              f"{values['tick_ms']:.1f} ms to the tick, "
+                              f"{values['mean_ms']:.1f} ms to the screen "
+                              f"(p95 {values['p95_ms']:.1f}, max {values['max_ms']:.1f})")
+                pygame.quit(); sys.exit()
+
+            keyboard.handle_event(event)
+
+            # Switch between dirty rectangle and full screen updates
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F2:
+                game.renderer.set_dirty(not game.renderer.dirty)
+
+            # Show or hide the profiler overlay
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.overlay = not profiler.overlay
+                profiler.enabled = profiler.enabled or profiler.overlay
+
+        profiler.lap("events")
     
-    # Check if the game is over
-    if game.is_game_over():
-        game.on_game_over()
-
-        # Give the player to restart the game by clicking a button
-        if game.btn_rect.collidepoint(pygame.mouse.get_pos()):
-            if pygame.mouse.get_pressed()[0] == 1:
-                start = True       
-    else:
-        # If there are no enemies left, generate them
-        if len(game.enemy_list.sprites()) == 0:
-            game.level += 1
-            game.generate_enemies()
-
-        # Update, draw and display the game
-        game.check_collisions()
-        game.update_groups(timer)
-        game.draw_groups()
-
-    # Increase timer and frames
-    timer = 100 if timer == 0 else timer + 1 
-    clock.tick(30)
\ No newline at end of file
+        # Check if the game is over
+        if game.is_game_over():
+            if simulation is not None:
+                # Wait for the last tick, so only this thread uses the game
+                simulation.stop()
+            game.on_game_over()
+
+            if recorder is not None:
+                recorder.save(args.record, game)
+                recorder = None
+
+            # Give the player to restart the game by clicking a button
+            if game.btn_rect.collidepoint(pygame.mouse.get_pos()):
+                if pygame.mouse.get_pressed()[0] == 1:
+                    start = True       
+        else:
+            drawn = False
+            if simulation is not None:
+                # The game is ticking on its own thread, so draw its latest state
+                state = simulation.buffer.acquire()
+                overlap.enter(RENDER)
+                draw_state(game, state, simulation.alpha(state), profiler)
+                overlap.leave(RENDER)
+                simulation.buffer.release()
+                drawn = True
+            else:
+                # Update the game as many ticks as are due, increasing the timer
+                for _ in range(sim_clock.advance()):
+                    game.step(timer)
+                    timer = 100 if timer == 0 else timer + 1 
+                    if game.is_game_over():
+                        break
+
+                # Draw and display the game between the last two ticks
+                if not game.is_game_over():
+                    game.draw_groups(sim_clock.alpha)
+                    drawn = True
+
+            if drawn:
+                if meter is not None:
+                    meter.presented()
+                if capture is not None:
+                    capture.capture(game.screen)
+
+                if first_frame is None:
+                    first_frame = time.perf_counter() - launched
+                    print(f"First frame drawn {first_frame * 1000:.0f} ms after launch")
+
+        profiler.end(enemies=game.count_enemies(), projectiles=len(game.projectile_list),
+                     mask_tests=game.narrowphase.tests,
+                     mask_rejected=game.narrowphase.rejected)
+
+        if governor is not None and not game.is_game_over():
+            governor.update(time.perf_counter() - frame_start, game)
+
+        if sim_clock.frame() and args.show_rates:
+            sim_rate = sim_clock.sim_rate if simulation is None else simulation.clock.sim_rate
+            pygame.display.set_caption(f"Space Invaders - {sim_rate:.0f} ticks/s, "
+                                       f"{sim_clock.render_rate:.0f} fps")
+        clock.tick(MAX_FPS)
+
+if __name__ == "__main__":
+    main()
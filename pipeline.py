@@ -0,0 +1,355 @@
+"""This file runs the game logic on its own thread, apart from drawing.
+
+Normally every tick and every frame run one after another on the main
+thread, so time spent drawing and waiting for the display is time the
+game logic cannot use. A Simulation_Thread instead steps the Game at a
+fixed rate on a worker thread. After each batch of ticks it fills in a
+Render_State with everything needed to draw a frame: the image and the
+previous and current position of every sprite, and the score, health and
+level. The main thread draws and presents frames from the latest state,
+while the next ticks are being simulated.
+
+The states are double buffered in a Render_Buffer. The main thread
+acquire()s the front state, draws from it and release()s it. The
+simulation fills the back state and publish()es it, which makes it the
+front. A published state is never written again until the main thread has
+let go of it, so a frame is never drawn from a half updated state. If the
+simulation publishes twice while one frame is being drawn, it waits for
+the frame to finish before reusing the state being drawn.
+
+An Overlap_Meter records how long each thread is busy, and how long both
+are busy at the same time. Python only runs one thread's code at a time,
+so the threads truly overlap only while pygame is drawing or presenting
+with the interpreter lock released. The meter also adds up the CPU time
+each thread used while busy: divided by the time either thread was busy,
+this gives how many threads were really running at once on average.
+
+    python main.py --threaded
+"""
+
+from settings import *
+from timing import Fixed_Step_Clock
+import threading
+import time
+
+SIMULATION = 0
+RENDER = 1
+
+class Render_State():
+    """Everything needed to draw one frame, read only once published.
+
+    Attributes:
+        tick: An integer for the ticks simulated before this state.
+        time: A float from time.perf_counter() for when it was made.
+        score: An integer for the score.
+        health: An integer for the player's health.
+        level: An integer for the level.
+        game_over: A boolean, True once the player has no health.
+        sprites: A list of (Surface, previous x, previous y, x, y)
+        tuples, one per sprite, in the order they are drawn.
+    """
+
+    def __init__(self) -> None:
+        """Initialise an empty state."""
+        self.tick = 0
+        self.time = 0.0
+        self.score = 0
+        self.health = 0
+        self.level = 0
+        self.game_over = False
+        self.sprites = []
+
+    def fill(self, game, tick):
+        """Copy what is needed to draw a game, reusing the sprite list.
+
+        Args:
+            game: The Game to copy from, between ticks.
+            tick: An integer for the ticks simulated so far.
+        """
+        player = game.player_group.sprite
+        self.tick = tick
+        self.score = game.get_score()
+        self.health = player.get_health()
+        self.level = game.level
+        self.game_over = game.is_game_over()
+
+        sprites = self.sprites
+        sprites.clear()
+        for group in (game.player_group, game.projectile_list, game.enemy_list):
+            for sprite in group:
+                x, y = sprite.rect.topleft
+                previous_x, previous_y = getattr(sprite, "previous", (x, y))
+                sprites.append((sprite.image, previous_x, previous_y, x, y))
+
+        if game.formation is not None:
+            # Enemies that cannot be interpolated come back at their current position
+            for (image, (previous_x, previous_y)), (_, (x, y)) in zip(
+                    game.formation.blit_list(0.0), game.formation.blit_list(1.0)):
+                sprites.append((image, previous_x, previous_y, x, y))
+        self.time = time.perf_counter()
+
+class Render_Buffer():
+    """Pass Render_States from the simulation thread to the main
+    thread through two buffers.
+
+    Attributes:
+        published: An integer counting the states published.
+        stalls: An integer counting the times the simulation
+        waited for a frame to finish drawing.
+        stall_time: A float for the seconds spent waiting.
+    """
+
+    def __init__(self) -> None:
+        """Initialise the two empty states."""
+        self.published = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+
+        self.__states = (Render_State(), Render_State())
+        self.__front = None
+        self.__back = 0
+        self.__reading = None
+        self.__condition = threading.Condition()
+
+    def back(self):
+        """Access the state to fill next, from the simulation thread,
+        waiting if a frame is still being drawn from it.
+
+        Returns:
+            A Render_State to fill and then publish().
+        """
+        with self.__condition:
+            index = 1 if self.__front == 0 else 0
+            if self.__reading == index:
+                start = time.perf_counter()
+                self.stalls += 1
+                while self.__reading == index:
+                    self.__condition.wait()
+                self.stall_time += time.perf_counter() - start
+            self.__back = index
+        return self.__states[index]
+
+    def publish(self):
+        """Make the state filled since back() the front state."""
+        with self.__condition:
+            self.__front = self.__back
+            self.published += 1
+
+    def acquire(self):
+        """Take the latest state to draw a frame from, on the main thread.
+
+        Returns:
+            The front Render_State, or None if none has been published.
+            It must be handed back with release() once drawn.
+        """
+        with self.__condition:
+            if self.__front is None:
+                return None
+            self.__reading = self.__front
+            return self.__states[self.__front]
+
+    def release(self):
+        """Hand back the state taken by acquire()."""
+        with self.__condition:
+            self.__reading = None
+            self.__condition.notify_all()
+
+class Overlap_Meter():
+    """Measure how long the simulation and main threads are busy,
+    and how long they are both busy at once.
+    """
+
+    def __init__(self) -> None:
+        """Start measuring with neither thread busy."""
+        self.__lock = threading.Lock()
+        self.__busy = [False, False]
+        self.__times = [0.0, 0.0]
+        self.__both = 0.0
+        self.__either = 0.0
+        self.__cpu = [0.0, 0.0]
+        self.__cpu_start = [0.0, 0.0]
+        self.__started = self.__since = time.perf_counter()
+
+    def enter(self, thread):
+        """Note that a thread has started work.
+
+        Args:
+            thread: SIMULATION or RENDER.
+        """
+        self.__cpu_start[thread] = time.thread_time()
+        with self.__lock:
+            self.__account()
+            self.__busy[thread] = True
+
+    def leave(self, thread):
+        """Note that a thread has finished its work.
+
+        Args:
+            thread: SIMULATION or RENDER.
+        """
+        self.__cpu[thread] += time.thread_time() - self.__cpu_start[thread]
+        with self.__lock:
+            self.__account()
+            self.__busy[thread] = False
+
+    def report(self):
+        """Summarise the time measured.
+
+        Returns:
+            A dict with the seconds measured, the seconds each thread
+            was busy, the seconds both were busy, the share of the less
+            busy thread's time spent overlapping the other, the CPU
+            seconds each thread used while busy and the average number
+            of threads running while either was busy.
+        """
+        with self.__lock:
+            self.__account()
+            simulation, render = self.__times
+            both = self.__both
+            either = self.__either
+            seconds = self.__since - self.__started
+        least = min(simulation, render)
+        cpu = sum(self.__cpu)
+        return {"seconds": seconds,
+                "simulation_busy": simulation,
+                "render_busy": render,
+                "both_busy": both,
+                "overlap": both / least if least else 0.0,
+                "simulation_cpu": self.__cpu[SIMULATION],
+                "render_cpu": self.__cpu[RENDER],
+                "parallelism": cpu / either if either else 0.0}
+
+    def __account(self):
+        """Add the time since the last change to each busy thread."""
+        now = time.perf_counter()
+        elapsed = now - self.__since
+        self.__since = now
+        busy = self.__busy
+        if busy[SIMULATION]:
+            self.__times[SIMULATION] += elapsed
+        if busy[RENDER]:
+            self.__times[RENDER] += elapsed
+        if busy[SIMULATION] and busy[RENDER]:
+            self.__both += elapsed
+        if busy[SIMULATION] or busy[RENDER]:
+            self.__either += elapsed
+
+class Simulation_Thread():
+    """Step a Game at a fixed rate on a worker thread.
+
+    Attributes:
+        game: The Game being simulated. Only this thread may change it
+        while running, until the game is over or stop() is called.
+        buffer: The Render_Buffer the states are published to.
+        meter: The Overlap_Meter told when the thread is busy.
+        clock: The Fixed_Step_Clock deciding when to tick.
+        tick: An integer counting the ticks simulated.
+        timer: An integer for the timer passed to Game.step().
+    """
+
+    def __init__(self, game, meter=None) -> None:
+        """Prepare to simulate a game.
+
+        Args:
+            game: The Game to simulate, with its player added.
+            meter: An Overlap_Meter, defaulting to a new one.
+        """
+        self.game = game
+        self.buffer = Render_Buffer()
+        self.meter = Overlap_Meter() if meter is None else meter
+        self.clock = Fixed_Step_Clock()
+        self.tick = 0
+        self.timer = 0
+
+        self.__stopping = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        """Publish the first state and start ticking."""
+        state = self.buffer.back()
+        state.fill(self.game, self.tick)
+        self.buffer.publish()
+
+        self.clock.reset()
+        self.__stopping.clear()
+        self.__thread = threading.Thread(target=self.__run, name="simulation", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """Stop ticking and wait for the current tick to finish."""
+        if self.__thread is None:
+            return
+        self.__stopping.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def alpha(self, state):
+        """Work out how far between ticks to draw a state now.
+
+        Args:
+            state: A Render_State from the buffer.
+
+        Returns:
+            A float between 0 and 1.
+        """
+        return min((time.perf_counter() - state.time) / self.clock.step, 1.0)
+
+    def __run(self):
+        """Tick until stopped or the game ends. This runs on its own thread."""
+        game = self.game
+        clock = self.clock
+        while not self.__stopping.is_set():
+            steps = clock.advance()
+            if steps:
+                self.meter.enter(SIMULATION)
+                for _ in range(steps):
+                    game.step(self.timer)
+                    self.timer = 100 if self.timer == 0 else self.timer + 1
+                    self.tick += 1
+                    if game.is_game_over():
+                        break
+
+                state = self.buffer.back()
+                state.fill(game, self.tick)
+                self.buffer.publish()
+                clock.frame()
+                self.meter.leave(SIMULATION)
+
+                if state.game_over:
+                    break
+
+            # Sleep until the next tick is due
+            self.__stopping.wait((1 - clock.alpha) * clock.step)
+
+def draw_state(game, state, alpha=1.0, profiler=None):
+    """Draw and present a frame from a Render_State, on the main thread.
+
+    Args:
+        game: The Game whose renderer and HUD text to draw with.
+        state: The Render_State to draw.
+        alpha: A float between 0 and 1 for how far to place each
+        sprite between its previous and current position.
+        profiler: A Frame_Profiler to time drawing and presenting
+        with and to draw the overlay of, or None.
+    """
+    game.score_number.set(state.score)
+    game.health_number.set(state.health)
+    blits = [(game.score_number.image, game.score_text_rect),
+             (game.health_number.image, game.health_text_rect)]
+
+    if alpha >= 1:
+        blits += [(image, (x, y)) for image, _, _, x, y in state.sprites]
+    else:
+        blits += [(image, (round(previous_x + (x - previous_x) * alpha),
+                           round(previous_y + (y - previous_y) * alpha)))
+                  for image, previous_x, previous_y, x, y in state.sprites]
+
+    if profiler is not None and profiler.overlay and profiler.enabled:
+        blits.append((profiler.overlay_surface(), (10, 10)))
+
+    game.renderer.draw(blits)
+    if profiler is not None:
+        profiler.lap("draw")
+    game.renderer.present()
+    if profiler is not None:
+        profiler.lap("present")
@@ -0,0 +1,174 @@
+"""This file contains the profiler that times each phase of a frame.
+
+The main loop and the Game mark the end of each phase (polling events,
+spawning, collisions, updating, drawing and presenting the frame) with
+lap(), and the profiler keeps the times of the most recent frames along
+with entity counts. From these it works out rolling percentiles, which
+can be drawn over the game and exported to CSV or JSON. When disabled
+every method returns straight away, so the calls can stay in the loop at
+almost no cost.
+"""
+
+from settings import *
+from hud import get_font
+import csv
+import json
+import time
+import pygame
+from collections import deque
+
+class Frame_Profiler():
+    """Time the phases of recent frames.
+
+    Attributes:
+        enabled: A boolean, False to skip all timing.
+        overlay: A boolean, True to draw the statistics over the game.
+        frames: A deque of dicts, one per recent frame, mapping each
+        phase to its time in milliseconds and each count to its value.
+    """
+
+    def __init__(self, enabled=False, window=PROFILE_WINDOW) -> None:
+        """Initialise the profiler.
+
+        Args:
+            enabled: A boolean to start timing straight away.
+            window: An integer for the number of recent frames kept.
+        """
+        self.enabled = enabled
+        self.overlay = False
+        self.frames = deque(maxlen=window)
+
+        self.__times = {}
+        self.__start = self.__last = time.perf_counter()
+
+        self.__font = None
+        self.__overlay_image = None
+        self.__overlay_age = 0
+
+    def begin(self):
+        """Start timing a new frame."""
+        if not self.enabled:
+            return
+        self.__times = {}
+        self.__start = self.__last = time.perf_counter()
+
+    def lap(self, phase):
+        """Add the time since the last lap to a phase.
+
+        A phase can be lapped several times in one frame, for example
+        when several ticks are simulated, and the times are added up.
+
+        Args:
+            phase: A string naming the phase that just finished.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.__times[phase] = self.__times.get(phase, 0.0) + now - self.__last
+        self.__last = now
+
+    def end(self, **counts):
+        """Finish timing the frame and store its record.
+
+        Args:
+            counts: Integers to store with the frame, such as
+            the number of enemies and projectiles.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        record = {phase: seconds * 1000 for phase, seconds in self.__times.items()}
+        record["frame"] = (now - self.__start) * 1000
+        record.update(counts)
+        self.frames.append(record)
+
+    def percentiles(self, key):
+        """Work out the 50th, 95th and 99th percentiles of a value
+        over the recent frames.
+
+        Args:
+            key: A string for a phase, "frame" or a count.
+
+        Returns:
+            A tuple of three floats, all 0 if there are no frames.
+        """
+        values = sorted(frame.get(key, 0) for frame in self.frames)
+        if not values:
+            return (0.0, 0.0, 0.0)
+        last = len(values) - 1
+        return tuple(float(values[round(last * p)]) for p in (0.5, 0.95, 0.99))
+
+    def summary(self):
+        """Summarise every value recorded over the recent frames.
+
+        Returns:
+            A dict mapping each key to a dict of its
+            mean and p50, p95 and p99 percentiles.
+        """
+        summary = {}
+        for key in self.__keys():
+            p50, p95, p99 = self.percentiles(key)
+            mean = sum(frame.get(key, 0) for frame in self.frames) / len(self.frames)
+            summary[key] = {"mean": mean, "p50": p50, "p95": p95, "p99": p99}
+        return summary
+
+    def overlay_surface(self):
+        """Render the statistics for drawing over the game.
+
+        The text is only re-rendered every PROFILE_OVERLAY_INTERVAL
+        frames, so showing the overlay costs little itself.
+
+        Returns:
+            A pygame Surface with one line per recorded value.
+        """
+        self.__overlay_age += 1
+        if self.__overlay_image is not None and self.__overlay_age < PROFILE_OVERLAY_INTERVAL:
+            return self.__overlay_image
+        self.__overlay_age = 0
+
+        if self.__font is None:
+            self.__font = get_font(22)
+
+        lines = ["phase          p50     p95     p99"]
+        for key, values in self.summary().items():
+            lines.append(f"{key:<12}{values['p50']:>7.2f} {values['p95']:>7.2f} {values['p99']:>7.2f}")
+
+        rendered = [self.__font.render(line, True, GREEN) for line in lines]
+        height = self.__font.get_linesize()
+        image = pygame.Surface((max(line.get_width() for line in rendered),
+                                height * len(rendered)), pygame.SRCALPHA)
+        image.fill((0, 0, 0, 160))
+        for i, line in enumerate(rendered):
+            image.blit(line, (0, i * height))
+
+        self.__overlay_image = image
+        return image
+
+    def export(self, path):
+        """Save the recent frames to a file.
+
+        A path ending in .json saves the summary and every frame,
+        and anything else saves one CSV row per frame.
+
+        Args:
+            path: A string for the file to write.
+        """
+        if path.endswith(".json"):
+            with open(path, "w") as file:
+                json.dump({"summary": self.summary(),
+                           "frames": list(self.frames)}, file, indent=2)
+            return
+
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=self.__keys(), restval=0)
+            writer.writeheader()
+            writer.writerows(self.frames)
+
+    def __keys(self):
+        """List every key recorded in the recent frames,
+        in the order they were first seen.
+        """
+        keys = {}
+        for frame in self.frames:
+            keys.update(dict.fromkeys(frame))
+        return list(keys)
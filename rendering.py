@@ -0,0 +1,145 @@
+"""This file contains the renderer that presents each frame on the display.
+
+In dirty rectangle mode only the areas that changed since the last frame
+are cleared and sent to the display, instead of filling and updating the
+whole window every frame. Every sprite is drawn with a single batched
+Surface.blits() call. The renderer counts the rects and pixels it sends to
+the display, so both modes can be compared.
+"""
+
+from settings import *
+import pygame
+
+def sprite_blits(group, alpha=1.0):
+    """Build the blit sequence for a group of sprites.
+
+    Args:
+        group: A pygame sprite Group.
+        alpha: A float between 0 and 1 for how far to place each sprite
+        between the position stored in its previous attribute at the
+        start of the last tick and its current position.
+
+    Returns:
+        A list of (Surface, position) pairs for Renderer.render().
+    """
+    if alpha >= 1:
+        return [(sprite.image, sprite.rect) for sprite in group]
+
+    blits = []
+    for sprite in group:
+        x, y = sprite.rect.topleft
+        previous_x, previous_y = getattr(sprite, "previous", (x, y))
+        blits.append((sprite.image, (round(previous_x + (x - previous_x) * alpha),
+                                     round(previous_y + (y - previous_y) * alpha))))
+    return blits
+
+class Renderer():
+    """Draw a frame of sprites and push it to the display.
+
+    Attributes:
+        screen: The display Surface drawn on.
+        dirty: A boolean, True to only update the areas that changed.
+        frames: An integer counting the frames presented.
+        rects_updated: An integer for the rects sent in the last frame.
+        pixels_pushed: An integer for the pixels sent in the last frame.
+        total_pixels: An integer for the pixels sent in every frame.
+    """
+
+    def __init__(self, screen, dirty=DIRTY_RECTS) -> None:
+        """Initialise the renderer.
+
+        Args:
+            screen: The display Surface to draw on.
+            dirty: A boolean to start in dirty rectangle mode.
+        """
+        self.screen = screen
+        self.dirty = dirty
+
+        self.frames = 0
+        self.rects_updated = 0
+        self.pixels_pushed = 0
+        self.total_pixels = 0
+
+        # Areas drawn last frame, or None when a full redraw is needed
+        self.__previous = None
+        self.__changed = None
+
+    def set_dirty(self, enabled):
+        """Switch dirty rectangle mode on or off.
+
+        Args:
+            enabled: A boolean, True for dirty rectangle mode.
+        """
+        self.dirty = enabled
+        self.invalidate()
+
+    def invalidate(self):
+        """Force the next frame to redraw the whole screen, for
+        example after something else has drawn on it.
+        """
+        self.__previous = None
+
+    def render(self, blits):
+        """Draw a frame and update the display.
+
+        Args:
+            blits: A list of (Surface, position) pairs to draw,
+            in order, onto a black background.
+        """
+        self.draw(blits)
+        self.present()
+
+    def draw(self, blits):
+        """Draw a frame onto the screen without showing it yet.
+
+        Args:
+            blits: A list of (Surface, position) pairs to draw,
+            in order, onto a black background.
+        """
+        screen = self.screen
+
+        if not self.dirty or self.__previous is None:
+            screen.fill(BLACK)
+            drawn = screen.blits(blits)
+
+            # None means the whole screen must be updated
+            self.__changed = None
+            if self.dirty:
+                self.__previous = drawn
+        else:
+            # Erase everything drawn last frame, then redraw
+            for rect in self.__previous:
+                screen.fill(BLACK, rect)
+            drawn = screen.blits(blits)
+
+            self.__changed = self.__previous + drawn
+            self.__previous = drawn
+
+    def present(self):
+        """Update the display with the frame drawn by draw()."""
+        changed = self.__changed
+
+        if changed is None:
+            pygame.display.update()
+            self.rects_updated = 1
+            self.pixels_pushed = SCREEN_WIDTH * SCREEN_HEIGHT
+        else:
+            pygame.display.update(changed)
+            self.rects_updated = len(changed)
+            self.pixels_pushed = sum(rect.width * rect.height for rect in changed)
+
+        self.frames += 1
+        self.total_pixels += self.pixels_pushed
+
+    def stats(self):
+        """Summarise the work done presenting frames.
+
+        Returns:
+            A dict with the mode, the rects and pixels sent in the
+            last frame and the average pixels sent per frame.
+        """
+        return {"mode": "dirty" if self.dirty else "full",
+                "frames": self.frames,
+                "rects_updated": self.rects_updated,
+                "pixels_pushed": self.pixels_pushed,
+                "average_pixels": self.total_pixels / self.frames if self.frames else 0}
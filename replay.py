@@ -0,0 +1,209 @@
+"""This file records games and plays them back exactly.
+
+Every random choice in a game comes from the Game's own seeded random
+number generator, so a game can be reproduced from its seed and the
+controls used on each tick. A Recorder wraps the player's input source and
+stores one byte per tick, which is saved with the seed and the final result
+in a small binary file. Replays can be run headless as fast as the CPU
+allows, or shown in a window at a chosen speed:
+
+    python main.py --record game.rpl
+    python replay.py game.rpl --headless
+    python replay.py game.rpl --speed 4
+"""
+
+from settings import *
+from inputs import Controls, Scripted_Input
+import argparse
+import struct
+import sys
+import time
+import zlib
+from collections import namedtuple
+
+MAGIC = b"SIRP"
+VERSION = 7
+
+# Magic, version, seed, ticks recorded, final score and game over flag
+HEADER = struct.Struct("<4sBQIIB")
+
+# A loaded recording, with the inputs as one byte per tick
+Replay = namedtuple("Replay", ["seed", "inputs", "score", "ticks", "game_over"])
+
+def encode(controls):
+    """Pack a Controls tuple into the bits of a single byte."""
+    return controls.left | controls.right << 1 | controls.fire << 2
+
+def decode(byte):
+    """Unpack a byte written by encode() into a Controls tuple."""
+    return Controls(bool(byte & 1), bool(byte & 2), bool(byte & 4))
+
+class Recorder():
+    """Wrap an input source, recording the controls it returns.
+
+    Attributes:
+        source: The input source being recorded.
+        inputs: A bytearray with one encoded byte per tick.
+    """
+
+    def __init__(self, source) -> None:
+        """Initialise an empty recording.
+
+        Args:
+            source: An input source with a poll() method.
+        """
+        self.source = source
+        self.inputs = bytearray()
+
+    def poll(self):
+        """Read and record the controls for the next tick.
+
+        Returns:
+            The Controls tuple returned by the wrapped source.
+        """
+        controls = self.source.poll()
+        self.inputs.append(encode(controls))
+        return controls
+
+    def seek(self, tick):
+        """Forget the controls recorded from a tick onwards,
+        for example when a game is rolled back, and move the
+        wrapped source there too if it can.
+
+        Args:
+            tick: An integer for the tick the next poll() records.
+        """
+        del self.inputs[tick:]
+        seek = getattr(self.source, "seek", None)
+        if seek is not None:
+            seek(tick)
+
+    def save(self, path, game):
+        """Write the recording and the game's result to a file.
+
+        Args:
+            path: A string for the file to write.
+            game: The Game that was recorded.
+        """
+        header = HEADER.pack(MAGIC, VERSION, game.seed, len(self.inputs),
+                             game.get_score(), game.is_game_over())
+        with open(path, "wb") as file:
+            file.write(header)
+            file.write(zlib.compress(bytes(self.inputs)))
+
+def load(path):
+    """Read a recording saved by Recorder.save().
+
+    Args:
+        path: A string for the file to read.
+
+    Returns:
+        A Replay tuple.
+
+    Raises:
+        ValueError: If the file is not a recording of a known version.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+
+    magic, version, seed, ticks, score, game_over = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} recording")
+
+    inputs = zlib.decompress(data[HEADER.size:])
+    return Replay(seed, inputs, score, ticks, bool(game_over))
+
+def controls_for(replay):
+    """Build an input source that plays back a recording."""
+    return Scripted_Input([decode(byte) for byte in replay.inputs])
+
+def play_headless(replay):
+    """Re-run a recording without a window, as fast as possible.
+
+    Args:
+        replay: A Replay tuple.
+
+    Returns:
+        A tuple of the final score, the ticks simulated and
+        whether the game was over.
+    """
+    from headless import Simulation
+
+    simulation = Simulation(controls_for(replay), replay.seed)
+    simulation.run(replay.ticks)
+    game = simulation.game
+    return game.get_score(), simulation.ticks, game.is_game_over()
+
+def play_rendered(replay, speed=1.0):
+    """Re-run a recording in a window.
+
+    Args:
+        replay: A Replay tuple.
+        speed: A float multiplying the normal 30 frames per second,
+        or 0 to play back as fast as possible.
+
+    Returns:
+        A tuple of the final score, the ticks simulated and
+        whether the game was over.
+    """
+    import pygame
+    from classes import Game, Player
+
+    pygame.display.init()
+    pygame.font.init()
+    clock = pygame.time.Clock()
+
+    game = Game(controls=controls_for(replay), seed=replay.seed)
+    game.player_group.add(Player(500, 540))
+
+    timer = 0
+    ticks = 0
+    while ticks < replay.ticks and not game.is_game_over():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit(); sys.exit()
+
+        game.step(timer)
+        game.draw_groups()
+
+        timer = 100 if timer == 0 else timer + 1
+        ticks += 1
+        if speed > 0:
+            clock.tick(30 * speed)
+
+    if game.is_game_over():
+        game.on_game_over()
+    return game.get_score(), ticks, game.is_game_over()
+
+def main():
+    """Play back a recording from the command line and check
+    that it reproduces the recorded result.
+    """
+    parser = argparse.ArgumentParser(description="Play back a recorded game.")
+    parser.add_argument("path", help="the recording to play")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without a window as fast as possible")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback speed multiplier, 0 for unlimited")
+    args = parser.parse_args()
+
+    replay = load(args.path)
+
+    start = time.perf_counter()
+    if args.headless:
+        result = play_headless(replay)
+    else:
+        result = play_rendered(replay, args.speed)
+    elapsed = time.perf_counter() - start
+
+    score, ticks, game_over = result
+    print(f"Replayed {ticks} ticks in {elapsed:.2f}s: score {score}, "
+          f"game over {game_over}")
+
+    if result != (replay.score, replay.ticks, replay.game_over):
+        print(f"Mismatch, recorded score {replay.score} after "
+              f"{replay.ticks} ticks, game over {replay.game_over}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
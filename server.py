@@ -0,0 +1,608 @@
+"""This file runs the game on a server that other programs connect to.
+
+A Game_Server owns the only copy of the game. It listens on a TCP socket,
+takes the controls of one player from the network and advances the game at
+SIM_RATE ticks per second. After every tick it sends each connected client
+a snapshot of the state: the player's position and health, the score, and
+every enemy and projectile with its id, kind and position.
+
+Snapshots are delta encoded. Each client acknowledges the snapshots it has
+applied, and the server only sends what changed since the last one the
+client acknowledged: entities that were destroyed, entities that appeared
+and entities that moved. Clients acknowledging the same snapshot are sent
+the same encoded bytes, which are built once per tick, so adding spectators
+adds little work to a tick and does not change what each client is sent.
+
+A Client keeps its own copy of the recent states, applies the deltas and
+draws the result, without running any game logic:
+
+    python server.py --port 5757
+    python server.py --connect 127.0.0.1 --port 5757
+    python server.py --connect 127.0.0.1 --port 5757 --spectate
+"""
+
+from settings import *
+from headless import Simulation
+from inputs import IDLE, Keyboard_Input
+from replay import encode, decode
+import argparse
+import selectors
+import socket
+import struct
+import sys
+import time
+import zlib
+from collections import deque
+
+# The bottom of the player's ship, as placed by Simulation
+PLAYER_Y = 540
+
+# Each message is prefixed with its length and starts with a type byte
+LENGTH = struct.Struct("<I")
+HELLO, WELCOME, INPUT, ACK, SNAPSHOT = b"HWIAS"
+
+# Roles sent in a HELLO message
+SPECTATOR, PLAYER = 0, 1
+
+# Tick, baseline tick, player x, player health, score, level and game over
+SNAPSHOT_HEADER = struct.Struct("<IIhhIHB")
+COUNT = struct.Struct("<H")
+TICK = struct.Struct("<I")
+REMOVED = struct.Struct("<I")
+ADDED = struct.Struct("<IBhh")
+MOVED = struct.Struct("<Ihh")
+
+# Kinds of entity, indexing into IMAGES
+COMMON, RARE, ULTRA_RARE, PLAYER_SHOT, ENEMY_SHOT = range(5)
+ENEMY_KINDS = {"Common": COMMON, "Rare": RARE, "Ultra Rare": ULTRA_RARE}
+IMAGES = ("common_enemy.png", "rare_enemy.png", "ultra_rare_enemy.png",
+          "player_projectile.png", "enemy_projectile.png")
+
+# A state with nothing in it, the baseline of a full snapshot
+EMPTY = ((0, 0, 0, 0, 0), {})
+
+def capture(simulation):
+    """Describe the state of a simulation for sending to clients.
+
+    Args:
+        simulation: The Simulation being played.
+
+    Returns:
+        A tuple of a header tuple of the player's x and health, the
+        score, the level and the game over flag, and a dict mapping
+        each entity's uid to a (kind, x, y) tuple.
+    """
+    game = simulation.game
+    entities = {}
+    for enemy in game.enemy_list:
+        entities[enemy.uid] = (ENEMY_KINDS[enemy.rarity], enemy.rect.x, enemy.rect.y)
+    for projectile in game.projectile_list:
+        kind = PLAYER_SHOT if projectile.fired_by == "Player" else ENEMY_SHOT
+        entities[projectile.uid] = (kind, projectile.rect.x, projectile.rect.y)
+
+    player = simulation.player
+    header = (player.rect.x, player.get_health(), game.get_score(),
+              game.level, game.is_game_over())
+    return header, entities
+
+def encode_delta(tick, baseline_tick, baseline, state):
+    """Encode the changes from one state to another.
+
+    Args:
+        tick: An integer for the tick of the new state.
+        baseline_tick: An integer for the tick of the baseline,
+        or 0 for a full snapshot.
+        baseline: The state tuple the client already has.
+        state: The state tuple to send.
+
+    Returns:
+        A compressed bytes object.
+    """
+    header, entities = state
+    old = baseline[1]
+
+    removed = [uid for uid in old if uid not in entities]
+    added = []
+    moved = []
+    for uid, entity in entities.items():
+        previous = old.get(uid)
+        if previous is None:
+            added.append(ADDED.pack(uid, *entity))
+        elif previous != entity:
+            moved.append(MOVED.pack(uid, entity[1], entity[2]))
+
+    parts = [SNAPSHOT_HEADER.pack(tick, baseline_tick, *header),
+             COUNT.pack(len(removed))]
+    parts += [REMOVED.pack(uid) for uid in removed]
+    parts.append(COUNT.pack(len(added)))
+    parts += added
+    parts.append(COUNT.pack(len(moved)))
+    parts += moved
+    return zlib.compress(b"".join(parts), 1)
+
+def decode_delta(payload, states):
+    """Apply an encoded delta to the baseline it was made against.
+
+    Args:
+        payload: The bytes made by encode_delta().
+        states: A dict mapping ticks to the states already applied.
+
+    Returns:
+        A tuple of the new state's tick, its baseline's tick and the state.
+
+    Raises:
+        KeyError: If the baseline is not in states.
+    """
+    body = zlib.decompress(payload)
+    tick, baseline_tick, *header = SNAPSHOT_HEADER.unpack_from(body)
+    baseline = EMPTY if baseline_tick == 0 else states[baseline_tick]
+    entities = dict(baseline[1])
+    offset = SNAPSHOT_HEADER.size
+
+    (count,) = COUNT.unpack_from(body, offset)
+    offset += COUNT.size
+    for (uid,) in REMOVED.iter_unpack(body[offset:offset + count * REMOVED.size]):
+        del entities[uid]
+    offset += count * REMOVED.size
+
+    (count,) = COUNT.unpack_from(body, offset)
+    offset += COUNT.size
+    for uid, kind, x, y in ADDED.iter_unpack(body[offset:offset + count * ADDED.size]):
+        entities[uid] = (kind, x, y)
+    offset += count * ADDED.size
+
+    (count,) = COUNT.unpack_from(body, offset)
+    offset += COUNT.size
+    for uid, x, y in MOVED.iter_unpack(body[offset:offset + count * MOVED.size]):
+        entities[uid] = (entities[uid][0], x, y)
+
+    header[4] = bool(header[4])
+    return tick, baseline_tick, (tuple(header), entities)
+
+def frame(kind, payload=b""):
+    """Prefix a message with its length so it can be read from a stream."""
+    return LENGTH.pack(len(payload) + 1) + kind.to_bytes(1, "little") + payload
+
+class Connection():
+    """Buffer the messages sent over a non-blocking socket.
+
+    Attributes:
+        sock: The connected socket.
+        incoming: A bytearray of received bytes not yet read as messages.
+        outgoing: A bytearray of bytes waiting to be sent.
+        bytes_sent: An integer counting every byte sent.
+        bytes_received: An integer counting every byte received.
+        closed: A boolean set once the other end has gone.
+    """
+
+    def __init__(self, sock) -> None:
+        """Wrap a connected socket.
+
+        Args:
+            sock: A connected socket, which is made non-blocking.
+        """
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.closed = False
+
+    def receive(self):
+        """Read whatever has arrived on the socket.
+
+        Returns:
+            A list of (type, payload) tuples for each whole message.
+        """
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    self.closed = True
+                    break
+                self.bytes_received += len(data)
+                self.incoming += data
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.closed = True
+
+        messages = []
+        while len(self.incoming) >= LENGTH.size:
+            (length,) = LENGTH.unpack_from(self.incoming)
+            if length == 0:
+                # Every message has at least a type byte
+                self.closed = True
+                break
+            end = LENGTH.size + length
+            if len(self.incoming) < end:
+                break
+            message = bytes(self.incoming[LENGTH.size:end])
+            del self.incoming[:end]
+            messages.append((message[0], message[1:]))
+        return messages
+
+    def send(self, data=b""):
+        """Queue bytes and send as many queued bytes as the socket takes."""
+        self.outgoing += data
+        if not self.outgoing or self.closed:
+            return
+        try:
+            sent = self.sock.send(self.outgoing)
+            self.bytes_sent += sent
+            del self.outgoing[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.closed = True
+
+    def close(self):
+        """Close the socket."""
+        self.closed = True
+        self.sock.close()
+
+class Network_Input():
+    """An input source returning the last controls sent by the player.
+
+    Attributes:
+        controls: The Controls tuple returned by every poll().
+    """
+
+    def __init__(self) -> None:
+        """Start with no controls held down."""
+        self.controls = IDLE
+
+    def poll(self):
+        """Return the last controls received."""
+        return self.controls
+
+class Game_Server():
+    """Run the game and stream its state to connected clients.
+
+    Attributes:
+        address: The (host, port) tuple the server is listening on.
+        simulation: The Simulation being played.
+        tick: An integer for the number of ticks simulated.
+        clients: A dict mapping sockets to Client_State objects.
+        history: A dict mapping recent ticks to their states.
+        tick_times: A deque of the seconds taken by recent ticks.
+        encodes: An integer counting the deltas encoded on the last tick.
+    """
+
+    def __init__(self, host="127.0.0.1", port=SERVER_PORT, seed=None,
+                 history=SNAPSHOT_HISTORY) -> None:
+        """Start listening and create the first game.
+
+        Args:
+            host: A string for the address to listen on.
+            port: An integer for the port, or 0 to pick a free one.
+            seed: An integer seed for the first game.
+            history: An integer for the ticks of state kept as baselines.
+        """
+        self.__listener = socket.create_server((host, port))
+        self.__listener.setblocking(False)
+        self.address = self.__listener.getsockname()
+
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(self.__listener, selectors.EVENT_READ)
+
+        self.__input = Network_Input()
+        self.__seed = seed
+        self.__history_length = history
+        self.__restart_at = None
+        self.simulation = Simulation(self.__input, seed)
+
+        self.tick = 0
+        self.clients = {}
+        self.history = {}
+        self.tick_times = deque(maxlen=SIM_RATE * 10)
+        self.encodes = 0
+
+    def poll(self, timeout=0):
+        """Accept new clients and read their messages.
+
+        Args:
+            timeout: A float for the most seconds to wait for activity.
+        """
+        for key, _ in self.__selector.select(timeout):
+            if key.fileobj is self.__listener:
+                sock, _ = self.__listener.accept()
+                client = Client_State(Connection(sock))
+                self.clients[sock] = client
+                self.__selector.register(sock, selectors.EVENT_READ)
+                continue
+
+            client = self.clients[key.fileobj]
+            for kind, payload in client.connection.receive():
+                if not self.__handle(client, kind, payload):
+                    # A client sending malformed messages is not trusted further
+                    self.__drop(client)
+                    break
+            if client.connection.closed:
+                self.__drop(client)
+
+    def step(self):
+        """Simulate one tick and send its snapshot to every client."""
+        start = time.perf_counter()
+
+        if self.simulation.game.is_game_over():
+            # Start a new game a few seconds after the last one ended
+            if self.__restart_at is None:
+                self.__restart_at = self.tick + SIM_RATE * 3
+            elif self.tick >= self.__restart_at:
+                self.__restart_at = None
+                if self.__seed is not None:
+                    self.__seed += 1
+                self.simulation.close()
+                self.simulation = Simulation(self.__input, self.__seed)
+        self.simulation.step()
+
+        self.tick += 1
+        state = capture(self.simulation)
+        self.history[self.tick] = state
+        self.history.pop(self.tick - self.__history_length, None)
+
+        # Clients acknowledging the same tick share one encoding
+        encoded = {}
+        for client in list(self.clients.values()):
+            baseline = client.acked if client.acked in self.history else 0
+            message = encoded.get(baseline)
+            if message is None:
+                payload = encode_delta(self.tick, baseline,
+                                       self.history.get(baseline, EMPTY), state)
+                message = encoded[baseline] = frame(SNAPSHOT, payload)
+
+            # A client too slow to keep up skips snapshots, rather than
+            # the server holding more and more data for it
+            connection = client.connection
+            if len(connection.outgoing) < SERVER_MAX_BACKLOG:
+                connection.send(message)
+            else:
+                connection.send()
+            if connection.closed:
+                self.__drop(client)
+
+        self.encodes = len(encoded)
+        self.tick_times.append(time.perf_counter() - start)
+
+    def run(self, ticks=None):
+        """Serve clients, simulating SIM_RATE ticks per second.
+
+        Args:
+            ticks: An integer for the ticks to run, or None to run forever.
+        """
+        step = 1 / SIM_RATE
+        next_tick = time.perf_counter()
+        while ticks is None or self.tick < ticks:
+            self.poll(max(0.0, next_tick - time.perf_counter()))
+            if time.perf_counter() >= next_tick:
+                self.step()
+                next_tick += step
+
+    def stats(self):
+        """Summarise the recent ticks and the data sent.
+
+        Returns:
+            A dict with the number of clients, the mean tick time in
+            milliseconds, the deltas encoded on the last tick and the
+            bytes sent to each client.
+        """
+        mean = sum(self.tick_times) / len(self.tick_times) if self.tick_times else 0.0
+        return {"clients": len(self.clients),
+                "tick_ms": mean * 1000,
+                "encodes": self.encodes,
+                "bytes_sent": [client.connection.bytes_sent
+                               for client in self.clients.values()]}
+
+    def close(self):
+        """Disconnect every client and stop listening."""
+        for client in list(self.clients.values()):
+            self.__drop(client)
+        self.__selector.unregister(self.__listener)
+        self.__listener.close()
+        self.__selector.close()
+
+    def __handle(self, client, kind, payload):
+        """Act on one message from a client.
+
+        Returns:
+            A boolean which is False if the message was malformed.
+        """
+        if kind == HELLO:
+            # The first client asking to play controls the player
+            wants_to_play = payload[:1] == bytes([PLAYER])
+            if wants_to_play and not any(other.player for other in self.clients.values()):
+                client.player = True
+            client.connection.send(frame(WELCOME, bytes([client.player])))
+        elif kind == INPUT:
+            if len(payload) != 1:
+                return False
+            if client.player:
+                self.__input.controls = decode(payload[0])
+        elif kind == ACK:
+            if len(payload) != TICK.size:
+                return False
+            (tick,) = TICK.unpack(payload)
+            client.acked = max(client.acked, tick)
+        return True
+
+    def __drop(self, client):
+        """Forget a client that has disconnected."""
+        sock = client.connection.sock
+        if self.clients.pop(sock, None) is None:
+            return
+        self.__selector.unregister(sock)
+        client.connection.close()
+        if client.player:
+            self.__input.controls = IDLE
+
+class Client_State():
+    """What the server knows about a connected client.
+
+    Attributes:
+        connection: The client's Connection.
+        player: A boolean, True for the client controlling the player.
+        acked: An integer for the last tick the client acknowledged.
+    """
+
+    def __init__(self, connection) -> None:
+        """Start with nothing acknowledged."""
+        self.connection = connection
+        self.player = False
+        self.acked = 0
+
+class Client():
+    """Follow the state of a game running on a server.
+
+    Attributes:
+        connection: The Connection to the server.
+        player: A boolean, True once the server lets this client play.
+        tick: An integer for the tick of the latest state.
+        state: The latest state tuple, as made by capture().
+        states: A dict mapping recent ticks to their states.
+    """
+
+    def __init__(self, host="127.0.0.1", port=SERVER_PORT, play=False) -> None:
+        """Connect to a server.
+
+        Args:
+            host: A string for the server's address.
+            port: An integer for the server's port.
+            play: A boolean to ask to control the player.
+        """
+        self.connection = Connection(socket.create_connection((host, port)))
+        self.connection.send(frame(HELLO, bytes([PLAYER if play else SPECTATOR])))
+
+        self.player = False
+        self.tick = 0
+        self.state = EMPTY
+        self.states = {}
+
+    def poll(self):
+        """Apply every snapshot that has arrived and acknowledge the latest.
+
+        Returns:
+            A boolean, False once the server has gone.
+        """
+        applied = False
+        for kind, payload in self.connection.receive():
+            if kind == WELCOME:
+                self.player = bool(payload[0])
+            elif kind == SNAPSHOT:
+                tick, baseline, state = decode_delta(payload, self.states)
+                if tick <= self.tick:
+                    continue
+                self.tick, self.state = tick, state
+                self.states[tick] = state
+
+                # The server never goes back to an older baseline
+                for old in [old for old in self.states if old < baseline]:
+                    del self.states[old]
+                applied = True
+
+        if applied:
+            self.connection.send(frame(ACK, TICK.pack(self.tick)))
+        else:
+            self.connection.send()
+        return not self.connection.closed
+
+    def send_controls(self, controls):
+        """Send the player's controls, if this client is the player.
+
+        Args:
+            controls: A Controls tuple.
+        """
+        if self.player:
+            self.connection.send(frame(INPUT, bytes([encode(controls)])))
+
+    def blit_list(self):
+        """List the images to draw for the latest state.
+
+        Returns:
+            A list of (Surface, (x, y)) tuples.
+        """
+        from assets import assets
+        images = [assets.get(name) for name in IMAGES]
+        header, entities = self.state
+        blits = [(images[kind], (x, y)) for kind, x, y in entities.values()]
+
+        # The player only moves sideways, so only its x is sent
+        ship = assets.get("spaceship.png")
+        blits.append((ship, (header[0], PLAYER_Y - ship.get_height())))
+        return blits
+
+    def close(self):
+        """Disconnect from the server."""
+        self.connection.close()
+
+def watch(host, port, play):
+    """Draw a game running on a server in a window.
+
+    Args:
+        host: A string for the server's address.
+        port: An integer for the server's port.
+        play: A boolean to ask to control the player.
+    """
+    import pygame
+    from hud import Number_Text, get_font
+
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Space Invaders - " + ("playing" if play else "spectating"))
+    clock = pygame.time.Clock()
+
+    client = Client(host, port, play)
+    keyboard = Keyboard_Input()
+    score = Number_Text(get_font(50), WHITE)
+    health = Number_Text(get_font(50), WHITE)
+
+    while client.poll():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                client.close()
+                pygame.quit(); sys.exit()
+            keyboard.handle_event(event)
+        client.send_controls(keyboard.poll())
+
+        header = client.state[0]
+        score.set(header[2])
+        health.set(header[1])
+
+        screen.fill(BLACK)
+        screen.blits(client.blit_list(), False)
+        screen.blit(score.image, score.image.get_rect(center=(25, SCREEN_HEIGHT - 25)))
+        screen.blit(health.image, health.image.get_rect(center=(SCREEN_WIDTH - 40, SCREEN_HEIGHT - 25)))
+        pygame.display.flip()
+        clock.tick(MAX_FPS)
+
+def main():
+    """Run a server or a client from the command line."""
+    parser = argparse.ArgumentParser(description="Serve the game to other programs.")
+    parser.add_argument("--port", type=int, default=SERVER_PORT,
+                        help="the port to listen on or connect to")
+    parser.add_argument("--seed", type=int, help="the seed of the first game")
+    parser.add_argument("--connect", metavar="HOST",
+                        help="connect to a server instead of running one")
+    parser.add_argument("--spectate", action="store_true",
+                        help="watch without controlling the player")
+    args = parser.parse_args()
+
+    if args.connect:
+        watch(args.connect, args.port, not args.spectate)
+        return
+
+    server = Game_Server(port=args.port, seed=args.seed)
+    print(f"Serving on {server.address[0]}:{server.address[1]}")
+    try:
+        while True:
+            server.run(server.tick + SIM_RATE * 10)
+            stats = server.stats()
+            print(f"{stats['clients']} clients, {stats['tick_ms']:.2f} ms per tick")
+    except KeyboardInterrupt:
+        server.close()
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,17 @@ URE_PROJECTILE_DAMAGE = 8
 PLAYER_PROJECTILE_DAMAGE = 1
 PROJECTILE_SPEED = 12
 
+# Ticks between enemy volleys at level 1, divided by the level after that,
+# the ticks an enemy waits before firing again at level 1, also divided by
+# the level, and the share of volleys fired by the enemy nearest the
+# player's column
+ENEMY_FIRE_INTERVAL = 50
+ENEMY_FIRE_COOLDOWN = 15
+ENEMY_AIMED_FIRE = 0.25
+
+# Projectiles kept for reuse instead of being created for every shot
+PROJECTILE_POOL_SIZE = 256
+
 # Colours used for UI
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -37,9 +48,74 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 
+# Ticks of game logic simulated per second, which every speed is measured
+# in, the most ticks run in one frame to catch up after a slow frame and
+# the most frames drawn per second (0 to draw as often as possible)
+SIM_RATE = 30
+MAX_CATCH_UP_STEPS = 5
+MAX_FPS = 120
+
+# The time each frame should fit in, one tick, so the game logic keeps up.
+# The governor sheds work once the average frame takes more than
+# GOVERNOR_HIGH of it, waiting GOVERNOR_HOLD frames between steps, and
+# restores it after GOVERNOR_RECOVER frames under GOVERNOR_LOW of it
+FRAME_BUDGET = 1 / SIM_RATE
+GOVERNOR_HIGH = 0.9
+GOVERNOR_LOW = 0.5
+GOVERNOR_HOLD = 30
+GOVERNOR_RECOVER = 120
+# Frames between redraws of the score and health, and the most
+# projectiles on screen, while the governor is shedding work
+GOVERNOR_HUD_INTERVAL = 10
+GOVERNOR_PROJECTILE_CAP = 150
+
+# Frames kept by the profiler for its percentiles, and how many
+# frames pass between redraws of its overlay
+PROFILE_WINDOW = 300
+PROFILE_OVERLAY_INTERVAL = 15
+
+# Key presses kept for each action when measuring input latency
+LATENCY_WINDOW = 500
+
+# Events waiting to be logged before more are dropped, the most events
+# logged per tick, the seconds between writes and the bytes of text
+# written to a log file before a new one is started
+TELEMETRY_QUEUE_SIZE = 4096
+TELEMETRY_TICK_EVENTS = 64
+TELEMETRY_FLUSH_INTERVAL = 0.5
+TELEMETRY_ROTATE_BYTES = 4000000
+
+# Frames held for encoding while capturing before more are dropped,
+# and the processes encoding them
+CAPTURE_SLOTS = 8
+CAPTURE_WORKERS = 2
+
 # Miscellaneous
 ASSETS_PATH = "Assets/"
 
+# The file describing each wave of enemies, and the most enemies
+# spawned per tick while a new wave is arriving
+WAVES_PATH = "waves.json"
+SPAWN_BUDGET = 20
+
+# Width and height of the grid cells used to find possible collisions
+COLLISION_CELL_SIZE = 64
+# Confirm rect collisions against the images' pixel masks, off by
+# default so hits match the plain rect checks
+PIXEL_COLLISIONS = False
+
+# Only redraw and update the parts of the screen that changed each frame
+DIRTY_RECTS = True
+
+# The port the game server listens on, the ticks of state it keeps to
+# send deltas against and the most bytes queued for a slow client
+SERVER_PORT = 5757
+SNAPSHOT_HISTORY = 64
+SERVER_MAX_BACKLOG = 65536
+
+# Ticks of snapshots kept for rolling a simulation back
+SNAPSHOT_RING_SIZE = 120
+
 # Not to be edited
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 600
\ No newline at end of file
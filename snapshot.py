@@ -0,0 +1,310 @@
+"""This file saves the whole state of a game into a small binary buffer.
+
+capture() packs everything the simulation depends on into bytes: the score,
+level and timer, the state of the Game's random number generator, the rows
+of the wave still to spawn, the player, every enemy and projectile in the
+order they are updated, which enemies are waiting to fire again, and the
+Formation's arrays when one is used. The next entity id is saved too, so
+a restored game carries on exactly as the original would have. restore()
+puts the state back into an existing Game, reusing the sprites that are
+still alive rather than creating new ones, which makes rolling back a few
+ticks cheap.
+
+A Snapshot_Ring keeps the snapshots of the last few ticks:
+
+    ring = Snapshot_Ring(60)
+    ring.push(tick, capture(game, timer, tick))
+    timer, tick = restore(game, ring.get(tick - 10))
+"""
+
+from settings import *
+from waves import Row, ENEMY_NAMES
+from classes import ENEMY_TYPES, projectile_pool, peek_entity_id, set_next_entity_id
+import struct
+from array import array
+from collections import deque
+
+MAGIC = b"SISS"
+VERSION = 5
+
+# Magic, version, tick, timer, score, level, ticks since the wave started
+# spawning, next entity id, the random generator's version and whether it
+# holds a spare Gaussian value
+HEADER = struct.Struct("<4sBIIiHHIB?d")
+COUNT = struct.Struct("<H")
+
+PLAYER = struct.Struct("<hhh")
+ROW = struct.Struct("<BhhhHh")
+# Kind, uid, x, y, health, direction or up flag and distance moved
+ENEMY = struct.Struct("<BIhhhbh")
+# Player or enemy shot, uid, damage, x and y
+PROJECTILE = struct.Struct("<BIhhh")
+# Uid, centre x and bottom of a ready enemy
+READY = struct.Struct("<Ihh")
+# Tick an enemy can fire again and its uid
+COOLING = struct.Struct("<II")
+
+FIRED_BY = ("Player", "Enemy")
+# Random.getstate() holds 624 words of state and an index
+RNG_WORDS = 625
+
+def capture(game, timer=0, tick=0):
+    """Save the state of a game.
+
+    Args:
+        game: The Game to save, with its player added.
+        timer: An integer for the timer passed to Game.step().
+        tick: An integer for the tick being saved, stored for the caller.
+
+    Returns:
+        A bytes object to pass to restore().
+    """
+    next_uid = peek_entity_id()
+
+    version, words, gauss = game.rng.getstate()
+    parts = [HEADER.pack(MAGIC, VERSION, tick, timer, game.get_score(), game.level,
+                         game.wave_age, next_uid, version, gauss is not None, gauss or 0.0),
+             array("I", words).tobytes()]
+
+    player = game.player_group.sprite
+    parts.append(PLAYER.pack(player.rect.x, player.rect.y, player.get_health()))
+
+    parts.append(COUNT.pack(len(game.spawn_queue)))
+    parts += [ROW.pack(ENEMY_NAMES.index(row.enemy), row.x, row.y, row.gap,
+                       row.amount, row.extra_health) for row in game.spawn_queue]
+
+    enemies = game.enemy_list.sprites()
+    parts.append(COUNT.pack(len(enemies)))
+    for enemy in enemies:
+        kind = ENEMY_NAMES.index(type(enemy).__name__)
+        if kind == 0:
+            flag = enemy.up
+        else:
+            flag = enemy.direction == "R"
+        parts.append(ENEMY.pack(kind, enemy.uid, enemy.rect.x, enemy.rect.y,
+                                enemy.get_health(), flag, getattr(enemy, "moved", 0)))
+
+    ready, cooling = game.fire_scheduler.state()
+    parts.append(COUNT.pack(len(ready)))
+    parts += [READY.pack(*entry) for entry in ready]
+    parts.append(COUNT.pack(len(cooling)))
+    parts += [COOLING.pack(ready_at, uid) for ready_at, uid in cooling]
+
+    projectiles = game.projectile_list.sprites()
+    parts.append(COUNT.pack(len(projectiles)))
+    parts += [PROJECTILE.pack(FIRED_BY.index(projectile.fired_by), projectile.uid,
+                              projectile.damage, projectile.rect.x, projectile.rect.y)
+              for projectile in projectiles]
+
+    if game.formation is not None:
+        parts.append(game.formation.to_bytes())
+    return b"".join(parts)
+
+def restore(game, data):
+    """Put a saved state back into a game.
+
+    The game must have been created with the same options, such as
+    formation mode, as the one that was saved.
+
+    Args:
+        game: The Game to restore into, with its player added.
+        data: A bytes object made by capture().
+
+    Returns:
+        A tuple of the saved timer and tick.
+
+    Raises:
+        ValueError: If data was not made by this version of capture().
+    """
+    (magic, version, tick, timer, score, level, wave_age, next_uid,
+     rng_version, has_gauss, gauss) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} snapshot")
+    offset = HEADER.size
+
+    words = array("I")
+    words.frombytes(data[offset:offset + RNG_WORDS * 4])
+    offset += RNG_WORDS * 4
+
+    game.set_score(score)
+    game.level = level
+    game.wave_age = wave_age
+
+    x, y, health = PLAYER.unpack_from(data, offset)
+    offset += PLAYER.size
+    player = game.player_group.sprite
+    player.rect.topleft = (x, y)
+    player.previous = player.rect.topleft
+    player.set_health(health)
+    if not game.is_game_over():
+        game.game_over_screen = None
+
+    (rows,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    game.spawn_queue = deque()
+    for kind, x, y, gap, amount, extra_health in ROW.iter_unpack(data[offset:offset + rows * ROW.size]):
+        game.spawn_queue.append(Row(ENEMY_NAMES[kind], x, y, gap, amount, extra_health))
+    offset += rows * ROW.size
+
+    offset = _restore_enemies(game, data, offset)
+    offset = _restore_fire_scheduler(game, data, offset)
+    offset = _restore_projectiles(game, data, offset)
+
+    if game.formation is not None:
+        game.formation.from_bytes(memoryview(data)[offset:])
+
+    # Set last, as creating enemies and projectiles uses up ids
+    set_next_entity_id(next_uid)
+    game.rng.setstate((rng_version, tuple(words), gauss if has_gauss else None))
+    if game.renderer is not None:
+        game.renderer.invalidate()
+    return timer, tick
+
+def _restore_enemies(game, data, offset):
+    """Rebuild the enemy group in its saved order.
+
+    Returns:
+        An integer for the offset just past the enemies.
+    """
+    (amount,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    existing = {enemy.uid: enemy for enemy in game.enemy_list}
+
+    enemies = []
+    for kind, uid, x, y, health, flag, moved in ENEMY.iter_unpack(data[offset:offset + amount * ENEMY.size]):
+        enemy = existing.get(uid)
+        if enemy is None:
+            enemy = ENEMY_TYPES[ENEMY_NAMES[kind]](0, 0, game.rng)
+            enemy.uid = uid
+
+        enemy.rect.topleft = (x, y)
+        enemy.previous = enemy.rect.topleft
+        enemy.set_health(health)
+        if kind == 0:
+            enemy.up = bool(flag)
+        else:
+            enemy.direction = "R" if flag else "L"
+        if kind != 2:
+            enemy.moved = moved
+        enemies.append(enemy)
+
+    game.enemy_list.empty()
+    game.enemy_list.add(enemies)
+    return offset + amount * ENEMY.size
+
+def _restore_fire_scheduler(game, data, offset):
+    """Put back which enemies are ready to fire and which are cooling down.
+
+    Returns:
+        An integer for the offset just past the scheduler's state.
+    """
+    (amount,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    ready = list(READY.iter_unpack(data[offset:offset + amount * READY.size]))
+    offset += amount * READY.size
+
+    (amount,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    cooling = list(COOLING.iter_unpack(data[offset:offset + amount * COOLING.size]))
+    offset += amount * COOLING.size
+
+    if game.formation is not None:
+        # Formation enemies are tracked by their uids alone
+        enemies = {uid: uid for uid, _, _ in ready}
+        enemies.update((uid, uid) for _, uid in cooling)
+    else:
+        enemies = {enemy.uid: enemy for enemy in game.enemy_list}
+    game.fire_scheduler.load(ready, cooling, enemies)
+    return offset
+
+def _restore_projectiles(game, data, offset):
+    """Rebuild the projectile group in its saved order, handing
+    projectiles that no longer exist back to the pool.
+
+    Returns:
+        An integer for the offset just past the projectiles.
+    """
+    (amount,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    saved = list(PROJECTILE.iter_unpack(data[offset:offset + amount * PROJECTILE.size]))
+
+    existing = {projectile.uid: projectile for projectile in game.projectile_list}
+    kept = {uid: existing.pop(uid) for _, uid, *_ in saved if uid in existing}
+    for projectile in existing.values():
+        projectile.kill()
+
+    projectiles = []
+    for fired_by, uid, damage, x, y in saved:
+        projectile = kept.get(uid)
+        if projectile is None:
+            projectile = projectile_pool.acquire(damage, x, y, FIRED_BY[fired_by])
+            projectile.uid = uid
+        projectile.rect.topleft = (x, y)
+        projectile.previous = projectile.rect.topleft
+        projectiles.append(projectile)
+
+    game.projectile_list.empty()
+    game.projectile_list.add(projectiles)
+    return offset + amount * PROJECTILE.size
+
+class Snapshot_Ring():
+    """Keep the snapshots of the most recent ticks.
+
+    Attributes:
+        capacity: An integer for the most snapshots kept.
+    """
+
+    def __init__(self, capacity=SNAPSHOT_RING_SIZE) -> None:
+        """Initialise an empty ring.
+
+        Args:
+            capacity: An integer for the most snapshots kept.
+        """
+        self.capacity = capacity
+        self.__snapshots = deque(maxlen=capacity)
+
+    def __len__(self):
+        """Count the snapshots kept."""
+        return len(self.__snapshots)
+
+    def push(self, tick, data):
+        """Add the snapshot of a tick, dropping the oldest if full.
+
+        Any snapshots of the same or later ticks are dropped first,
+        as they belong to a timeline that was rolled back.
+
+        Args:
+            tick: An integer for the tick saved.
+            data: The bytes made by capture().
+        """
+        while self.__snapshots and self.__snapshots[-1][0] >= tick:
+            self.__snapshots.pop()
+        self.__snapshots.append((tick, data))
+
+    def get(self, tick):
+        """Find the snapshot of a tick.
+
+        Args:
+            tick: An integer for the tick wanted.
+
+        Returns:
+            The bytes saved for the tick, or None if it is not kept.
+        """
+        for saved, data in reversed(self.__snapshots):
+            if saved == tick:
+                return data
+            if saved < tick:
+                break
+        return None
+
+    def latest(self):
+        """Access the most recent snapshot.
+
+        Returns:
+            A tuple of the tick and bytes, or None if the ring is empty.
+        """
+        return self.__snapshots[-1] if self.__snapshots else None
+
+    def ticks(self):
+        """List the ticks kept, oldest first."""
+        return [tick for tick, _ in self.__snapshots]
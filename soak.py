@@ -0,0 +1,241 @@
+"""This file plays thousands of games in a row to find memory that leaks.
+
+Each game is played by the bot for up to a set number of ticks, drawn under
+SDL's dummy video driver unless run with --headless, then ended and
+replaced by a new Game, just as clicking "Play Again" does. Every few games
+the soak collects garbage and samples the memory traced by tracemalloc,
+the live objects of each type in TRACKED_TYPES and the live Surfaces.
+
+Once the first --warmup games have filled every cache, the traced memory
+should stay flat. A straight line is fitted through the samples after the
+warmup, and the soak fails if it rises by more than --max-growth KB over
+the run, or if the live count of any type rises by more than
+--max-objects. On failure, the allocation sites that grew the most since
+the warmup are printed:
+
+    python soak.py --games 2000
+    python soak.py --games 500 --headless --output soak.csv
+"""
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from settings import *
+from classes import *
+from inputs import Bot_Input
+import argparse
+import csv
+import gc
+import sys
+import time
+import tracemalloc
+import pygame
+
+# The classes whose live objects are counted in each sample
+TRACKED_TYPES = (Game, Player, Projectile, Common_Enemy, Rare_Enemy, Ultra_Rare_Enemy)
+
+def play(seed, ticks, headless, draw_every):
+    """Play and end one game with the bot.
+
+    Args:
+        seed: An integer seed for the game.
+        ticks: An integer for the most ticks to play.
+        headless: A boolean to play without drawing.
+        draw_every: An integer for the ticks between frames drawn.
+
+    Returns:
+        An integer for the ticks played.
+    """
+    bot = Bot_Input()
+    game = Game(controls=bot, seed=seed, headless=headless)
+    bot.game = game
+    game.player_group.add(Player(500, 540))
+
+    timer = 0
+    tick = 0
+    while tick < ticks and not game.is_game_over():
+        game.step(timer)
+        timer = 100 if timer == 0 else timer + 1
+        tick += 1
+        if not headless and tick % draw_every == 0 and not game.is_game_over():
+            game.draw_groups()
+
+    if not headless:
+        game.player_group.sprite.set_health(0)
+        game.on_game_over()
+
+    # As main.py does when the next game starts
+    game.close()
+    bot.game = None
+    return tick
+
+def count_objects():
+    """Count the live objects of each tracked type and the live Surfaces.
+
+    Surfaces are not tracked by the garbage collector, so they are found
+    through the objects that refer to them, looking inside the tuples and
+    dicts the collector does not track either.
+
+    Returns:
+        A dict mapping each type's name, and "Surface", to a count.
+    """
+    counts = {kind.__name__: 0 for kind in TRACKED_TYPES}
+    counts["Surface"] = 0
+    names = {kind: kind.__name__ for kind in TRACKED_TYPES}
+
+    objects = gc.get_objects()
+    for obj in objects:
+        name = names.get(type(obj))
+        if name is not None:
+            counts[name] += 1
+
+    seen = set()
+    pending = gc.get_referents(*objects)
+    del objects
+    while pending:
+        untracked = []
+        for obj in pending:
+            if isinstance(obj, pygame.Surface):
+                seen.add(id(obj))
+            elif type(obj) in (tuple, dict) and not gc.is_tracked(obj):
+                untracked.append(obj)
+        pending = gc.get_referents(*untracked) if untracked else []
+    counts["Surface"] = len(seen)
+    return counts
+
+def resident_kb():
+    """Measure the memory the process has resident.
+
+    Returns:
+        A float in KB, or None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024
+
+def sample(games, ticks):
+    """Collect garbage and measure memory and live objects.
+
+    Args:
+        games: An integer for the games played so far.
+        ticks: An integer for the ticks played so far.
+
+    Returns:
+        A dict for one row of the results.
+    """
+    collected = gc.collect()
+    row = {"games": games, "ticks": ticks,
+           "traced_kb": tracemalloc.get_traced_memory()[0] / 1024,
+           "resident_kb": resident_kb(),
+           "collected": collected}
+    row.update(count_objects())
+    return row
+
+def growth(samples, key):
+    """Work out how much a value rose over the samples, from the
+    slope of a straight line fitted through them.
+
+    Args:
+        samples: A list of sample dicts, in order.
+        key: The name of the value.
+
+    Returns:
+        A float for the rise over the games sampled.
+    """
+    if len(samples) < 2:
+        return 0.0
+    xs = [row["games"] for row in samples]
+    ys = [row[key] for row in samples]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+    return slope * (xs[-1] - xs[0])
+
+def main():
+    """Run the soak test from the command line."""
+    parser = argparse.ArgumentParser(description="Play many games in a row to find memory leaks.")
+    parser.add_argument("--games", type=int, default=2000,
+                        help="the number of games to play")
+    parser.add_argument("--ticks", type=int, default=900,
+                        help="the most ticks each game is played for")
+    parser.add_argument("--headless", action="store_true",
+                        help="play without drawing or composing the game over screen")
+    parser.add_argument("--draw-every", type=int, default=4,
+                        help="the ticks between frames drawn")
+    parser.add_argument("--sample-every", type=int, default=50,
+                        help="the games played between samples")
+    parser.add_argument("--warmup", type=int, default=100,
+                        help="the games played before memory should stay flat")
+    parser.add_argument("--max-growth", type=float, default=512,
+                        help="the KB of traced memory allowed to grow after the warmup")
+    parser.add_argument("--max-objects", type=int, default=50,
+                        help="the live objects of a type allowed to grow after the warmup")
+    parser.add_argument("--output", metavar="PATH",
+                        help="save every sample to a CSV file")
+    args = parser.parse_args()
+
+    if not args.headless:
+        pygame.display.init()
+        pygame.font.init()
+
+    tracemalloc.start()
+    samples = []
+    baseline = None
+    ticks = 0
+    start = time.perf_counter()
+
+    for games in range(1, args.games + 1):
+        ticks += play(games, args.ticks, args.headless, args.draw_every)
+
+        if games % args.sample_every and games != args.games:
+            continue
+        row = sample(games, ticks)
+        samples.append(row)
+        if baseline is None and games >= args.warmup:
+            baseline = tracemalloc.take_snapshot()
+
+        objects = ", ".join(f"{kind} {row[kind]}" for kind in
+                            [kind.__name__ for kind in TRACKED_TYPES] + ["Surface"])
+        print(f"{games:>6} games {time.perf_counter() - start:>7.1f} s  "
+              f"traced {row['traced_kb']:>8.0f} KB  collected {row['collected']:>5}  {objects}")
+
+    if args.output:
+        with open(args.output, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=list(samples[0]))
+            writer.writeheader()
+            writer.writerows(samples)
+
+    settled = [row for row in samples if row["games"] >= args.warmup]
+    failures = []
+    rise = growth(settled, "traced_kb")
+    if rise > args.max_growth:
+        failures.append(f"traced memory grew {rise:.0f} KB after the warmup, "
+                        f"more than {args.max_growth:.0f} KB")
+    for kind in [kind.__name__ for kind in TRACKED_TYPES] + ["Surface"]:
+        rise_objects = growth(settled, kind)
+        if rise_objects > args.max_objects:
+            failures.append(f"{rise_objects:.0f} more live {kind} objects after the warmup")
+
+    if not failures:
+        print(f"No growth beyond {args.max_growth:.0f} KB or {args.max_objects} objects "
+              f"over {len(settled)} samples after the warmup")
+        return
+
+    print("Memory grew during the soak:")
+    for failure in failures:
+        print("  " + failure)
+    if baseline is not None:
+        print("Largest growth by allocation site since the warmup:")
+        # Leave out the soak's own samples and tracemalloc's bookkeeping
+        ignored = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignored)
+        for stat in snapshot.compare_to(baseline.filter_traces(ignored), "lineno")[:10]:
+            print("  " + str(stat))
+    sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""This file runs batches of headless games to help balance settings.py.
+
+Each job plays a headless game with its own settings overrides and seed,
+controlled by the bot or a scripted player, in a pool of worker processes
+so every core is used. Jobs sharing the same overrides are aggregated and
+the results are written to a columnar file, either a NumPy .npz archive
+with one array per column or a CSV file:
+
+    python sweep.py --set CE_HEALTH=1,2,3 --set PROJECTILE_SPEED=8,12 \\
+        --seeds 20 --output results.npz
+"""
+
+import argparse
+import ast
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import settings
+
+# Columns written for each combination of overrides
+RESULT_COLUMNS = ["games", "mean_level", "max_level", "mean_ticks",
+                  "min_ticks", "max_ticks", "mean_score", "max_score"]
+
+# Settings only read when a module is first imported, by the shared
+# asset cache, projectile pool and telemetry queue, so overriding them
+# after the game is loaded would silently have no effect
+FIXED_SETTINGS = {"ASSETS_PATH", "PROJECTILE_POOL_SIZE", "TELEMETRY_QUEUE_SIZE"}
+
+def apply_settings(overrides):
+    """Override settings in every loaded module that imported them.
+
+    Modules use 'from settings import *', so each keeps its own copy
+    of the names and every copy must be replaced.
+
+    Args:
+        overrides: A dict mapping setting names to new values.
+
+    Returns:
+        A dict mapping each module to the values it had before,
+        to be passed to restore_settings().
+    """
+    saved = {}
+    for module in list(sys.modules.values()):
+        names = getattr(module, "__dict__", {})
+        for name, value in overrides.items():
+            if name in names and names[name] is getattr(settings, name):
+                saved.setdefault(module, {})[name] = names[name]
+    for module, values in saved.items():
+        for name in values:
+            setattr(module, name, overrides[name])
+    return saved
+
+def restore_settings(saved):
+    """Undo apply_settings().
+
+    Args:
+        saved: The dict returned by apply_settings().
+    """
+    for module, values in saved.items():
+        for name, value in values.items():
+            setattr(module, name, value)
+
+def play(job):
+    """Play one headless game. This runs in a worker process.
+
+    Args:
+        job: A tuple of the overrides dict, the seed, the most ticks
+        to play and the name of the player, "bot" or "sweep".
+
+    Returns:
+        A tuple of the level reached, the ticks survived and the score.
+    """
+    overrides, seed, max_ticks, player = job
+
+    # Imported here so each worker process loads the game once
+    from headless import Simulation
+    from inputs import Bot_Input, Scripted_Input
+
+    saved = apply_settings(overrides)
+    try:
+        if player == "bot":
+            controls = Bot_Input()
+        else:
+            controls = Scripted_Input(
+                lambda tick: ((tick // 40) % 2 == 0, (tick // 40) % 2 == 1, True))
+        simulation = Simulation(controls, seed)
+        controls.game = simulation.game
+
+        simulation.run(max_ticks)
+        game = simulation.game
+        return game.level, simulation.ticks, game.get_score()
+    finally:
+        restore_settings(saved)
+
+def parse_grid(assignments):
+    """Turn NAME=value,value arguments into every combination.
+
+    Values are read as Python literals, so dicts such as
+    POINTS={"Common": 5, "Rare": 20, "Ultra Rare": 50} work too,
+    separated from each other by semicolons.
+
+    Args:
+        assignments: A list of strings in the form NAME=v1,v2.
+
+    Returns:
+        A list of override dicts, one per combination.
+
+    Raises:
+        ValueError: If a name is not a setting, or is
+        one of the FIXED_SETTINGS.
+    """
+    axes = []
+    for assignment in assignments:
+        name, _, values = assignment.partition("=")
+        name = name.strip()
+        if not hasattr(settings, name):
+            raise ValueError(f"{name} is not defined in settings.py")
+        if name in FIXED_SETTINGS:
+            raise ValueError(f"{name} is read once at import and cannot be swept")
+        separator = ";" if values.lstrip().startswith("{") else ","
+        axes.append([(name, ast.literal_eval(value.strip()))
+                     for value in values.split(separator) if value.strip()])
+    return [dict(combination) for combination in itertools.product(*axes)]
+
+def aggregate(grid, outcomes, seeds):
+    """Summarise the games played with each combination of overrides.
+
+    Args:
+        grid: The list of override dicts.
+        outcomes: A list of (level, ticks, score) tuples, with
+        'seeds' consecutive games for each override dict.
+        seeds: An integer for the games played per combination.
+
+    Returns:
+        A dict mapping each column name to a list of values.
+    """
+    names = sorted({name for overrides in grid for name in overrides})
+    columns = {name: [] for name in names + RESULT_COLUMNS}
+
+    for i, overrides in enumerate(grid):
+        games = outcomes[i * seeds:(i + 1) * seeds]
+        levels, ticks, scores = zip(*games)
+        for name in names:
+            value = overrides[name]
+            columns[name].append(value if isinstance(value, (int, float)) else repr(value))
+        columns["games"].append(len(games))
+        columns["mean_level"].append(sum(levels) / len(games))
+        columns["max_level"].append(max(levels))
+        columns["mean_ticks"].append(sum(ticks) / len(games))
+        columns["min_ticks"].append(min(ticks))
+        columns["max_ticks"].append(max(ticks))
+        columns["mean_score"].append(sum(scores) / len(games))
+        columns["max_score"].append(max(scores))
+    return columns
+
+def save(columns, path):
+    """Write the aggregated results to a columnar file.
+
+    Args:
+        columns: A dict mapping column names to lists of values.
+        path: A string ending in .npz for a NumPy archive with one
+        array per column, or anything else for a CSV file.
+    """
+    if path.endswith(".npz"):
+        import numpy as np
+        np.savez_compressed(path, **{name: np.asarray(values)
+                                     for name, values in columns.items()})
+        return
+
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        writer.writerows(zip(*columns.values()))
+
+def main():
+    """Run a parameter sweep from the command line."""
+    parser = argparse.ArgumentParser(description="Sweep settings over headless games.")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=V1,V2",
+                        help="values to try for a setting, can be repeated")
+    parser.add_argument("--seeds", type=int, default=10,
+                        help="games to play for each combination")
+    parser.add_argument("--ticks", type=int, default=9000,
+                        help="the most ticks each game may last")
+    parser.add_argument("--player", choices=["bot", "sweep"], default="bot",
+                        help="the bot, or a script sweeping side to side")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes to use")
+    parser.add_argument("--output", default="sweep.csv",
+                        help="the .npz or .csv file to write")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.set)
+    jobs = [(overrides, seed, args.ticks, args.player)
+            for overrides in grid for seed in range(args.seeds)]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # Large chunks keep the cost of sending jobs to workers low
+        chunksize = max(1, len(jobs) // (args.workers * 4))
+        outcomes = list(executor.map(play, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    save(aggregate(grid, outcomes, args.seeds), args.output)
+    print(f"Played {len(jobs)} games of {len(grid)} combinations on "
+          f"{args.workers} workers in {elapsed:.1f}s, saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
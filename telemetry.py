@@ -0,0 +1,182 @@
+"""This file records what happens in each game to compressed log files.
+
+The game emits small typed events as they happen: a game starting, enemies
+destroyed, the score changing, the player taking damage, a new level, the
+player dying and the frame governor shedding or restoring work. emit() only
+appends a tuple to a bounded queue, and a writer thread turns the queued
+events into JSON lines and writes them in batches to gzip files, starting a
+new file once one holds TELEMETRY_ROTATE_BYTES of text.
+
+The game never waits for the writer. If the queue is full, or more than
+TELEMETRY_TICK_EVENTS events are emitted in one tick, further events are
+dropped and counted instead, so the cost of logging each tick has a fixed
+upper limit. When telemetry has not been started, emit() returns at once.
+
+    python main.py --telemetry logs
+"""
+
+from settings import *
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# The names of the values sent with each type of event
+EVENTS = {"game": ("seed", "formation"),
+          "kill": ("rarity", "x", "y"),
+          "score": ("amount", "total"),
+          "damage": ("amount", "health"),
+          "level": ("level",),
+          "death": ("score", "level"),
+          "governor": ("level", "step", "engaged", "frame_ms")}
+
+class Telemetry():
+    """Queue gameplay events and write them on a background thread.
+
+    Attributes:
+        enabled: A boolean, True between start() and stop().
+        capacity: An integer for the most events waiting to be written.
+        tick_events: An integer for the most events accepted per tick.
+        emitted: An integer counting the events queued.
+        dropped: An integer counting the events dropped.
+        written: An integer counting the events written.
+        peak: An integer for the most events that have been waiting.
+        files: A list of the paths of the files written.
+    """
+
+    def __init__(self, capacity=TELEMETRY_QUEUE_SIZE,
+                 tick_events=TELEMETRY_TICK_EVENTS) -> None:
+        """Initialise a stopped telemetry stream.
+
+        Args:
+            capacity: An integer for the size of the queue.
+            tick_events: An integer for the events accepted per tick.
+        """
+        self.enabled = False
+        self.capacity = capacity
+        self.tick_events = tick_events
+
+        self.emitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.peak = 0
+        self.files = []
+
+        # Appending and popping from opposite ends of a deque is safe
+        # across threads without a lock
+        self.__queue = deque()
+        self.__tick_count = 0
+
+        self.__directory = None
+        self.__thread = None
+        self.__wake = threading.Event()
+        self.__stopping = False
+
+    def start(self, directory):
+        """Start writing events to files in a directory.
+
+        Args:
+            directory: A string for the folder to write into,
+            created if it does not exist.
+        """
+        if self.enabled:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.__directory = directory
+        self.__stopping = False
+        self.__thread = threading.Thread(target=self.__write_loop,
+                                         name="telemetry", daemon=True)
+        self.__thread.start()
+        self.enabled = True
+
+    def stop(self):
+        """Write every queued event and close the current file."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.__stopping = True
+        self.__wake.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def tick(self):
+        """Start a new tick, resetting the number of events it may emit."""
+        self.__tick_count = 0
+
+    def emit(self, kind, *values):
+        """Queue an event without waiting.
+
+        Args:
+            kind: A string naming the event, a key of EVENTS.
+            values: The values of the event, in the order named in EVENTS.
+        """
+        if not self.enabled:
+            return
+        queue = self.__queue
+        if self.__tick_count >= self.tick_events or len(queue) >= self.capacity:
+            self.dropped += 1
+            return
+        self.__tick_count += 1
+        queue.append((kind, time.time(), values))
+        self.emitted += 1
+        if len(queue) > self.peak:
+            self.peak = len(queue)
+
+    def stats(self):
+        """Summarise the stream.
+
+        Returns:
+            A dict with the events emitted, dropped, written and waiting,
+            the most that have waited and the files written.
+        """
+        return {"emitted": self.emitted,
+                "dropped": self.dropped,
+                "written": self.written,
+                "waiting": len(self.__queue),
+                "peak": self.peak,
+                "files": list(self.files)}
+
+    def __write_loop(self):
+        """Write batches of events until stopped. This runs on its own thread."""
+        file = None
+        size = 0
+        started = time.strftime("%Y%m%d-%H%M%S")
+
+        while True:
+            self.__wake.wait(TELEMETRY_FLUSH_INTERVAL)
+            self.__wake.clear()
+            stopping = self.__stopping
+
+            lines = []
+            queue = self.__queue
+            while queue:
+                kind, when, values = queue.popleft()
+                event = {"time": round(when, 4), "event": kind}
+                event.update(zip(EVENTS[kind], values))
+                lines.append(json.dumps(event))
+
+            if lines:
+                if file is None or size >= TELEMETRY_ROTATE_BYTES:
+                    if file is not None:
+                        file.close()
+                    path = os.path.join(self.__directory,
+                                        f"telemetry-{started}-{len(self.files):03}.jsonl.gz")
+                    file = gzip.open(path, "wt", compresslevel=6)
+                    self.files.append(path)
+                    size = 0
+
+                text = "\n".join(lines) + "\n"
+                file.write(text)
+                size += len(text)
+                self.written += len(lines)
+
+            if stopping:
+                break
+
+        if file is not None:
+            file.close()
+
+# The stream shared by the whole game, stopped until start() is called
+telemetry = Telemetry()
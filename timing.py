@@ -0,0 +1,103 @@
+"""This file contains the clock that runs the game at a fixed tick rate.
+
+Every speed and firing interval in the game is measured in ticks, so the
+simulation must advance at a steady rate to play the same on every
+machine. A Fixed_Step_Clock collects the real time that has passed and
+says how many whole ticks to simulate. Frames are drawn as often as the
+display allows, between ticks, with sprites placed part of the way
+between their previous and current positions.
+"""
+
+from settings import *
+import time
+
+class Fixed_Step_Clock():
+    """Turn elapsed real time into a whole number of simulation ticks.
+
+    Attributes:
+        tick_rate: An integer for the ticks simulated per second.
+        step: A float for the length of one tick in seconds.
+        max_steps: An integer for the most ticks run to catch up
+        in a single frame, after which the extra time is dropped.
+        alpha: A float between 0 and 1 for how far the current frame
+        is between the last tick and the next one.
+        sim_rate: A float for the ticks simulated over the last second.
+        render_rate: A float for the frames drawn over the last second.
+        dropped: A float for the seconds of simulation skipped
+        because the game fell too far behind.
+    """
+
+    def __init__(self, tick_rate=SIM_RATE, max_steps=MAX_CATCH_UP_STEPS) -> None:
+        """Initialise the clock.
+
+        Args:
+            tick_rate: An integer for the ticks to simulate per second.
+            max_steps: An integer for the most ticks to run per frame.
+        """
+        self.tick_rate = tick_rate
+        self.step = 1 / tick_rate
+        self.max_steps = max_steps
+
+        self.alpha = 0.0
+        self.sim_rate = 0.0
+        self.render_rate = 0.0
+        self.dropped = 0.0
+
+        self.__accumulator = 0.0
+        self.__last = time.perf_counter()
+
+        self.__window_start = self.__last
+        self.__window_ticks = 0
+        self.__window_frames = 0
+
+    def reset(self):
+        """Forget any time collected so far, for example
+        when a new game starts.
+        """
+        self.__accumulator = 0.0
+        self.__last = time.perf_counter()
+        self.alpha = 0.0
+
+    def advance(self):
+        """Collect the time since the last call and work out
+        how many ticks to simulate before the next frame.
+
+        Returns:
+            An integer for the number of ticks to run.
+        """
+        now = time.perf_counter()
+        self.__accumulator += now - self.__last
+        self.__last = now
+
+        steps = int(self.__accumulator / self.step)
+        if steps > self.max_steps:
+            # Too far behind to catch up, so slow down rather than stall
+            self.dropped += (steps - self.max_steps) * self.step
+            self.__accumulator -= (steps - self.max_steps) * self.step
+            steps = self.max_steps
+        self.__accumulator -= steps * self.step
+
+        self.alpha = min(self.__accumulator / self.step, 1.0)
+        self.__window_ticks += steps
+        return steps
+
+    def frame(self):
+        """Record that a frame was drawn and update the measured rates
+        once every second.
+
+        Returns:
+            A boolean which is True when the rates were just updated.
+        """
+        self.__window_frames += 1
+
+        now = time.perf_counter()
+        elapsed = now - self.__window_start
+        if elapsed < 1:
+            return False
+
+        self.sim_rate = self.__window_ticks / elapsed
+        self.render_rate = self.__window_frames / elapsed
+        self.__window_start = now
+        self.__window_ticks = 0
+        self.__window_frames = 0
+        return True
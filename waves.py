@@ -0,0 +1,79 @@
+"""This file reads the layout of each wave of enemies from waves.json.
+
+Each entry in the file describes one or more horizontal rows of a single
+type of enemy: where the first row starts, the gap between enemies and
+between rows, and how many enemies each row holds. Optional fields scale
+a wave with the level:
+
+    count_per_level: extra enemies added to each row per level.
+    max_count: the most enemies a row can hold.
+    health_per_level: extra health given to each enemy per level.
+
+The file is read once and cached, and the Game spawns the rows a few
+enemies at a time rather than all in one frame.
+"""
+
+from settings import *
+import json
+from collections import namedtuple
+from functools import lru_cache
+
+# One row of a wave, ready to be passed to Game.generate_waves()
+Row = namedtuple("Row", ["enemy", "x", "y", "gap", "amount", "extra_health"])
+
+ENEMY_NAMES = ("Common_Enemy", "Rare_Enemy", "Ultra_Rare_Enemy")
+
+@lru_cache(maxsize=None)
+def load_waves(path=WAVES_PATH):
+    """Read and check the wave definitions.
+
+    Args:
+        path: A string for the JSON file to read.
+
+    Returns:
+        A tuple of dicts, one per entry, with every optional
+        field filled in.
+
+    Raises:
+        ValueError: If an entry names an unknown enemy or
+        is missing a required field.
+    """
+    with open(path) as file:
+        entries = json.load(file)["rows"]
+
+    waves = []
+    for entry in entries:
+        if entry.get("enemy") not in ENEMY_NAMES:
+            raise ValueError(f"Unknown enemy {entry.get('enemy')!r} in {path}")
+        missing = {"x", "y", "gap", "count"} - set(entry)
+        if missing:
+            raise ValueError(f"Wave of {entry['enemy']} in {path} is missing {sorted(missing)}")
+
+        waves.append({"rows": 1, "row_gap": 0, "count_per_level": 0,
+                      "max_count": None, "health_per_level": 0, **entry})
+    return tuple(waves)
+
+def rows_for_level(level, path=None):
+    """Lay out every row of the wave for a level.
+
+    Args:
+        level: An integer for the level, starting at 1.
+        path: A string for the JSON file of wave definitions,
+        or None for WAVES_PATH.
+
+    Returns:
+        A list of Row tuples, in the order they should spawn.
+    """
+    if path is None:
+        path = WAVES_PATH
+    rows = []
+    for wave in load_waves(path):
+        amount = wave["count"] + wave["count_per_level"] * (level - 1)
+        if wave["max_count"] is not None:
+            amount = min(amount, wave["max_count"])
+        extra_health = wave["health_per_level"] * (level - 1)
+
+        for row in range(wave["rows"]):
+            rows.append(Row(wave["enemy"], wave["x"], wave["y"] + row * wave["row_gap"],
+                            wave["gap"], amount, extra_health))
+    return rows